@@ -0,0 +1,18 @@
+# shlibcc -- benchmarks
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# Benchmark suites, run from the repository root:
+#
+#  python -m benchmarks.synthlib <dir> [options]  -- generate a synthetic lib
+#  python -m benchmarks.e2e [options]             -- end-to-end / per phase
+#  python -m benchmarks.parser [options]          -- parser / generate_lines
+#  python -m benchmarks.graph [options]           -- DirectedGraph at scale
+#  python -m benchmarks.startup [options]         -- linked script startup
+#  python -m benchmarks.importtime [options]      -- CLI import time check
+#  python -m benchmarks.compare <old> <new>       -- compare two result files
+#
+# All suites write their results as json (see benchmarks.common).
+#
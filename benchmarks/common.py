@@ -0,0 +1,125 @@
+# shlibcc -- benchmarks: shared helpers
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+
+import collections
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+PRJ_ROOT = os.path.dirname ( os.path.dirname ( os.path.abspath ( __file__ ) ) )
+
+if PRJ_ROOT not in sys.path:
+   sys.path.insert ( 0, PRJ_ROOT )
+
+import shlibcclib.main
+
+
+def make_config ( argv, action=shlibcclib.main.ACTION_LINK ):
+   """Creates a ShlibccConfig from the given command line arguments."""
+   return shlibcclib.main.ShlibccConfig (
+      shlibcclib.main.ACTIONS, action, argv=argv
+   )
+# --- end of make_config (...) ---
+
+def get_git_commit():
+   try:
+      return subprocess.check_output (
+         [ 'git', 'rev-parse', 'HEAD' ],
+         cwd=PRJ_ROOT, stderr=subprocess.DEVNULL
+      ).decode().strip()
+   except ( OSError, subprocess.CalledProcessError ):
+      return None
+# --- end of get_git_commit (...) ---
+
+def get_environment():
+   return collections.OrderedDict ( (
+      ( 'commit',   get_git_commit() ),
+      ( 'python',   platform.python_version() ),
+      ( 'platform', platform.platform() ),
+      ( 'time',     int ( time.time() ) ),
+   ) )
+# --- end of get_environment (...) ---
+
+
+class Timings ( object ):
+   """Collects wall time samples per benchmark item."""
+
+   def __init__ ( self ):
+      super ( Timings, self ).__init__()
+      self.samples = collections.OrderedDict()
+   # --- end of __init__ (...) ---
+
+   def add ( self, name, seconds ):
+      self.samples.setdefault ( name, [] ).append ( seconds )
+   # --- end of add (...) ---
+
+   def measure ( self, name, func, *args, **kwargs ):
+      """Calls func(*args, **kwargs), records the time and returns
+      func's result."""
+      t_start = time.perf_counter()
+      ret     = func ( *args, **kwargs )
+      self.add ( name, time.perf_counter() - t_start )
+      return ret
+   # --- end of measure (...) ---
+
+   def get_data ( self ):
+      data = collections.OrderedDict()
+      for name, samples in self.samples.items():
+         ordered = sorted ( samples )
+         data [name] = collections.OrderedDict ( (
+            ( 'min',    ordered [0] ),
+            ( 'median', ordered [len ( ordered ) // 2] ),
+            ( 'mean',   sum ( ordered ) / len ( ordered ) ),
+            ( 'max',    ordered [-1] ),
+            ( 'runs',   samples ),
+         ) )
+      return data
+   # --- end of get_data (...) ---
+
+   def format_summary ( self ):
+      for name, entry in self.get_data().items():
+         yield "{:<24} min {:10.3f} ms   median {:10.3f} ms".format (
+            name, 1000 * entry ['min'], 1000 * entry ['median']
+         )
+   # --- end of format_summary (...) ---
+
+# --- end of Timings ---
+
+
+def load_json ( fspath ):
+   with open ( fspath, 'rt' ) as FH:
+      return json.load ( FH, object_pairs_hook=collections.OrderedDict )
+# --- end of load_json (...) ---
+
+def write_results ( benchmark, params, results, output=None, **extra ):
+   """Writes benchmark results as json to the given file or stdout.
+
+   arguments:
+   * benchmark -- name of the benchmark suite
+   * params    -- dict of benchmark parameters
+   * results   -- dict of results (e.g. Timings.get_data())
+   * output    -- output file, None or '-' for stdout
+   * **extra   -- additional top-level entries
+   """
+   data = collections.OrderedDict ( (
+      ( 'benchmark',   benchmark ),
+      ( 'environment', get_environment() ),
+      ( 'params',      params ),
+      ( 'results',     results ),
+   ) )
+   data.update ( extra )
+
+   if not output or output == '-':
+      json.dump ( data, sys.stdout, indent=3 )
+      sys.stdout.write ( '\n' )
+   else:
+      with open ( output, 'wt' ) as FH:
+         json.dump ( data, FH, indent=3 )
+         FH.write ( '\n' )
+# --- end of write_results (...) ---
@@ -0,0 +1,107 @@
+# shlibcc -- benchmarks: compare two result files
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# Usage: python -m benchmarks.compare <old.json> <new.json> [--key min]
+#                                      [--max-ratio <f>]
+#
+# Exits with status 1 if --max-ratio is given and any entry got slower
+# than <f> times its old value.
+#
+
+import argparse
+import sys
+
+import benchmarks.common
+
+import shlibcclib.generic.graph
+
+
+def iter_timing_entries ( results, prefix='' ):
+   """Yields ( <name>, <entry> ) for all timing entries in a results dict,
+   descending into nested dicts (e.g. one dict per config combination)."""
+   for name, entry in results.items():
+      if not isinstance ( entry, dict ):
+         pass
+      elif 'min' in entry and 'median' in entry:
+         yield ( prefix + name, entry )
+      else:
+         for item in iter_timing_entries ( entry, prefix + name + '/' ):
+            yield item
+# --- end of iter_timing_entries (...) ---
+
+def main():
+   parser = argparse.ArgumentParser (
+      description = "compare two shlibcc benchmark result files"
+   )
+   parser.add_argument ( 'old', help="old results (json)" )
+   parser.add_argument ( 'new', help="new results (json)" )
+   parser.add_argument (
+      '--key', default='min', choices=( 'min', 'median', 'mean', 'max' ),
+      help = "statistic to compare [%(default)s]",
+   )
+   parser.add_argument (
+      '--max-ratio', type=float, default=None, metavar='<f>',
+      help = "fail if any new/old ratio exceeds <f> (e.g. 1.2)",
+   )
+   args = parser.parse_args()
+
+   old_data = benchmarks.common.load_json ( args.old )
+   new_data = benchmarks.common.load_json ( args.new )
+
+   if old_data ['benchmark'] != new_data ['benchmark']:
+      parser.error ( "results are from different benchmarks" )
+   elif old_data ['params'] != new_data ['params']:
+      sys.stderr.write ( "warning: benchmark parameters differ\n" )
+
+   old_results = dict ( iter_timing_entries ( old_data ['results'] ) )
+   rows        = []
+   regressions = []
+
+   for name, new_entry in iter_timing_entries ( new_data ['results'] ):
+      old_entry = old_results.get ( name )
+      new_value = new_entry [args.key]
+
+      if old_entry is None:
+         rows.append (
+            ( name, '-', "{:.3f}".format ( 1000 * new_value ), '-' )
+         )
+      else:
+         old_value = old_entry [args.key]
+         if (
+            args.max_ratio is not None and old_value
+            and new_value / old_value > args.max_ratio
+         ):
+            regressions.append ( name )
+
+         rows.append ( (
+            name,
+            "{:.3f}".format ( 1000 * old_value ),
+            "{:.3f}".format ( 1000 * new_value ),
+            (
+               "{:.2f}x".format ( new_value / old_value )
+               if old_value else '-'
+            )
+         ) )
+   # -- end for
+
+   for line in shlibcclib.generic.graph.format_table (
+      rows, [ ( '<name>', '<old ms>', '<new ms>', '<new/old>' ) ]
+   ):
+      sys.stdout.write ( line + '\n' )
+
+   if regressions:
+      sys.stderr.write (
+         "{:d} entries exceed the max ratio {:.2f}:\n".format (
+            len ( regressions ), args.max_ratio
+         )
+      )
+      for name in regressions:
+         sys.stderr.write ( "  {}\n".format ( name ) )
+      sys.exit ( 1 )
+# --- end of main (...) ---
+
+if __name__ == '__main__':
+   main()
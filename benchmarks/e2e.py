@@ -0,0 +1,225 @@
+# shlibcc -- benchmarks: end-to-end and per-phase timings
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# Times make_dependency_table(), DependencyList, ShlibModule parsing and
+# ShlibFile.write() separately and a complete link on a synthetic library.
+# With --memory, the memory retained by the dependency table and the
+# dependency graph is measured (tracemalloc) in a separate run.
+#
+# Usage: python -m benchmarks.e2e [--lib <dir>] [--runs N] [-o results.json]
+#                                 [synthlib options]
+#
+
+import argparse
+import collections
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+import benchmarks.common
+import benchmarks.synthlib
+
+import shlibcclib.depgraph
+import shlibcclib.library
+import shlibcclib.linker
+import shlibcclib.shlib
+
+
+def run_phases ( timings, config, outfile ):
+   deptable = timings.measure (
+      'make_dependency_table',
+      shlibcclib.library.make_dependency_table,
+      config.shlib_path, config.modules, config
+   )
+
+   deplist = timings.measure (
+      'DependencyList',
+      shlibcclib.depgraph.DependencyList,
+      deptable, config.stable_sort, config.reduce_edges
+   )
+
+   def parse_modules():
+      shlib = shlibcclib.shlib.ShlibFile ( config )
+      for module in deplist:
+         if not os.path.isdir ( module.fspath ):
+            shlib.add_module ( module.name, module.fspath )
+      return shlib
+   # --- end of parse_modules (...) ---
+
+   shlib = timings.measure ( 'ShlibModule', parse_modules )
+   timings.measure ( 'ShlibFile.write', shlib.write, outfile )
+
+   num_modules = len ( shlib._module_order )
+   del shlib, deplist, deptable
+   return num_modules
+# --- end of run_phases (...) ---
+
+def run_link ( timings, config ):
+   def link():
+      deptable = shlibcclib.library.make_dependency_table (
+         config.shlib_path, config.modules, config
+      )
+      shlibcclib.linker.link (
+         config,
+         shlibcclib.depgraph.DependencyList (
+            deptable, config.stable_sort, config.reduce_edges
+         )
+      )
+   # --- end of link (...) ---
+
+   timings.measure ( 'end_to_end', link )
+# --- end of run_link (...) ---
+
+def measure_memory ( config ):
+   """Returns the memory retained by the dependency table and by the
+   dependency graph (in bytes) as dict."""
+   gc.collect()
+   tracemalloc.start()
+   try:
+      mem_start = tracemalloc.get_traced_memory()[0]
+      deptable  = shlibcclib.library.make_dependency_table (
+         config.shlib_path, config.modules, config
+      )
+      gc.collect()
+      mem_deptable = tracemalloc.get_traced_memory()[0]
+
+      depgraph = shlibcclib.depgraph.DependencyGraph (
+         deptable, config.reduce_edges
+      )
+      gc.collect()
+      mem_depgraph = tracemalloc.get_traced_memory()[0]
+   finally:
+      tracemalloc.stop()
+
+   del depgraph, deptable
+   return collections.OrderedDict ( (
+      ( 'deptable_bytes', mem_deptable - mem_start ),
+      ( 'depgraph_bytes', mem_depgraph - mem_deptable ),
+   ) )
+# --- end of measure_memory (...) ---
+
+def main():
+   parser = argparse.ArgumentParser (
+      description = "shlibcc end-to-end benchmark"
+   )
+   parser.add_argument (
+      '--lib', default=None, metavar='<dir>',
+      help = (
+         'use (or create, if it does not exist) the synthetic library '
+         'in <dir> instead of a temporary one'
+      ),
+   )
+   parser.add_argument (
+      '--runs', type=int, default=5, metavar='<n>', help="[%(default)s]"
+   )
+   parser.add_argument (
+      '--request', default='targets', choices=( 'targets', 'dirs' ),
+      help = (
+         'modules to link: all modules nobody depends on (targets) '
+         'or the top-level directories (dirs) [%(default)s]'
+      ),
+   )
+   parser.add_argument (
+      '--shlibcc-args', default='', metavar='<args>',
+      help = "additional shlibcc arguments (e.g. '--strip-all')",
+   )
+   parser.add_argument (
+      '--memory', default=False, action='store_true',
+      help = "measure the memory retained by the deptable/depgraph",
+   )
+   parser.add_argument (
+      '--output', '-o', default=None, metavar='<file>',
+      help = "results file (json), defaults to stdout",
+   )
+   benchmarks.synthlib.add_arguments ( parser )
+   args = parser.parse_args()
+
+   tmpdir = tempfile.mkdtemp ( prefix='shlibcc-bench-' )
+   try:
+      libroot = args.lib or os.path.join ( tmpdir, 'synthlib' )
+      info_file = os.path.join ( libroot, benchmarks.synthlib.INFO_FILE )
+
+      if os.path.isfile ( info_file ):
+         info = benchmarks.common.load_json ( info_file )
+      else:
+         if not os.path.isdir ( libroot ):
+            os.makedirs ( libroot )
+         info = benchmarks.synthlib.generate (
+            libroot, **benchmarks.synthlib.get_params ( args )
+         )
+
+      if args.request == 'dirs':
+         modules = sorted ( set (
+            name.partition ( '/' )[0] for name in info ['modules']
+         ) )
+      else:
+         modules = info ['targets']
+
+      outfile = os.path.join ( tmpdir, 'out.sh' )
+      argv = (
+         benchmarks.synthlib.get_shlibcc_args ( info )
+         + [ '--as-lib' ] + args.shlibcc_args.split()
+      )
+
+      timings = benchmarks.common.Timings()
+      for _ in range ( args.runs ):
+         num_modules = run_phases (
+            timings,
+            benchmarks.common.make_config ( argv + [ '--' ] + modules ),
+            outfile
+         )
+         output_size = os.path.getsize ( outfile )
+         os.unlink ( outfile )
+
+         run_link (
+            timings,
+            benchmarks.common.make_config (
+               argv + [ '-O', outfile, '--' ] + modules
+            )
+         )
+         os.unlink ( outfile )
+      # -- end for
+
+      for line in timings.format_summary():
+         sys.stderr.write ( line + '\n' )
+
+      if args.memory:
+         memory = measure_memory (
+            benchmarks.common.make_config ( argv + [ '--' ] + modules )
+         )
+         for key, value in memory.items():
+            sys.stderr.write ( "{:<24} {:10.3f} MiB\n".format (
+               key, value / ( 1024.0 * 1024.0 )
+            ) )
+      else:
+         memory = None
+
+      benchmarks.common.write_results (
+         'e2e',
+         dict (
+            info ['params'],
+            request      = args.request,
+            shlibcc_args = args.shlibcc_args,
+            runs         = args.runs,
+         ),
+         timings.get_data(),
+         args.output,
+         counts = {
+            'modules_requested' : len ( modules ),
+            'modules_linked'    : num_modules,
+            'output_bytes'      : output_size,
+         },
+         memory = memory,
+      )
+   finally:
+      shutil.rmtree ( tmpdir )
+# --- end of main (...) ---
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,336 @@
+# shlibcc -- benchmarks: DirectedGraph at scale
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# Times add_node()+expand(), copy(), toposort_kahn(), toposort_kahn_stable(),
+# visualize_edges() and format_table() on generated DAG shapes (chain,
+# wide fan-out, diamond lattice, random sparse/dense) and records the peak
+# memory (tracemalloc) of each operation in a separate, untimed run.
+#
+# Exits with status 1 if an operation exceeds its time or memory budget.
+#
+# Usage: python -m benchmarks.graph [--sizes 1000,10000,100000]
+#                                   [--shapes <shape>,...] [--runs N]
+#                                   [--time-budget <ms>]
+#                                   [--memory-budget <MiB>]
+#                                   [--budget-file <json>] [-o results.json]
+#
+# The budget file maps fnmatch patterns on "<shape>/<size>/<op>" to budgets,
+# e.g. { "*/100000/toposort_kahn_stable": { "ms": 5000, "mib": 400 } }.
+# The last matching pattern wins over --time-budget/--memory-budget.
+#
+
+import argparse
+import collections
+import fnmatch
+import random
+import sys
+import tracemalloc
+
+import benchmarks.common
+
+import shlibcclib.generic.graph
+
+
+def get_node_name ( index ):
+   return "m{:06d}".format ( index )
+# --- end of get_node_name (...) ---
+
+def gen_chain ( rng, size, degree ):
+   yield ( get_node_name ( 0 ), () )
+   for k in range ( 1, size ):
+      yield ( get_node_name ( k ), ( get_node_name ( k - 1 ), ) )
+# --- end of gen_chain (...) ---
+
+def gen_fanout ( rng, size, degree ):
+   yield (
+      get_node_name ( 0 ), [ get_node_name ( k ) for k in range ( 1, size ) ]
+   )
+   for k in range ( 1, size ):
+      yield ( get_node_name ( k ), () )
+# --- end of gen_fanout (...) ---
+
+def gen_diamond ( rng, size, degree ):
+   # layers of width ~sqrt(size), each node points to two nodes
+   # of the next layer
+   width = max ( 2, int ( size ** 0.5 ) )
+   for k in range ( size ):
+      pos  = k % width
+      base = k - pos + width
+      if base >= size:
+         yield ( get_node_name ( k ), () )
+      else:
+         yield (
+            get_node_name ( k ),
+            set (
+               get_node_name ( base + ( ( pos + j ) % width ) )
+               for j in ( 0, 1 ) if base + ( ( pos + j ) % width ) < size
+            )
+         )
+# --- end of gen_diamond (...) ---
+
+def _gen_random ( rng, size, degree ):
+   for k in range ( size ):
+      yield (
+         get_node_name ( k ),
+         [
+            get_node_name ( j )
+            for j in rng.sample ( range ( k ), min ( k, degree ) )
+         ]
+      )
+# --- end of _gen_random (...) ---
+
+def gen_sparse ( rng, size, degree ):
+   return _gen_random ( rng, size, 2 )
+# --- end of gen_sparse (...) ---
+
+def gen_dense ( rng, size, degree ):
+   return _gen_random ( rng, size, degree )
+# --- end of gen_dense (...) ---
+
+SHAPES = collections.OrderedDict ( (
+   ( 'chain',   gen_chain ),
+   ( 'fanout',  gen_fanout ),
+   ( 'diamond', gen_diamond ),
+   ( 'sparse',  gen_sparse ),
+   ( 'dense',   gen_dense ),
+) )
+
+
+def build_graph ( node_list ):
+   graph = shlibcclib.generic.graph.DirectedGraph()
+   for name, edges_to in node_list:
+      graph.add_node ( name, None, edges_to )
+   return graph.expand()
+# --- end of build_graph (...) ---
+
+def consume ( iterable ):
+   collections.deque ( iterable, maxlen=0 )
+# --- end of consume (...) ---
+
+def get_operations ( node_list ):
+   """Returns an ordered dict <op> => ( <setup>, <func> ), where setup()
+   creates the argument for func(arg) (not measured)."""
+   graph = build_graph ( node_list )
+   rows  = sorted ( graph.iter_edges() )
+   get_graph = lambda: graph
+
+   return collections.OrderedDict ( (
+      ( 'add_node+expand', ( lambda: node_list, build_graph ) ),
+      ( 'copy', ( get_graph, lambda g: g.copy() ) ),
+      ( 'toposort_kahn', ( get_graph, lambda g: g.toposort_kahn() ) ),
+      (
+         'toposort_kahn_stable',
+         ( get_graph, lambda g: g.toposort_kahn_stable() )
+      ),
+      ( 'visualize_edges', ( get_graph, lambda g: g.visualize_edges() ) ),
+      (
+         'format_table',
+         (
+            lambda: rows,
+            lambda r: consume ( shlibcclib.generic.graph.format_table (
+               r, [ ( '<module>', '<depends on>' ) ], ' ==> '
+            ) )
+         )
+      ),
+   ) )
+# --- end of get_operations (...) ---
+
+def measure_peak_memory ( setup, func ):
+   arg = setup()
+   tracemalloc.start()
+   try:
+      tracemalloc.reset_peak()
+      base = tracemalloc.get_traced_memory()[0]
+      ret  = func ( arg )
+      peak = tracemalloc.get_traced_memory()[1]
+   finally:
+      tracemalloc.stop()
+   del ret
+   return peak - base
+# --- end of measure_peak_memory (...) ---
+
+
+class Budgets ( object ):
+   """Time/memory budgets per "<shape>/<size>/<op>" name."""
+
+   def __init__ ( self, time_budget=None, memory_budget=None, patterns=None ):
+      super ( Budgets, self ).__init__()
+      self.default  = { 'ms': time_budget, 'mib': memory_budget }
+      # list of ( <fnmatch pattern>, <budget dict> )
+      self.patterns = list ( patterns.items() ) if patterns else []
+   # --- end of __init__ (...) ---
+
+   def get ( self, name ):
+      budget = dict ( self.default )
+      for pattern, entry in self.patterns:
+         if fnmatch.fnmatchcase ( name, pattern ):
+            budget.update ( entry )
+      return budget
+   # --- end of get (...) ---
+
+   def check ( self, name, seconds, peak_bytes ):
+      """Returns a list of budget violation messages for an entry."""
+      budget = self.get ( name )
+      errors = []
+
+      if budget.get ( 'ms' ) is not None and 1000 * seconds > budget ['ms']:
+         errors.append ( "{}: {:.3f} ms > {} ms".format (
+            name, 1000 * seconds, budget ['ms']
+         ) )
+
+      if (
+         budget.get ( 'mib' ) is not None
+         and peak_bytes > budget ['mib'] * 1024 * 1024
+      ):
+         errors.append ( "{}: {:.3f} MiB > {} MiB".format (
+            name, peak_bytes / ( 1024.0 * 1024.0 ), budget ['mib']
+         ) )
+
+      return errors
+   # --- end of check (...) ---
+
+# --- end of Budgets ---
+
+
+def run_benchmark ( shape, size, args, budgets, errors ):
+   node_list = list (
+      SHAPES [shape] ( random.Random ( args.seed ), size, args.dense_degree )
+   )
+   results = collections.OrderedDict()
+
+   for op, ( setup, func ) in get_operations ( node_list ).items():
+      if op not in args.ops:
+         continue
+
+      timings = benchmarks.common.Timings()
+      for _ in range ( args.runs ):
+         arg = setup()
+         timings.measure ( op, func, arg )
+         del arg
+
+      entry = timings.get_data() [op]
+      if args.memory:
+         entry ['peak_bytes'] = measure_peak_memory ( setup, func )
+      else:
+         entry ['peak_bytes'] = 0
+
+      name = "{}/{:d}/{}".format ( shape, size, op )
+      sys.stderr.write (
+         "{:<40} min {:10.3f} ms   peak {:10.3f} MiB\n".format (
+            name, 1000 * entry ['min'],
+            entry ['peak_bytes'] / ( 1024.0 * 1024.0 )
+         )
+      )
+      errors.extend (
+         budgets.check ( name, entry ['min'], entry ['peak_bytes'] )
+      )
+      results [op] = entry
+   # -- end for
+
+   return results
+# --- end of run_benchmark (...) ---
+
+def main():
+   all_ops = list ( get_operations ( [] ) )
+
+   parser = argparse.ArgumentParser (
+      description = "shlibcc DirectedGraph benchmark"
+   )
+   parser.add_argument (
+      '--sizes', default='1000,10000,100000', metavar='<n>[,...]',
+      help = "number of nodes [%(default)s]",
+   )
+   parser.add_argument (
+      '--shapes', default=','.join ( SHAPES ), metavar='<shape>[,...]',
+      help = "graph shapes [%(default)s]",
+   )
+   parser.add_argument (
+      '--ops', default=','.join ( all_ops ), metavar='<op>[,...]',
+      help = "operations [%(default)s]",
+   )
+   parser.add_argument (
+      '--dense-degree', type=int, default=16, metavar='<n>',
+      help = "number of edges per node in dense graphs [%(default)s]",
+   )
+   parser.add_argument (
+      '--runs', type=int, default=3, metavar='<n>', help="[%(default)s]"
+   )
+   parser.add_argument (
+      '--seed', type=int, default=0, metavar='<int>', help="[%(default)s]"
+   )
+   parser.add_argument (
+      '--no-memory', dest='memory', default=True, action='store_false',
+      help = "don't measure peak memory (tracemalloc)",
+   )
+   parser.add_argument (
+      '--time-budget', type=float, default=None, metavar='<ms>',
+      help = "fail if any operation takes longer (min of all runs)",
+   )
+   parser.add_argument (
+      '--memory-budget', type=float, default=None, metavar='<MiB>',
+      help = "fail if the peak memory of any operation is higher",
+   )
+   parser.add_argument (
+      '--budget-file', default=None, metavar='<file>',
+      help = "per-operation budgets (json)",
+   )
+   parser.add_argument (
+      '--output', '-o', default=None, metavar='<file>',
+      help = "results file (json), defaults to stdout",
+   )
+   args = parser.parse_args()
+
+   sizes     = [ int ( k ) for k in args.sizes.split ( ',' ) if k ]
+   shapes    = [ k for k in args.shapes.split ( ',' ) if k ]
+   args.ops  = [ k for k in args.ops.split ( ',' ) if k ]
+
+   for shape in shapes:
+      if shape not in SHAPES:
+         parser.error ( "unknown shape {!r}".format ( shape ) )
+   for op in args.ops:
+      if op not in all_ops:
+         parser.error ( "unknown op {!r}".format ( op ) )
+
+   budgets = Budgets (
+      args.time_budget, args.memory_budget,
+      (
+         benchmarks.common.load_json ( args.budget_file )
+         if args.budget_file else None
+      )
+   )
+   errors  = []
+   results = collections.OrderedDict()
+
+   for shape in shapes:
+      results [shape] = collections.OrderedDict (
+         ( str ( size ), run_benchmark ( shape, size, args, budgets, errors ) )
+         for size in sizes
+      )
+
+   benchmarks.common.write_results (
+      'graph',
+      collections.OrderedDict ( (
+         ( 'sizes',        sizes ),
+         ( 'shapes',       shapes ),
+         ( 'ops',          args.ops ),
+         ( 'dense_degree', args.dense_degree ),
+         ( 'runs',         args.runs ),
+         ( 'seed',         args.seed ),
+      ) ),
+      results,
+      args.output,
+      budget_errors = errors,
+   )
+
+   if errors:
+      sys.stderr.write ( "budget exceeded:\n" )
+      for message in errors:
+         sys.stderr.write ( "  {}\n".format ( message ) )
+      sys.exit ( 1 )
+# --- end of main (...) ---
+
+if __name__ == '__main__':
+   main()
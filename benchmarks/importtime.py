@@ -0,0 +1,204 @@
+# shlibcc -- benchmarks: CLI startup / import time
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# Runs "python -X importtime bin/shlibcc <action> ..." on a small synthetic
+# library and reports the import time of all shlibcclib modules (including
+# modules imported on demand) and the process wall time per action.
+#
+# Exits with status 1 if a query action imports modules that only other
+# actions need (e.g. the linker) or if the import time of a query action
+# exceeds --budget.
+#
+# Usage: python -m benchmarks.importtime [--runs N] [--budget <ms>]
+#                                        [-o results.json]
+#
+
+import argparse
+import collections
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchmarks.common
+import benchmarks.synthlib
+
+# modules that query actions must not import
+QUERY_FORBIDDEN = (
+   'shlibcclib.defaultheader', 'shlibcclib.depgraph', 'shlibcclib.impact',
+   'shlibcclib.linker', 'shlibcclib.shlib', 'json', 'textwrap',
+)
+
+# action => ( <shlibcc args>, <forbidden modules> )
+ACTIONS = collections.OrderedDict ( (
+   ( 'list-modules', ( [ '--list-modules' ], QUERY_FORBIDDEN ) ),
+   ( 'deptable',     ( [ '--deptable' ],     QUERY_FORBIDDEN ) ),
+   ( 'deplist',      ( [ '--deplist' ],      () ) ),
+   ( 'link',         ( [ '--link', '-O', None ], () ) ),
+) )
+
+QUERY_ACTIONS = ( 'list-modules', 'deptable' )
+
+SCRIPT = os.path.join ( benchmarks.common.PRJ_ROOT, 'bin', 'shlibcc' )
+
+
+def parse_importtime ( text ):
+   """Returns a 2-tuple ( <modules>, <shlibcc import time> ) from python's
+   -X importtime output, where <modules> is a dict <module> => <cumulative
+   import time in seconds> and the shlibcc import time is the sum of all
+   top-level shlibcclib imports (including imports done on demand)."""
+   modules = dict()
+   total   = 0.0
+   for line in text.splitlines():
+      if line.startswith ( 'import time:' ):
+         fields = line [12:].split ( '|' )
+         if len ( fields ) == 3 and fields [1].strip().isdigit():
+            name    = fields [2].rstrip()
+            seconds = int ( fields [1] ) / 1e6
+            modules [name.strip()] = seconds
+            # top-level imports are indented by exactly one space
+            if (
+               name [:1] == ' ' and name [1:2] != ' '
+               and name [1:].split ( '.', 1 ) [0] == 'shlibcclib'
+            ):
+               total += seconds
+   return ( modules, total )
+# --- end of parse_importtime (...) ---
+
+def run_action ( argv ):
+   """Runs shlibcc and returns ( <wall time>, <modules>, <import time> ),
+   see parse_importtime()."""
+   env = dict ( os.environ )
+   env ['PYTHONPATH'] = benchmarks.common.PRJ_ROOT
+   env.pop ( 'PYTHONDONTWRITEBYTECODE', None )
+
+   t_start = time.perf_counter()
+   proc    = subprocess.run (
+      [ sys.executable, '-X', 'importtime', SCRIPT ] + argv,
+      stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+      stderr=subprocess.PIPE, env=env, universal_newlines=True
+   )
+   seconds = time.perf_counter() - t_start
+
+   if proc.returncode:
+      raise Exception (
+         "shlibcc {} failed:\n{}".format ( ' '.join ( argv ), proc.stderr )
+      )
+
+   modules, import_time = parse_importtime ( proc.stderr )
+   return ( seconds, modules, import_time )
+# --- end of run_action (...) ---
+
+def main():
+   parser = argparse.ArgumentParser (
+      description = "shlibcc CLI startup / import time"
+   )
+   parser.add_argument (
+      '--runs', type=int, default=10, metavar='<n>', help="[%(default)s]"
+   )
+   parser.add_argument (
+      '--budget', type=float, default=10.0, metavar='<ms>',
+      help = (
+         'max. import time of shlibcclib for query actions '
+         '(min of all runs) [%(default)s]'
+      ),
+   )
+   parser.add_argument (
+      '--output', '-o', default=None, metavar='<file>',
+      help = "results file (json), defaults to stdout",
+   )
+   args = parser.parse_args()
+
+   errors  = []
+   results = collections.OrderedDict()
+   tmpdir  = tempfile.mkdtemp ( prefix='shlibcc-bench-' )
+   try:
+      libroot = os.path.join ( tmpdir, 'synthlib' )
+      os.makedirs ( libroot )
+      info = benchmarks.synthlib.generate (
+         libroot, modules=20, depth=1, module_size=20
+      )
+      outfile = os.path.join ( tmpdir, 'out.sh' )
+
+      # compile the bytecode of all modules, so that the first run
+      # does not differ from the others
+      run_action (
+         [ '--link', '-O', outfile ]
+         + benchmarks.synthlib.get_shlibcc_args ( info )
+         + [ '--' ] + info ['targets']
+      )
+      os.unlink ( outfile )
+
+      for action, ( action_argv, forbidden ) in ACTIONS.items():
+         argv = (
+            [ outfile if arg is None else arg for arg in action_argv ]
+            + benchmarks.synthlib.get_shlibcc_args ( info )
+            + [ '--' ] + info ['targets']
+         )
+         timings  = benchmarks.common.Timings()
+         imported = set()
+
+         for _ in range ( args.runs ):
+            seconds, modules, import_time = run_action ( argv )
+            timings.add ( 'wall', seconds )
+            timings.add ( 'import', import_time )
+            imported.update ( modules )
+            if os.path.exists ( outfile ):
+               os.unlink ( outfile )
+         # -- end for
+
+         data = timings.get_data()
+         data ['modules'] = sorted (
+            name for name in imported if name.startswith ( 'shlibcclib' )
+         )
+         results [action] = data
+
+         for name in forbidden:
+            if name in imported:
+               errors.append (
+                  "{}: imports {}".format ( action, name )
+               )
+
+         if (
+            action in QUERY_ACTIONS
+            and 1000 * data ['import'] ['min'] > args.budget
+         ):
+            errors.append ( "{}: import time {:.3f} ms > {} ms".format (
+               action, 1000 * data ['import'] ['min'], args.budget
+            ) )
+
+         sys.stderr.write (
+            "{:<14} import {:8.3f} ms   wall {:8.3f} ms\n".format (
+               action, 1000 * data ['import'] ['min'],
+               1000 * data ['wall'] ['min']
+            )
+         )
+      # -- end for
+   finally:
+      shutil.rmtree ( tmpdir )
+
+   benchmarks.common.write_results (
+      'importtime',
+      collections.OrderedDict ( (
+         ( 'runs',   args.runs ),
+         ( 'budget', args.budget ),
+      ) ),
+      results,
+      args.output,
+      budget_errors = errors,
+   )
+
+   if errors:
+      sys.stderr.write ( "startup check failed:\n" )
+      for message in errors:
+         sys.stderr.write ( "  {}\n".format ( message ) )
+      sys.exit ( 1 )
+# --- end of main (...) ---
+
+if __name__ == '__main__':
+   main()
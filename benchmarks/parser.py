@@ -0,0 +1,265 @@
+# shlibcc -- benchmarks: ShlibModule parser / ShlibFile.generate_lines()
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# Times ShlibModule._parse() on pathological inputs (very large modules,
+# comment-only modules, directive-heavy modules, many @section switches,
+# long runs of blank lines) for each strip/keep config combination, and
+# ShlibFile.generate_lines() for each strip/enclose combination.
+#
+# Usage: python -m benchmarks.parser [--lines N] [--large-lines N]
+#                                    [--runs N] [-o results.json]
+#
+
+import argparse
+import collections
+import itertools
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import benchmarks.common
+import benchmarks.synthlib
+
+import shlibcclib.shlib
+
+
+# strip modes -- label => shlibcc args
+STRIP_MODES = collections.OrderedDict ( (
+   ( 'default',      [] ),
+   ( 'keep_dev',     [ '--keep-dev-comments' ] ),
+   ( 'virtual',      [ '--strip-virtual' ] ),
+   ( 'comments',     [ '--strip-comments' ] ),
+   ( 'all',          [ '--strip-all' ] ),
+) )
+
+CODE_CHOICES = ( 'y', 'c', 'n' )
+
+ENCLOSE_MODES = collections.OrderedDict ( (
+   ( 'none',     [ '--no-enclose-modules', '--no-enclose-sections' ] ),
+   ( 'modules',  [ '--enclose-modules',    '--no-enclose-sections' ] ),
+   ( 'sections', [ '--no-enclose-modules', '--enclose-sections' ] ),
+   ( 'both',     [ '--enclose-modules',    '--enclose-sections' ] ),
+) )
+
+
+def gen_large ( rng, num_lines ):
+   return benchmarks.synthlib.gen_module_lines (
+      rng, 0, 'large', num_lines, 0.1
+   )
+# --- end of gen_large (...) ---
+
+def gen_comments ( rng, num_lines ):
+   yield "# @section functions"
+   for k in range ( num_lines ):
+      r = rng.random()
+      if r < 0.6:
+         yield "# comment line {:d}".format ( k )
+      elif r < 0.9:
+         yield "## dev note {:d}".format ( k )
+      elif r < 0.95:
+         yield "### banner {:d} ###".format ( k )
+      else:
+         yield "   #   indented comment {:d}".format ( k )
+# --- end of gen_comments (...) ---
+
+def gen_directives ( rng, num_lines ):
+   yield "# @section functions"
+   yield "f() {"
+   for k in range ( num_lines ):
+      yield "   " + rng.choice ( benchmarks.synthlib.DIRECTIVES ).format (
+         var="V{:d} W{:d}".format ( k, k + 1 ), func="f"
+      )
+   yield "}"
+# --- end of gen_directives (...) ---
+
+def gen_sections ( rng, num_lines ):
+   names = [
+      name for name in shlibcclib.shlib.ShlibModule.SECTIONS
+      if name not in shlibcclib.shlib.ShlibModule.SECTION_KEYWORDS
+   ] + list ( shlibcclib.shlib.ShlibModule.SECTION_ALIASES ) + [ 'null' ]
+
+   for k in range ( num_lines // 2 ):
+      yield "# @section {}".format ( rng.choice ( names ) )
+      yield "X{:d}=1".format ( k )
+# --- end of gen_sections (...) ---
+
+def gen_blank ( rng, num_lines ):
+   yield "# @section functions"
+   count = 0
+   while count < num_lines:
+      run = rng.randint ( 1, 64 )
+      for _ in range ( run ):
+         yield ""
+      yield "echo {:d}".format ( count )
+      count += run + 1
+# --- end of gen_blank (...) ---
+
+INPUTS = collections.OrderedDict ( (
+   ( 'large',      gen_large ),
+   ( 'comments',   gen_comments ),
+   ( 'directives', gen_directives ),
+   ( 'sections',   gen_sections ),
+   ( 'blank',      gen_blank ),
+) )
+
+
+def write_inputs ( root, inputs, num_lines, large_lines, seed ):
+   """Writes the input modules to <root>/<name>.sh and returns a dict
+   <name> => <fspath>."""
+   fspaths = collections.OrderedDict()
+   for name in inputs:
+      rng    = random.Random ( seed )
+      fspath = os.path.join ( root, name + '.sh' )
+      with open ( fspath, 'wt' ) as FH:
+         for line in INPUTS [name] (
+            rng, ( large_lines if name == 'large' else num_lines )
+         ):
+            FH.write ( line )
+            FH.write ( '\n' )
+      fspaths [name] = fspath
+   return fspaths
+# --- end of write_inputs (...) ---
+
+def iter_parse_configs():
+   """Yields ( <label>, <shlibcc args> ) for all strip/keep combinations."""
+   for strip_mode, safety, debug in itertools.product (
+      STRIP_MODES, CODE_CHOICES, CODE_CHOICES
+   ):
+      yield (
+         "strip={},safety={},debug={}".format ( strip_mode, safety, debug ),
+         STRIP_MODES [strip_mode] + [
+            '--keep-safety-checks', safety, '--enable-debug-code', debug
+         ]
+      )
+# --- end of iter_parse_configs (...) ---
+
+def iter_generate_configs():
+   """Yields ( <label>, <shlibcc args> ) for all strip/enclose
+   combinations."""
+   for strip_mode, enclose_mode in itertools.product (
+      STRIP_MODES, ENCLOSE_MODES
+   ):
+      yield (
+         "strip={},enclose={}".format ( strip_mode, enclose_mode ),
+         STRIP_MODES [strip_mode] + ENCLOSE_MODES [enclose_mode]
+      )
+# --- end of iter_generate_configs (...) ---
+
+def consume ( iterable ):
+   collections.deque ( iterable, maxlen=0 )
+# --- end of consume (...) ---
+
+def bench_parse ( fspaths, base_argv, runs ):
+   results = collections.OrderedDict()
+
+   for name, fspath in fspaths.items():
+      timings = benchmarks.common.Timings()
+
+      for label, config_argv in iter_parse_configs():
+         config = benchmarks.common.make_config (
+            base_argv + config_argv + [ '--', name ]
+         )
+         module = shlibcclib.shlib.ShlibModule ( name, fspath, config )
+         for _ in range ( runs ):
+            timings.measure ( label, module._parse )
+         del module
+
+      for line in timings.format_summary():
+         sys.stderr.write ( "parse/{}: {}\n".format ( name, line ) )
+      results [name] = timings.get_data()
+   # -- end for
+
+   return results
+# --- end of bench_parse (...) ---
+
+def bench_generate_lines ( fspaths, base_argv, runs ):
+   timings = benchmarks.common.Timings()
+
+   for label, config_argv in iter_generate_configs():
+      config = benchmarks.common.make_config (
+         base_argv + config_argv + [ '--' ] + list ( fspaths )
+      )
+      shlib = shlibcclib.shlib.ShlibFile ( config )
+      for name, fspath in fspaths.items():
+         shlib.add_module ( name, fspath )
+
+      for _ in range ( runs ):
+         timings.measure ( label, consume, shlib.generate_lines() )
+      del shlib
+
+   for line in timings.format_summary():
+      sys.stderr.write ( "generate_lines: {}\n".format ( line ) )
+   return timings.get_data()
+# --- end of bench_generate_lines (...) ---
+
+def main():
+   parser = argparse.ArgumentParser (
+      description = "shlibcc parser microbenchmarks"
+   )
+   parser.add_argument (
+      '--lines', type=int, default=20000, metavar='<n>',
+      help = "number of lines per input module [%(default)s]",
+   )
+   parser.add_argument (
+      '--large-lines', type=int, default=100000, metavar='<n>',
+      help = "number of lines of the 'large' input module [%(default)s]",
+   )
+   parser.add_argument (
+      '--inputs', default=','.join ( INPUTS ), metavar='<name>[,...]',
+      help = "inputs to benchmark [%(default)s]",
+   )
+   parser.add_argument (
+      '--runs', type=int, default=3, metavar='<n>', help="[%(default)s]"
+   )
+   parser.add_argument (
+      '--seed', type=int, default=0, metavar='<int>', help="[%(default)s]"
+   )
+   parser.add_argument (
+      '--output', '-o', default=None, metavar='<file>',
+      help = "results file (json), defaults to stdout",
+   )
+   args = parser.parse_args()
+
+   inputs = [ name for name in args.inputs.split ( ',' ) if name ]
+   for name in inputs:
+      if name not in INPUTS:
+         parser.error ( "unknown input {!r}".format ( name ) )
+
+   tmpdir = tempfile.mkdtemp ( prefix='shlibcc-bench-' )
+   try:
+      fspaths = write_inputs (
+         tmpdir, inputs, args.lines, args.large_lines, args.seed
+      )
+      base_argv = [ '-S', tmpdir, '--as-lib' ]
+
+      results = collections.OrderedDict ( (
+         ( 'parse', bench_parse ( fspaths, base_argv, args.runs ) ),
+         (
+            'generate_lines',
+            bench_generate_lines ( fspaths, base_argv, args.runs )
+         ),
+      ) )
+
+      benchmarks.common.write_results (
+         'parser',
+         collections.OrderedDict ( (
+            ( 'lines',       args.lines ),
+            ( 'large_lines', args.large_lines ),
+            ( 'inputs',      inputs ),
+            ( 'runs',        args.runs ),
+            ( 'seed',        args.seed ),
+         ) ),
+         results,
+         args.output,
+      )
+   finally:
+      shutil.rmtree ( tmpdir )
+# --- end of main (...) ---
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,195 @@
+# shlibcc -- benchmarks: reproducible output check
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# Generates a synthetic library and links its top-level directories with
+# shlibcclib.api.link ( reproducible=True ) in separate processes, each
+# with a different PYTHONHASHSEED, and once more with SOURCE_DATE_EPOCH
+# set. Reports the sha256 of each output.
+#
+# Exits with status 1 if the outputs of the runs without SOURCE_DATE_EPOCH
+# differ, if their header contains a date or if the header of the
+# SOURCE_DATE_EPOCH run does not contain that date (UTC).
+#
+# Usage: python -m benchmarks.reproducible [--runs N] [--epoch <seconds>]
+#                                          [-o results.json]
+#                                          [synthlib options]
+#
+
+import argparse
+import collections
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchmarks.common
+import benchmarks.synthlib
+
+import shlibcclib.api
+
+
+DATE_REGEX = re.compile ( r'[0-9]{4}-[0-9]{2}-[0-9]{2}' )
+
+
+def link_worker ( libroot, outfile ):
+   """Links the top-level directories of a synthetic library to outfile
+   (called in a subprocess, see run_link())."""
+   info = benchmarks.common.load_json (
+      os.path.join ( libroot, benchmarks.synthlib.INFO_FILE )
+   )
+   config = shlibcclib.api.Config (
+      shlib_dir          = info ['shlib_dir'],
+      shlib_include_dirs = info ['include_dirs'],
+      modules            = sorted ( set (
+         name.partition ( '/' )[0] for name in info ['modules']
+      ) ),
+      is_lib             = True,
+      reproducible       = True,
+   )
+   with open ( outfile, 'wt' ) as FH:
+      FH.writelines ( shlibcclib.api.link ( config ) )
+# --- end of link_worker (...) ---
+
+def run_link ( libroot, outfile, hash_seed, source_date_epoch=None ):
+   """Runs link_worker() in a subprocess and returns the sha256 (hex str)
+   of the output."""
+   env = dict ( os.environ )
+   env ['PYTHONPATH']     = benchmarks.common.PRJ_ROOT
+   env ['PYTHONHASHSEED'] = str ( hash_seed )
+   if source_date_epoch is None:
+      env.pop ( 'SOURCE_DATE_EPOCH', None )
+   else:
+      env ['SOURCE_DATE_EPOCH'] = str ( source_date_epoch )
+
+   subprocess.check_call (
+      [
+         sys.executable, '-m', 'benchmarks.reproducible',
+         '--worker', libroot, outfile
+      ],
+      cwd=benchmarks.common.PRJ_ROOT, env=env, stdin=subprocess.DEVNULL
+   )
+
+   h = hashlib.sha256()
+   with open ( outfile, 'rb' ) as FH:
+      for chunk in iter ( lambda: FH.read ( 1 << 16 ), b'' ):
+         h.update ( chunk )
+   return h.hexdigest()
+# --- end of run_link (...) ---
+
+def read_header ( outfile ):
+   """Returns the leading comment block of a linked file as str."""
+   lines = []
+   with open ( outfile, 'rt' ) as FH:
+      for line in FH:
+         if line [:1] != '#':
+            break
+         lines.append ( line )
+   return ''.join ( lines )
+# --- end of read_header (...) ---
+
+def main():
+   parser = argparse.ArgumentParser (
+      description = "shlibcc reproducible output check"
+   )
+   parser.add_argument (
+      '--runs', type=int, default=3, metavar='<n>',
+      help = "number of runs without SOURCE_DATE_EPOCH [%(default)s]",
+   )
+   parser.add_argument (
+      '--epoch', type=int, default=1400000000, metavar='<seconds>',
+      help = "SOURCE_DATE_EPOCH of the last run [%(default)s]",
+   )
+   parser.add_argument (
+      '--output', '-o', default=None, metavar='<file>',
+      help = "results file (json), defaults to stdout",
+   )
+   parser.add_argument (
+      '--worker', nargs=2, default=None, metavar=( '<lib>', '<outfile>' ),
+      help = argparse.SUPPRESS,
+   )
+   benchmarks.synthlib.add_arguments ( parser )
+   args = parser.parse_args()
+
+   if args.worker:
+      link_worker ( *args.worker )
+      return
+
+   if args.runs < 2:
+      parser.error ( "--runs must be >= 2" )
+
+   errors  = []
+   results = collections.OrderedDict()
+   tmpdir  = tempfile.mkdtemp ( prefix='shlibcc-bench-' )
+   try:
+      libroot = os.path.join ( tmpdir, 'synthlib' )
+      os.makedirs ( libroot )
+      info = benchmarks.synthlib.generate (
+         libroot, **benchmarks.synthlib.get_params ( args )
+      )
+
+      outfile = os.path.join ( tmpdir, 'out.sh' )
+      hashes  = []
+      for hash_seed in range ( 1, args.runs + 1 ):
+         digest = run_link ( libroot, outfile, hash_seed )
+         hashes.append ( digest )
+         results ["hashseed={:d}".format ( hash_seed )] = digest
+
+         match = DATE_REGEX.search ( read_header ( outfile ) )
+         if match:
+            errors.append (
+               "hashseed={:d}: header contains a date: {}".format (
+                  hash_seed, match.group ( 0 )
+               )
+            )
+         os.unlink ( outfile )
+      # -- end for
+
+      if len ( set ( hashes ) ) != 1:
+         errors.append ( "outputs differ: {}".format ( ', '.join ( hashes ) ) )
+
+      expected_date = time.strftime ( '%Y-%m-%d', time.gmtime ( args.epoch ) )
+      results ["SOURCE_DATE_EPOCH={:d}".format ( args.epoch )] = run_link (
+         libroot, outfile, args.runs + 1, args.epoch
+      )
+      header = read_header ( outfile )
+      if expected_date not in header:
+         errors.append (
+            "SOURCE_DATE_EPOCH={:d}: header does not contain {}".format (
+               args.epoch, expected_date
+            )
+         )
+      os.unlink ( outfile )
+   finally:
+      shutil.rmtree ( tmpdir )
+
+   for label, digest in results.items():
+      sys.stderr.write ( "{:<28} {}\n".format ( label, digest ) )
+
+   benchmarks.common.write_results (
+      'reproducible',
+      collections.OrderedDict ( (
+         ( 'runs',     args.runs ),
+         ( 'epoch',    args.epoch ),
+         ( 'synthlib', info ['params'] ),
+      ) ),
+      results,
+      args.output,
+      errors = errors,
+   )
+
+   if errors:
+      sys.stderr.write ( "reproducibility check failed:\n" )
+      for message in errors:
+         sys.stderr.write ( "  {}\n".format ( message ) )
+      sys.exit ( 1 )
+# --- end of main (...) ---
+
+if __name__ == '__main__':
+   main()
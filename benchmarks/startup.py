@@ -0,0 +1,308 @@
+# shlibcc -- benchmarks: startup time of linked scripts
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# Links a target under a matrix of strip/enclose/safety-check/--shell
+# options and times "<shell> -n <script>" (parse only) and a no-op run
+# ("<shell> <script>", i.e. defining all functions and running the module
+# init code) with each locally available shell (sh, dash, bash,
+# busybox ash). Reports the output size and the startup time relative
+# to the first (default) option combination.
+#
+# The time of running an empty script is subtracted from all timings.
+#
+# Usage: python -m benchmarks.startup [options] [-- <shlibcc args>]
+#
+# Without shlibcc args, a synthetic library is generated and all of its
+# targets are linked. Otherwise, the shlibcc args have to name the shlib
+# dir (-S) and the modules, e.g. "-- -S /usr/share/shlib scriptinfo".
+# "--as-lib" is added unless --main is given.
+#
+
+import argparse
+import collections
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchmarks.common
+import benchmarks.synthlib
+
+import shlibcclib.depgraph
+import shlibcclib.generic.graph
+import shlibcclib.library
+import shlibcclib.linker
+
+
+# option matrix -- dimension => ( label => shlibcc args )
+MATRIX = collections.OrderedDict ( (
+   ( 'strip', collections.OrderedDict ( (
+      ( 'default',  [] ),
+      ( 'comments', [ '--strip-comments' ] ),
+      ( 'all',      [ '--strip-all' ] ),
+   ) ) ),
+   ( 'enclose', collections.OrderedDict ( (
+      ( 'default',  [] ),
+      ( 'none',     [ '--no-enclose-modules', '--no-enclose-sections' ] ),
+      ( 'modules',  [ '--enclose-modules', '--no-enclose-sections' ] ),
+      ( 'both',     [ '--enclose-modules', '--enclose-sections' ] ),
+   ) ) ),
+   ( 'safety', collections.OrderedDict ( (
+      ( 'c', [ '--keep-safety-checks', 'c' ] ),
+      ( 'y', [ '--keep-safety-checks', 'y' ] ),
+      ( 'n', [ '--keep-safety-checks', 'n' ] ),
+   ) ) ),
+   ( 'shell', collections.OrderedDict ( (
+      ( 'sh',   [ '--shell', 'sh' ] ),
+      ( 'ash',  [ '--shell', 'ash' ] ),
+      ( 'bash', [ '--shell', 'bash' ] ),
+   ) ) ),
+) )
+
+# shell name => command
+SHELLS = collections.OrderedDict ( (
+   ( 'sh',          [ '/bin/sh' ] ),
+   ( 'dash',        [ 'dash' ] ),
+   ( 'bash',        [ 'bash' ] ),
+   ( 'busybox_ash', [ 'busybox', 'ash' ] ),
+) )
+
+
+def get_available_shells ( names ):
+   shells = collections.OrderedDict()
+   for name in names:
+      cmdv = SHELLS [name]
+      path = shutil.which ( cmdv [0] )
+      if path:
+         shells [name] = [ path ] + cmdv [1:]
+   return shells
+# --- end of get_available_shells (...) ---
+
+def iter_matrix ( dims ):
+   """Yields ( <label>, <shlibcc args> ) for all option combinations
+   of the given dimensions. The first combination uses the first option
+   of each dimension (the default)."""
+   for choice in itertools.product ( *( MATRIX [dim] for dim in dims ) ):
+      yield (
+         ','.join (
+            "{}={}".format ( dim, label )
+            for dim, label in zip ( dims, choice )
+         ),
+         list ( itertools.chain.from_iterable (
+            MATRIX [dim] [label] for dim, label in zip ( dims, choice )
+         ) )
+      )
+# --- end of iter_matrix (...) ---
+
+def link ( argv, outfile ):
+   config = benchmarks.common.make_config (
+      [ '-O', outfile ] + argv
+   )
+   deptable = shlibcclib.library.make_dependency_table (
+      config.shlib_path, config.modules, config
+   )
+   shlibcclib.linker.link (
+      config,
+      shlibcclib.depgraph.DependencyList (
+         deptable, config.stable_sort, config.reduce_edges
+      )
+   )
+   return os.path.getsize ( outfile )
+# --- end of link (...) ---
+
+def run_shell ( cmdv ):
+   """Runs a command and returns ( <seconds>, <returncode> )."""
+   t_start = time.perf_counter()
+   proc    = subprocess.run (
+      cmdv,
+      stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+      stderr=subprocess.DEVNULL
+   )
+   return ( time.perf_counter() - t_start, proc.returncode )
+# --- end of run_shell (...) ---
+
+def time_script ( shell_cmdv, script, runs ):
+   """Returns a dict with parse/run Timings data and return codes."""
+   timings    = benchmarks.common.Timings()
+   returncode = collections.OrderedDict ( ( ( 'parse', 0 ), ( 'run', 0 ) ) )
+
+   for _ in range ( runs ):
+      for mode, cmdv in (
+         ( 'parse', shell_cmdv + [ '-n', script ] ),
+         ( 'run',   shell_cmdv + [ script ] ),
+      ):
+         seconds, retcode = run_shell ( cmdv )
+         timings.add ( mode, seconds )
+         returncode [mode] = returncode [mode] or retcode
+   # -- end for
+
+   data = timings.get_data()
+   data ['returncode'] = returncode
+   return data
+# --- end of time_script (...) ---
+
+def get_net_ms ( data, empty, mode ):
+   return 1000 * max ( 0.0, data [mode] ['min'] - empty [mode] ['min'] )
+# --- end of get_net_ms (...) ---
+
+def format_report ( results, empty, shells ):
+   rows     = []
+   baseline = None
+
+   for label, entry in results.items():
+      if baseline is None:
+         baseline = entry
+
+      row = [
+         label, str ( entry ['bytes'] ),
+         "{:+d}".format ( entry ['bytes'] - baseline ['bytes'] ),
+      ]
+      for shell in shells:
+         data      = entry ['shells'] [shell]
+         base_data = baseline ['shells'] [shell]
+         for mode in ( 'parse', 'run' ):
+            value   = get_net_ms ( data, empty [shell], mode )
+            retcode = data ['returncode'] [mode]
+            if retcode:
+               row.append ( "FAIL({:d})".format ( retcode ) )
+            else:
+               row.append ( "{:.2f} ({:+.2f})".format (
+                  value, value - get_net_ms ( base_data, empty [shell], mode )
+               ) )
+      rows.append ( row )
+   # -- end for
+
+   header = [ '<options>', '<bytes>', '<+-bytes>' ]
+   for shell in shells:
+      header.extend ( (
+         "<{} -n ms>".format ( shell ), "<{} run ms>".format ( shell )
+      ) )
+
+   return shlibcclib.generic.graph.format_table ( rows, [ header ], '  ' )
+# --- end of format_report (...) ---
+
+def main():
+   parser = argparse.ArgumentParser (
+      description = "startup time of linked shlibcc scripts"
+   )
+   parser.add_argument (
+      '--dims', default=','.join ( MATRIX ), metavar='<dim>[,...]',
+      help = "option matrix dimensions [%(default)s]",
+   )
+   parser.add_argument (
+      '--shells', default=','.join ( SHELLS ), metavar='<shell>[,...]',
+      help = "shells to use, if available [%(default)s]",
+   )
+   parser.add_argument (
+      '--runs', type=int, default=5, metavar='<n>', help="[%(default)s]"
+   )
+   parser.add_argument (
+      '--keep', default=None, metavar='<dir>',
+      help = "keep the linked scripts in <dir>",
+   )
+   parser.add_argument (
+      '--output', '-o', default=None, metavar='<file>',
+      help = "results file (json), defaults to stdout",
+   )
+   parser.add_argument (
+      'shlibcc_args', nargs=argparse.REMAINDER,
+      help = "shlibcc args naming the target (after '--')",
+   )
+   benchmarks.synthlib.add_arguments ( parser )
+   parser.set_defaults ( modules=100 )
+   args = parser.parse_args()
+
+   dims = [ dim for dim in args.dims.split ( ',' ) if dim ]
+   for dim in dims:
+      if dim not in MATRIX:
+         parser.error ( "unknown matrix dimension {!r}".format ( dim ) )
+
+   shell_names = [ name for name in args.shells.split ( ',' ) if name ]
+   for name in shell_names:
+      if name not in SHELLS:
+         parser.error ( "unknown shell {!r}".format ( name ) )
+
+   shells = get_available_shells ( shell_names )
+   if not shells:
+      parser.error ( "none of the requested shells is available" )
+
+   shlibcc_args = list ( args.shlibcc_args )
+   if shlibcc_args and shlibcc_args [0] == '--':
+      shlibcc_args.pop ( 0 )
+
+   tmpdir = tempfile.mkdtemp ( prefix='shlibcc-bench-' )
+   try:
+      if shlibcc_args:
+         argv   = shlibcc_args
+         params = collections.OrderedDict()
+      else:
+         libroot = os.path.join ( tmpdir, 'synthlib' )
+         os.makedirs ( libroot )
+         info = benchmarks.synthlib.generate (
+            libroot, **benchmarks.synthlib.get_params ( args )
+         )
+         argv   = (
+            benchmarks.synthlib.get_shlibcc_args ( info )
+            + [ '--' ] + info ['targets']
+         )
+         params = info ['params']
+
+      if '--main' not in argv:
+         argv = [ '--as-lib' ] + argv
+
+      outdir = args.keep or os.path.join ( tmpdir, 'out' )
+      if not os.path.isdir ( outdir ):
+         os.makedirs ( outdir )
+
+      empty_script = os.path.join ( tmpdir, 'empty.sh' )
+      with open ( empty_script, 'wt' ) as FH:
+         FH.write ( '#!/bin/sh\n' )
+
+      empty = collections.OrderedDict (
+         ( shell, time_script ( cmdv, empty_script, args.runs ) )
+         for shell, cmdv in shells.items()
+      )
+
+      results = collections.OrderedDict()
+      for index, ( label, matrix_argv ) in enumerate ( iter_matrix ( dims ) ):
+         script = os.path.join ( outdir, "{:04d}.sh".format ( index ) )
+         entry  = collections.OrderedDict ( (
+            ( 'argv',   matrix_argv ),
+            ( 'script', os.path.basename ( script ) ),
+            ( 'bytes',  link ( matrix_argv + argv, script ) ),
+            ( 'shells', collections.OrderedDict (
+               ( shell, time_script ( cmdv, script, args.runs ) )
+               for shell, cmdv in shells.items()
+            ) ),
+         ) )
+         results [label] = entry
+      # -- end for
+
+      for line in format_report ( results, empty, shells ):
+         sys.stderr.write ( line + '\n' )
+
+      benchmarks.common.write_results (
+         'startup',
+         collections.OrderedDict ( (
+            ( 'dims',         dims ),
+            ( 'shells',       list ( shells ) ),
+            ( 'runs',         args.runs ),
+            ( 'shlibcc_args', shlibcc_args ),
+            ( 'synthlib',     params ),
+         ) ),
+         results,
+         args.output,
+         empty_script = empty,
+      )
+   finally:
+      shutil.rmtree ( tmpdir )
+# --- end of main (...) ---
+
+if __name__ == '__main__':
+   main()
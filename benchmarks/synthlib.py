@@ -0,0 +1,272 @@
+# shlibcc -- benchmarks: synthetic module library generator
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# Generates a shlib tree with a configurable number of modules, directory
+# depth/fan-out, dependency density, -I overlays, module size and
+# directive mix. The output is deterministic for a given seed.
+#
+# Usage: python -m benchmarks.synthlib <dir> [options]
+#
+
+import argparse
+import collections
+import json
+import os
+import random
+import sys
+
+DEFAULTS = collections.OrderedDict ( (
+   # number of modules in the main shlib root
+   ( 'modules',         500 ),
+   # directory depth / number of subdirectories per directory
+   ( 'depth',           2 ),
+   ( 'fanout',          4 ),
+   # average number of deps of a module that has a .depend file
+   ( 'deps',            3.0 ),
+   # fraction of modules that have a .depend file
+   ( 'depend_ratio',    0.7 ),
+   # number of -I overlay roots, fraction of modules shadowed per overlay
+   ( 'overlays',        0 ),
+   ( 'overlay_ratio',   0.1 ),
+   # approximate number of lines per module
+   ( 'module_size',     80 ),
+   # fraction of function body lines that are @directives
+   ( 'directive_ratio', 0.1 ),
+   ( 'seed',            0 ),
+) )
+
+INFO_FILE = 'synthlib.json'
+
+DIRECTIVES = (
+   '# @varcheck {var}',
+   '# @varcheck_emptyok {var}',
+   '# @safety_check [ -n "${{{var}-}}" ] || return',
+   '# @debug_echo {func}: {var}',
+   '# @debug_stderr {func}',
+   '# @debug echo "{func}" 1>&2',
+)
+
+
+def add_arguments ( parser ):
+   """Adds the generator options to an argparse parser."""
+   for key, default in DEFAULTS.items():
+      parser.add_argument (
+         '--' + key.replace ( '_', '-' ),
+         dest    = key,
+         default = default,
+         type    = type ( default ),
+         metavar = "<{}>".format ( type ( default ).__name__ ),
+         help    = "[%(default)s]",
+      )
+# --- end of add_arguments (...) ---
+
+def get_params ( args ):
+   """Returns the generator parameters from parsed args as dict."""
+   return collections.OrderedDict (
+      ( key, getattr ( args, key ) ) for key in DEFAULTS
+   )
+# --- end of get_params (...) ---
+
+def get_dirnames ( depth, fanout ):
+   dirnames = [ '' ]
+   level    = [ '' ]
+   for _ in range ( depth ):
+      next_level = []
+      for parent in level:
+         for k in range ( fanout ):
+            next_level.append (
+               ( parent + '/' if parent else '' ) + 'd{:d}'.format ( k )
+            )
+      dirnames.extend ( next_level )
+      level = next_level
+   return dirnames
+# --- end of get_dirnames (...) ---
+
+def gen_module_lines ( rng, index, name, num_lines, directive_ratio ):
+   var    = "M{:05d}_VAR".format ( index )
+   prefix = "m{:05d}".format ( index )
+
+   yield "#!/bin/sh"
+   yield "# @section header"
+   yield "# synthetic module {}".format ( name )
+   yield "## generated by benchmarks.synthlib"
+   yield ""
+   yield "# @section vars"
+   yield "# configuration variable"
+   yield ": ${{{var}:=1}}".format ( var=var )
+   yield ""
+   yield "# @section functions"
+
+   count = 10
+   func  = 0
+   while count < num_lines:
+      fname = "{}_f{:d}".format ( prefix, func )
+      yield "# @{} {}() -- function {:d}".format (
+         ( 'private' if func % 3 else 'public' ), fname, func
+      )
+      yield "{}() {{".format ( fname )
+      count += 2
+
+      for k in range ( rng.randint ( 3, 12 ) ):
+         r = rng.random()
+         if r < directive_ratio:
+            yield "   " + rng.choice ( DIRECTIVES ).format (
+               var=var, func=fname
+            )
+         elif r < directive_ratio + 0.15:
+            yield "   # comment {:d}".format ( k )
+         elif r < directive_ratio + 0.2:
+            yield "   ## dev note {:d}".format ( k )
+         elif r < directive_ratio + 0.25:
+            yield ""
+         else:
+            yield '   echo "{} {:d} ${{{}}}"'.format ( fname, k, var )
+         count += 1
+
+      # the body may consist of comments and directives only
+      yield "   return 0"
+      yield "}"
+      yield ""
+      count += 3
+      func  += 1
+
+      if func % 8 == 0:
+         yield "# @section module_init"
+         yield "{}_f0".format ( prefix )
+         yield "# @section functions"
+         count += 3
+   # -- end while
+
+   yield "# @section init"
+   yield ": ${{{var}:?}}".format ( var=var )
+# --- end of gen_module_lines (...) ---
+
+def write_module ( root, name, lines, deps ):
+   fspath = os.path.join ( root, name )
+   dirpath = os.path.dirname ( fspath )
+   if not os.path.isdir ( dirpath ):
+      os.makedirs ( dirpath )
+
+   with open ( fspath + '.sh', 'wt' ) as FH:
+      FH.write ( '\n'.join ( lines ) )
+      FH.write ( '\n' )
+
+   if deps:
+      with open ( fspath + '.depend', 'wt' ) as FH:
+         FH.write ( '\n'.join ( deps ) )
+         FH.write ( '\n' )
+# --- end of write_module (...) ---
+
+def generate ( root, **params ):
+   """Generates a synthetic module library in the given directory and
+   returns an info dict that is also written to <root>/synthlib.json:
+
+   * shlib_dir    -- main shlib root (use as -S)
+   * include_dirs -- overlay roots (use as -I, in that order)
+   * modules      -- all module names
+   * targets      -- modules that no other module depends on
+   * params       -- generator parameters
+   """
+   p = dict ( DEFAULTS )
+   p.update ( params )
+
+   rng          = random.Random ( p ['seed'] )
+   shlib_dir    = os.path.join ( os.path.abspath ( root ), 'lib' )
+   include_dirs = [
+      os.path.join ( os.path.abspath ( root ), 'inc{:d}'.format ( k ) )
+      for k in range ( p ['overlays'] )
+   ]
+   dirnames     = get_dirnames ( p ['depth'], p ['fanout'] )
+   # modules are only placed into the deepest directories so that
+   # requesting a top-level directory includes whole subtrees
+   leaf_dirs    = [ d for d in dirnames if d.count ( '/' ) + 1 == p ['depth'] ]
+   if not leaf_dirs:
+      leaf_dirs = [ '' ]
+
+   modules    = []
+   has_revdep = set()
+
+   for index in range ( p ['modules'] ):
+      dirname = leaf_dirs [index % len ( leaf_dirs )]
+      name    = 'm{:05d}'.format ( index )
+      if dirname:
+         name = dirname + '/' + name
+      deps    = []
+
+      if index and rng.random() < p ['depend_ratio']:
+         num_deps = min (
+            index, rng.randint ( 1, max ( 1, int ( 2 * p ['deps'] ) - 1 ) )
+         )
+         for dep_index in rng.sample ( range ( index ), num_deps ):
+            deps.append ( modules [dep_index] )
+            has_revdep.add ( dep_index )
+
+      lines = list ( gen_module_lines (
+         rng, index, name, p ['module_size'], p ['directive_ratio']
+      ) )
+      write_module ( shlib_dir, name, lines, deps )
+
+      for include_dir in include_dirs:
+         if rng.random() < p ['overlay_ratio']:
+            lines [2] = "# synthetic module {} (overlay {})".format (
+               name, os.path.basename ( include_dir )
+            )
+            write_module ( include_dir, name, lines, deps )
+
+      modules.append ( name )
+   # -- end for
+
+   for include_dir in include_dirs:
+      if not os.path.isdir ( include_dir ):
+         os.makedirs ( include_dir )
+
+   info = collections.OrderedDict ( (
+      ( 'shlib_dir',    shlib_dir ),
+      ( 'include_dirs', include_dirs ),
+      ( 'modules',      modules ),
+      ( 'targets',      [
+         name for k, name in enumerate ( modules ) if k not in has_revdep
+      ] ),
+      ( 'params',       p ),
+   ) )
+
+   with open ( os.path.join ( root, INFO_FILE ), 'wt' ) as FH:
+      json.dump ( info, FH, indent=1 )
+
+   return info
+# --- end of generate (...) ---
+
+def get_shlibcc_args ( info ):
+   """Returns the -S/-I command line arguments for a generated library."""
+   argv = [ '-S', info ['shlib_dir'] ]
+   for include_dir in info ['include_dirs']:
+      argv.extend ( ( '-I', include_dir ) )
+   return argv
+# --- end of get_shlibcc_args (...) ---
+
+def main():
+   parser = argparse.ArgumentParser (
+      description = "generate a synthetic shlib module library"
+   )
+   parser.add_argument ( 'root', help="output directory (must not exist)" )
+   add_arguments ( parser )
+   args = parser.parse_args()
+
+   if os.path.exists ( args.root ):
+      parser.error ( "{!r} exists".format ( args.root ) )
+
+   os.makedirs ( args.root )
+   info = generate ( args.root, **get_params ( args ) )
+   sys.stdout.write (
+      "generated {:d} modules ({:d} targets) in {}\n".format (
+         len ( info ['modules'] ), len ( info ['targets'] ), args.root
+      )
+   )
+   sys.stdout.write ( ' '.join ( get_shlibcc_args ( info ) ) + '\n' )
+# --- end of main (...) ---
+
+if __name__ == '__main__':
+   main()
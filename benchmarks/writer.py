@@ -0,0 +1,156 @@
+# shlibcc -- benchmarks: output writer throughput
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# Links a synthetic library once (without writing it) and times writing
+# the rendered output with different writers:
+#
+#  lines   -- open(), default buffering, one write() per line
+#  blocks  -- open(), default buffering, writelines() of output blocks
+#  atomic  -- shlibcclib.fsio.open_atomic() (temp file + rename,
+#             large write buffer), writelines() of output blocks
+#  atomic_fsync -- like atomic, with fsync
+#
+# Only the write time is measured, the output gets rendered beforehand.
+#
+# Usage: python -m benchmarks.writer [--runs N] [-o results.json]
+#                                    [synthlib options]
+#
+
+import argparse
+import collections
+import os
+import shutil
+import sys
+import tempfile
+
+import benchmarks.common
+import benchmarks.synthlib
+
+import shlibcclib.depgraph
+import shlibcclib.fsio
+import shlibcclib.library
+import shlibcclib.linker
+
+
+def write_lines ( outfile, lines, blocks ):
+   with open ( outfile, 'wt' ) as FH:
+      for line in lines:
+         FH.write ( line )
+         FH.write ( '\n' )
+# --- end of write_lines (...) ---
+
+def write_blocks ( outfile, lines, blocks ):
+   with open ( outfile, 'wt' ) as FH:
+      FH.writelines ( blocks )
+# --- end of write_blocks (...) ---
+
+def write_atomic ( outfile, lines, blocks ):
+   with shlibcclib.fsio.open_atomic ( outfile ) as FH:
+      FH.writelines ( blocks )
+# --- end of write_atomic (...) ---
+
+def write_atomic_fsync ( outfile, lines, blocks ):
+   with shlibcclib.fsio.open_atomic ( outfile, fsync=True ) as FH:
+      FH.writelines ( blocks )
+# --- end of write_atomic_fsync (...) ---
+
+WRITERS = collections.OrderedDict ( (
+   ( 'lines',        write_lines ),
+   ( 'blocks',       write_blocks ),
+   ( 'atomic',       write_atomic ),
+   ( 'atomic_fsync', write_atomic_fsync ),
+) )
+
+
+def render ( config ):
+   """Links the config's modules and returns ( <lines>, <blocks> )."""
+   deptable = shlibcclib.library.make_dependency_table (
+      config.shlib_path, config.modules, config
+   )
+   shlib = shlibcclib.linker.make_shlib_file (
+      config,
+      shlibcclib.depgraph.DependencyList (
+         deptable, config.stable_sort, config.reduce_edges
+      )
+   )
+   return ( list ( shlib.generate_lines() ), list ( shlib.generate_blocks() ) )
+# --- end of render (...) ---
+
+def main():
+   parser = argparse.ArgumentParser (
+      description = "shlibcc output writer throughput"
+   )
+   parser.add_argument (
+      '--runs', type=int, default=10, metavar='<n>', help="[%(default)s]"
+   )
+   parser.add_argument (
+      '--writers', default=','.join ( WRITERS ), metavar='<writer>[,...]',
+      help = "writers to compare [%(default)s]",
+   )
+   parser.add_argument (
+      '--output', '-o', default=None, metavar='<file>',
+      help = "results file (json), defaults to stdout",
+   )
+   benchmarks.synthlib.add_arguments ( parser )
+   args = parser.parse_args()
+
+   writers = [ name for name in args.writers.split ( ',' ) if name ]
+   for name in writers:
+      if name not in WRITERS:
+         parser.error ( "unknown writer {!r}".format ( name ) )
+
+   tmpdir = tempfile.mkdtemp ( prefix='shlibcc-bench-' )
+   try:
+      libroot = os.path.join ( tmpdir, 'synthlib' )
+      os.makedirs ( libroot )
+      info = benchmarks.synthlib.generate (
+         libroot, **benchmarks.synthlib.get_params ( args )
+      )
+
+      lines, blocks = render (
+         benchmarks.common.make_config (
+            benchmarks.synthlib.get_shlibcc_args ( info )
+            + [ '--as-lib', '--' ] + info ['targets']
+         )
+      )
+      num_bytes = sum ( len ( block.encode ( 'utf-8' ) ) for block in blocks )
+
+      outfile = os.path.join ( tmpdir, 'out.sh' )
+      timings = benchmarks.common.Timings()
+      for _ in range ( args.runs ):
+         for name in writers:
+            timings.measure ( name, WRITERS [name], outfile, lines, blocks )
+            os.unlink ( outfile )
+      # -- end for
+   finally:
+      shutil.rmtree ( tmpdir )
+
+   results = timings.get_data()
+   for name, entry in results.items():
+      entry ['mib_per_s'] = (
+         num_bytes / ( 1024.0 * 1024.0 ) / max ( entry ['min'], 1e-9 )
+      )
+      sys.stderr.write (
+         "{:<14} min {:10.3f} ms   {:10.1f} MiB/s\n".format (
+            name, 1000 * entry ['min'], entry ['mib_per_s']
+         )
+      )
+
+   benchmarks.common.write_results (
+      'writer',
+      collections.OrderedDict ( (
+         ( 'runs',     args.runs ),
+         ( 'writers',  writers ),
+         ( 'bytes',    num_bytes ),
+         ( 'synthlib', info ['params'] ),
+      ) ),
+      results,
+      args.output,
+   )
+# --- end of main (...) ---
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,189 @@
+# shlibcc -- in-process api
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# Use shlibcc without sys.argv/stdout, e.g.:
+#
+#  session = shlibcclib.api.Session()
+#  config  = shlibcclib.api.Config (
+#     shlib_dir='/usr/share/shlib', modules=[ 'scriptinfo' ], is_lib=True
+#  )
+#  with open ( 'out.sh', 'wt' ) as FH:
+#     FH.writelines ( session.link ( config ) )
+#
+# Config errors are raised as ShlibccConfigError instead of exiting.
+#
+
+__all__ = [
+   'ShlibccConfigError', 'Config', 'Session',
+   'resolve', 'sort', 'link',
+]
+
+import argparse
+
+import shlibcclib.depgraph
+import shlibcclib.library
+import shlibcclib.linker
+import shlibcclib.main
+import shlibcclib.shlib
+
+
+class ShlibccConfigError ( Exception ):
+   pass
+
+
+class Config ( shlibcclib.main.ShlibccConfig ):
+   """shlibcc config created from keyword arguments.
+
+   The keywords are the dest names of the command line options (e.g.
+   shlib_dir, shlib_include_dirs, modules, is_lib, strip_all, output,
+   keep_safety_checks); options that take a value accept the same strings
+   as on the command line. Unspecified options have their usual defaults.
+   """
+
+   def __init__ ( self, action=shlibcclib.main.ACTION_LINK, **kwargs ):
+      """Constructor.
+
+      arguments:
+      * action   -- action, defaults to link
+      * **kwargs -- config options
+      """
+      kwargs ['action'] = action
+      super ( Config, self ).__init__ (
+         shlibcclib.main.ACTIONS, shlibcclib.main.ACTION_LINK, kwargs
+      )
+   # --- end of __init__ (...) ---
+
+   def get_option_actions ( self ):
+      """Returns a dict <dest> => <argparse action> for all options,
+      preferring options that take a value over flags."""
+      actions = dict()
+      for action in self.parser._actions:
+         if action.dest is argparse.SUPPRESS or action.dest == 'help':
+            pass
+         elif action.dest not in actions or actions [action.dest].nargs == 0:
+            actions [action.dest] = action
+      return actions
+   # --- end of get_option_actions (...) ---
+
+   def convert_value ( self, action, value ):
+      if action.type is None or not isinstance ( value, str ):
+         converted = value
+      else:
+         try:
+            converted = action.type ( value )
+         except ( argparse.ArgumentTypeError, TypeError, ValueError ) as err:
+            self.error ( "{}: {}".format ( action.dest, err ) )
+
+      if action.choices is not None and converted not in action.choices:
+         self.error (
+            "{}: invalid choice {!r}".format ( action.dest, converted )
+         )
+
+      return converted
+   # --- end of convert_value (...) ---
+
+   def parse_args ( self, kwargs ):
+      argv_config = self.parser.parse_args ( [] )
+      actions     = self.get_option_actions()
+
+      for key, value in kwargs.items():
+         action = actions.get ( key )
+         if action is None:
+            raise TypeError ( "unknown config option {!r}".format ( key ) )
+
+         elif isinstance ( value, ( list, tuple ) ) and (
+            action.nargs in { '*', '+' } or isinstance ( action.default, list )
+         ):
+            value = [ self.convert_value ( action, v ) for v in value ]
+         else:
+            value = self.convert_value ( action, value )
+
+         setattr ( argv_config, key, value )
+      # -- end for
+
+      return argv_config
+   # --- end of parse_args (...) ---
+
+   def error ( self, message ):
+      raise ShlibccConfigError ( message )
+   # --- end of error (...) ---
+
+   def die ( self, status=0, message=None ):
+      raise ShlibccConfigError (
+         message or "exit status {}".format ( status )
+      )
+   # --- end of die (...) ---
+
+# --- end of Config ---
+
+
+def resolve ( config ):
+   """Creates the dependency table for the config's modules.
+
+   arguments:
+   * config -- configuration
+   """
+   return shlibcclib.library.make_dependency_table (
+      config.shlib_path, config.modules, config
+   )
+# --- end of resolve (...) ---
+
+def sort ( config, deptable ):
+   """Returns the modules of a dependency table in link order
+   (a list of objects with name and fspath attributes).
+
+   arguments:
+   * config   -- configuration
+   * deptable -- dependency table, see resolve()
+   """
+   if config.no_sort:
+      return list ( deptable )
+   else:
+      return shlibcclib.depgraph.DependencyList (
+         deptable, config.stable_sort, config.reduce_edges
+      ).deplist
+# --- end of sort (...) ---
+
+def link ( config, modules=None, module_cache=None ):
+   """Parses the given modules and returns a generator of output chunks
+   (strings ending with a newline, see ShlibFile.generate_blocks()).
+
+   arguments:
+   * config       -- configuration
+   * modules      -- modules in link order (see sort()),
+                     defaults to sort ( config, resolve ( config ) )
+   * module_cache -- ShlibModuleCache for reusing parsed modules, or None
+   """
+   if modules is None:
+      modules = sort ( config, resolve ( config ) )
+
+   return shlibcclib.linker.make_shlib_file (
+      config, modules, module_cache
+   ).generate_blocks()
+# --- end of link (...) ---
+
+
+class Session ( object ):
+   """Keeps parsed modules between resolve/sort/link calls."""
+
+   def __init__ ( self ):
+      super ( Session, self ).__init__()
+      self.module_cache = shlibcclib.shlib.ShlibModuleCache()
+   # --- end of __init__ (...) ---
+
+   def resolve ( self, config ):
+      return resolve ( config )
+   # --- end of resolve (...) ---
+
+   def sort ( self, config, deptable ):
+      return sort ( config, deptable )
+   # --- end of sort (...) ---
+
+   def link ( self, config, modules=None ):
+      return link ( config, modules, self.module_cache )
+   # --- end of link (...) ---
+
+# --- end of Session ---
@@ -0,0 +1,321 @@
+# shlibcc -- single-file module library archives
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# An archive contains the module files, depfiles, directory manifests and
+# CC blocker files of a module library ("shlibcc --pack <root> <archive>").
+#
+# Archives are passed to -S/-I like directories. They get mounted into
+# the filesystem access layer (shlibcclib.fsio) at the archive's path,
+# e.g. module "a/b" of archive "/x/lib.shla" is "/x/lib.shla/a/b.sh".
+# Lookups are served from the archive's index and reads from an mmap of
+# the archive file.
+#
+# File format (integers are little-endian):
+#
+#  <magic:8> <version:u32> <index offset:u64> <index size:u64>
+#  <file data>...
+#  <index>
+#
+# The index is utf-8 text with one "<type> <offset> <size> <relpath>" line
+# per entry, where <type> is "d" (directory) or "f" (file). The archive
+# root is the directory "" and its "d" line is omitted.
+#
+
+__all__ = [ 'LibraryArchive', 'is_archive', 'mount', 'pack', ]
+
+import errno
+import io
+import mmap
+import os
+import stat
+import struct
+
+import shlibcclib.deputil
+import shlibcclib.fsio
+import shlibcclib.message
+
+debug_print = shlibcclib.message.debug_print
+
+
+ARCHIVE_MAGIC   = b'SHLIBCCA'
+ARCHIVE_VERSION = 1
+ARCHIVE_HEADER  = struct.Struct ( '<IQQ' )
+ARCHIVE_OFFSET  = len ( ARCHIVE_MAGIC ) + ARCHIVE_HEADER.size
+
+# depfile suffix and module file suffixes
+PACK_SUFFIXES   = frozenset ( { '.depend', '.sh', '.bash' } )
+PACK_NAMES      = frozenset (
+   ( shlibcclib.deputil.CC_BLOCKER_NAME, )
+   + shlibcclib.deputil.DIR_MANIFEST_NAMES
+)
+
+
+class LibraryArchiveException ( Exception ):
+   pass
+
+
+class ArchiveStat ( object ):
+   """Subset of os.stat_result for archive entries."""
+
+   __slots__ = ( 'st_mode', 'st_size', 'st_mtime', 'st_mtime_ns' )
+
+   def __init__ ( self, mode, size, archive_stat ):
+      super ( ArchiveStat, self ).__init__()
+      self.st_mode     = mode
+      self.st_size     = size
+      self.st_mtime    = archive_stat.st_mtime
+      self.st_mtime_ns = archive_stat.st_mtime_ns
+   # --- end of __init__ (...) ---
+
+# --- end of ArchiveStat ---
+
+
+class LibraryArchive ( object ):
+   """A read-only, mmapped module library archive.
+
+   Paths passed to the methods of this class are relative to the
+   archive root (without a leading "/"), "" refers to the root.
+   """
+
+   def __init__ ( self, fspath ):
+      super ( LibraryArchive, self ).__init__()
+      self.fspath = fspath
+      # relpath => ( <offset>, <size> )
+      self.files  = dict()
+      # relpath => ( <list of dirnames>, <list of filenames> )
+      self.dirs   = { '': ( [], [] ) }
+
+      with open ( fspath, 'rb' ) as FH:
+         self.archive_stat = os.fstat ( FH.fileno() )
+         self._mmap        = mmap.mmap (
+            FH.fileno(), 0, access=mmap.ACCESS_READ
+         )
+
+      self._read_index()
+   # --- end of __init__ (...) ---
+
+   def _read_index ( self ):
+      data = self._mmap
+      if data [:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC:
+         raise LibraryArchiveException (
+            "{!r} is not a shlib archive".format ( self.fspath )
+         )
+
+      version, index_offset, index_size = ARCHIVE_HEADER.unpack_from (
+         data, len ( ARCHIVE_MAGIC )
+      )
+      if version != ARCHIVE_VERSION:
+         raise LibraryArchiveException (
+            "{!r}: unsupported archive version {:d}".format (
+               self.fspath, version
+            )
+         )
+
+      index = data [index_offset:index_offset+index_size].decode ( 'utf-8' )
+      for line in filter ( None, index.splitlines() ):
+         ftype, offset, size, relpath = line.split ( ' ', 3 )
+         parent, name = os.path.split ( relpath )
+
+         if ftype == 'd':
+            self.dirs [relpath] = ( [], [] )
+            self.dirs [parent] [0].append ( name )
+         else:
+            self.files [relpath] = ( int ( offset ), int ( size ) )
+            self.dirs [parent] [1].append ( name )
+   # --- end of _read_index (...) ---
+
+   def close ( self ):
+      self._mmap.close()
+   # --- end of close (...) ---
+
+   def _not_found ( self, relpath ):
+      return FileNotFoundError (
+         errno.ENOENT, os.strerror ( errno.ENOENT ),
+         os.path.join ( self.fspath, relpath )
+      )
+   # --- end of _not_found (...) ---
+
+   def read_bytes ( self, relpath ):
+      try:
+         offset, size = self.files [relpath]
+      except KeyError:
+         raise self._not_found ( relpath )
+      return self._mmap [offset:offset+size]
+   # --- end of read_bytes (...) ---
+
+   def stat ( self, relpath ):
+      entry = self.files.get ( relpath )
+      if entry is not None:
+         return ArchiveStat (
+            stat.S_IFREG | 0o444, entry[1], self.archive_stat
+         )
+      elif relpath in self.dirs:
+         return ArchiveStat ( stat.S_IFDIR | 0o555, 0, self.archive_stat )
+      else:
+         raise self._not_found ( relpath )
+   # --- end of stat (...) ---
+
+   def isfile ( self, relpath ):
+      return relpath in self.files
+   # --- end of isfile (...) ---
+
+   def isdir ( self, relpath ):
+      return relpath in self.dirs
+   # --- end of isdir (...) ---
+
+   def exists ( self, relpath ):
+      return relpath in self.files or relpath in self.dirs
+   # --- end of exists (...) ---
+
+   def open (
+      self, relpath, mode='r', buffering=-1, encoding=None, errors=None,
+      newline=None
+   ):
+      if any ( c in mode for c in 'wax+' ):
+         raise OSError (
+            errno.EROFS, os.strerror ( errno.EROFS ),
+            os.path.join ( self.fspath, relpath )
+         )
+
+      data = io.BytesIO ( self.read_bytes ( relpath ) )
+      if 'b' in mode:
+         return data
+      else:
+         return io.TextIOWrapper (
+            data, encoding=encoding, errors=errors, newline=newline
+         )
+   # --- end of open (...) ---
+
+   def walk ( self, relpath, top ):
+      """Generator that yields ( <dirpath>, <dirnames>, <filenames> ) like
+      os.walk(top) (top-down), where top is the path of relpath.
+
+      arguments:
+      * relpath -- directory in the archive
+      * top     -- path of relpath (including the mountpoint)
+      """
+      entry = self.dirs.get ( relpath )
+      if entry is not None:
+         dirnames = list ( entry[0] )
+         yield ( top, dirnames, list ( entry[1] ) )
+
+         for name in dirnames:
+            for item in self.walk (
+               ( relpath + os.sep + name if relpath else name ),
+               top + os.sep + name
+            ):
+               yield item
+   # --- end of walk (...) ---
+
+   def __repr__ ( self ):
+      return '{cls.__name__}({fspath!r})'.format (
+         cls=self.__class__, fspath=self.fspath
+      )
+
+# --- end of LibraryArchive ---
+
+
+def is_archive ( fspath ):
+   """Returns True if the given file is a module library archive."""
+   try:
+      with open ( fspath, 'rb' ) as FH:
+         return FH.read ( len ( ARCHIVE_MAGIC ) ) == ARCHIVE_MAGIC
+   except ( IOError, OSError ):
+      return False
+# --- end of is_archive (...) ---
+
+def mount ( fspath ):
+   """Opens a module library archive and mounts it at its own path
+   (see shlibcclib.fsio.mount()). Does nothing if it is already mounted.
+
+   arguments:
+   * fspath -- absolute path to the archive
+   """
+   if fspath not in shlibcclib.fsio.MOUNTS:
+      archive = LibraryArchive ( fspath )
+      debug_print (
+         "mounting {!r} ({:d} files)".format ( fspath, len ( archive.files ) )
+      )
+      shlibcclib.fsio.mount ( fspath, archive )
+# --- end of mount (...) ---
+
+def iter_library_files ( root ):
+   """Generator that yields ( <type>, <relpath>, <fspath> ) for all
+   directories ("d") and files ("f") of a module library that get packed,
+   in a stable order.
+
+   arguments:
+   * root -- module library root directory
+   """
+   for dirpath, dirnames, filenames in os.walk ( root, followlinks=True ):
+      dirnames.sort()
+      relpath = os.path.relpath ( dirpath, root )
+      prefix  = '' if relpath == os.curdir else relpath + os.sep
+
+      if prefix:
+         yield ( 'd', relpath, dirpath )
+
+      for name in sorted ( filenames ):
+         if (
+            name in PACK_NAMES
+            or os.path.splitext ( name )[1] in PACK_SUFFIXES
+         ):
+            yield ( 'f', prefix + name, dirpath + os.sep + name )
+# --- end of iter_library_files (...) ---
+
+def pack ( root, archive_path ):
+   """Packs a module library into a single archive file and returns the
+   number of files packed.
+
+   The archive is written to a temporary file first, which then replaces
+   archive_path (see shlibcclib.fsio.open_atomic()).
+
+   arguments:
+   * root         -- module library root directory
+   * archive_path -- archive file
+   """
+   index = []
+
+   with shlibcclib.fsio.open_atomic (
+      archive_path, binary=True, buffering=-1
+   ) as FH:
+      _write_archive ( root, FH, index )
+
+   return sum ( 1 for entry in index if entry[0] == 'f' )
+# --- end of pack (...) ---
+
+def _write_archive ( root, FH, index ):
+   """Writes a module library archive to a seekable file handle (binary
+   mode) and appends the index lines to the given list."""
+   FH.write ( ARCHIVE_MAGIC )
+   FH.write ( ARCHIVE_HEADER.pack ( ARCHIVE_VERSION, 0, 0 ) )
+   offset = ARCHIVE_OFFSET
+
+   for ftype, relpath, fspath in iter_library_files ( root ):
+      if '\n' in relpath:
+         raise LibraryArchiveException (
+            "cannot pack file names with newlines: {!r}".format ( fspath )
+         )
+
+      if ftype == 'd':
+         index.append ( "d 0 0 " + relpath )
+      else:
+         with open ( fspath, 'rb' ) as IN_FH:
+            data = IN_FH.read()
+         FH.write ( data )
+         index.append (
+            "f {:d} {:d} {}".format ( offset, len ( data ), relpath )
+         )
+         offset += len ( data )
+   # -- end for
+
+   index_data = ( '\n'.join ( index ) + '\n' ).encode ( 'utf-8' )
+   FH.write ( index_data )
+   FH.seek ( len ( ARCHIVE_MAGIC ) )
+   FH.write (
+      ARCHIVE_HEADER.pack ( ARCHIVE_VERSION, offset, len ( index_data ) )
+   )
+# --- end of _write_archive (...) ---
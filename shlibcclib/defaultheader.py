@@ -4,7 +4,7 @@
 # Distributed under the terms of the GNU General Public License;
 # either version 2 of the License, or (at your option) any later version.
 
-__all__ = [ 'make', ]
+__all__ = [ 'make', 'get_header_time', ]
 
 import time
 import textwrap
@@ -12,15 +12,33 @@ import textwrap
 #SHLIB_AUTHOR_NAME  = 'Andr\u00e9 Erdmann'
 SHLIB_AUTHOR_NAME  = 'Andre Erdmann'
 SHLIB_AUTHOR_EMAIL = 'dywi@mailerd.de'
+SHLIB_COPYRIGHT_YEAR = 2012
 
 ENCODING_COMMENT   = '# -*- coding: utf-8 -*-'
 
-def make ( config, format_comment=None ):
-   """Creates the default header for linked files."""
+def get_header_time ( config ):
+   """Returns a 2-tuple ( <date str>, <year> ) for the default header.
 
-   #HEADER_DATE_FMT = "%Y-%m-%d %H:%M:%S (%Z)"
+   The date is taken from SOURCE_DATE_EPOCH (UTC), if set. Otherwise, the
+   current date is used, unless in reproducible mode, where the date is
+   None and the year is the first copyright year.
+   """
    HEADER_DATE_FMT = "%Y-%m-%d"
 
+   if config.source_date_epoch is not None:
+      build_time = time.gmtime ( config.source_date_epoch )
+      return (
+         time.strftime ( HEADER_DATE_FMT, build_time ), build_time.tm_year
+      )
+   elif config.reproducible:
+      return ( None, SHLIB_COPYRIGHT_YEAR )
+   else:
+      return ( time.strftime ( HEADER_DATE_FMT ), time.gmtime().tm_year )
+# --- end of get_header_time (...) ---
+
+def make ( config, format_comment=None ):
+   """Creates the default header for linked files."""
+
    if format_comment is None:
       comment_formatter = textwrap.TextWrapper(
          width              = 60,
@@ -40,7 +58,6 @@ def make ( config, format_comment=None ):
          return '# ' + ( ' ' + str ( s ) + ' ' ).center ( l )
    # --- end of centered (...) ---
 
-   gmtime     = time.gmtime()
    EMPTY_LINE = '#'
 
    shell_format = config.shell_format
@@ -64,15 +81,17 @@ def make ( config, format_comment=None ):
       )))
 
    else:
+      header_date, header_year = get_header_time ( config )
+
       return '\n'.join ( filter ( None, (
          shebang,
          ENCODING_COMMENT,
          EMPTY_LINE,
          fmt (
             'This file has been autogenerated by the '
-            'shlib compiler version {ver} on {date}'.format (
+            'shlib compiler version {ver}{date}'.format (
                ver  = config.version_str,
-               date = time.strftime(HEADER_DATE_FMT)
+               date = ( ' on ' + header_date if header_date else '' ),
             ),
          ),
          EMPTY_LINE,
@@ -87,8 +106,12 @@ def make ( config, format_comment=None ):
             if config.strip_comments else None
          ),
          fmt (
-            'Copyright (C) 2012-{year} {author} <{mail}>'.format (
-               year   = gmtime.tm_year,
+            'Copyright (C) {years} {author} <{mail}>'.format (
+               years  = (
+                  str ( SHLIB_COPYRIGHT_YEAR )
+                  if header_year <= SHLIB_COPYRIGHT_YEAR
+                  else '{:d}-{:d}'.format ( SHLIB_COPYRIGHT_YEAR, header_year )
+               ),
                author = SHLIB_AUTHOR_NAME,
                mail   = SHLIB_AUTHOR_EMAIL,
             ),
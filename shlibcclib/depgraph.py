@@ -5,9 +5,12 @@
 # either version 2 of the License, or (at your option) any later version.
 
 import shlibcclib.generic.graph
+import shlibcclib.profiler
 
 class ModuleData ( object ):
 
+   __slots__ = ( 'name', 'fspath' )
+
    def __init__ ( self, name, fspath ):
       self.name   = name
       self.fspath = fspath
@@ -21,35 +24,40 @@ class ModuleData ( object ):
 
 class DependencyGraph ( shlibcclib.generic.graph.DirectedGraph ):
 
-   def __init__ ( self, deptable ):
+   def __init__ ( self, deptable, reduce_edges=False ):
       super ( DependencyGraph, self ).__init__()
 
-      for deptable_node in iter ( deptable ):
-         if deptable_node.name != '.':
-            self.add_node (
-               deptable_node.name,
-               ModuleData ( deptable_node.name, deptable_node.fspath ),
-               deptable_node.direct_deps,
-            )
+      with shlibcclib.profiler.PROFILER.phase ( 'graph' ):
+         for deptable_node in iter ( deptable ):
+            if deptable_node.name != '.':
+               self.add_node (
+                  deptable_node.name,
+                  ModuleData ( deptable_node.name, deptable_node.fspath ),
+                  deptable_node.direct_deps,
+               )
+
+         self.expand()
 
-      self.expand()
+         if reduce_edges:
+            self.transitive_reduction()
    # --- end of __init__ (...) ---
 
    def sort_dependencies ( self, stable ):
       # the result of toposort is a list where a node at position k
       # _can_ depend on any other node with position l >= k
       # => reverse the list
-      return list (
-         item [1] for item in reversed ( self.toposort ( stable=stable ) )
-      )
+      with shlibcclib.profiler.PROFILER.phase ( 'sort' ):
+         return list (
+            item [1] for item in reversed ( self.toposort ( stable=stable ) )
+         )
    # --- end of sort_dependencies (...) ---
 
 # --- end of DependencyGraph ---
 
 class DependencyList ( object ):
 
-   def __init__ ( self, deptable, stable_sort ):
-      self.depgraph = DependencyGraph ( deptable )
+   def __init__ ( self, deptable, stable_sort, reduce_edges=False ):
+      self.depgraph = DependencyGraph ( deptable, reduce_edges )
       self.deplist  = self.depgraph.sort_dependencies ( stable=stable_sort )
    # --- end of __init__ (...) ---
 
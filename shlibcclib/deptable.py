@@ -6,14 +6,18 @@
 
 __all__ = [ 'DependencyTable', ]
 
-import os
 import sys
 
 import shlibcclib.message
 
+from shlibcclib.deputil import get_module_key
+
 debug_print = shlibcclib.message.debug_print
 
 
+EMPTY_DEPS = frozenset()
+
+
 class DependencyTableException ( Exception ):
    pass
 
@@ -23,18 +27,29 @@ class DependencyTable ( object ):
 
    class DependencyTableNode ( object ):
 
+      __slots__ = ( 'name', 'fspath', 'direct_deps' )
+
       def __init__ ( self, name, fspath ):
          super ( DependencyTable.DependencyTableNode, self ).__init__()
-         self.name        = name
+         self.name        = sys.intern ( name )
          self.fspath      = fspath
          self.direct_deps = set()
       # --- end of __init__ (...) ---
 
       def register_direct_dep ( self, dep ):
          """Adds a modules dependency."""
-         self.direct_deps.add ( dep )
+         self.direct_deps.add ( sys.intern ( dep ) )
       # --- end of register_direct_dep (...) ---
 
+      def freeze ( self ):
+         """Replaces the dependency set with a frozenset (all nodes
+         without dependencies share the same empty frozenset)."""
+         self.direct_deps = (
+            frozenset ( self.direct_deps ) if self.direct_deps
+            else EMPTY_DEPS
+         )
+      # --- end of freeze (...) ---
+
       def __str__ ( self ):
          return "* {file} ({name}) => {deps}".format (
             file = self.fspath,
@@ -49,6 +64,9 @@ class DependencyTable ( object ):
       # name => direct deps
       self._table = dict()
       self.last   = None
+      # object with a check_module ( name ) method that raises an exception
+      # if a module must not be added, see library.ModuleBlockers
+      self.module_blockers = None
    # --- end of __init__ (...) ---
 
    def iter_nodes ( self, module_names, frozen=False ):
@@ -60,7 +78,7 @@ class DependencyTable ( object ):
                         or not (False). Defaults to False, which is faster.
       """
       for m in module_names:
-         name = os.path.normpath ( m )
+         name = get_module_key ( m )
          node = self._table [name]
          assert node.name == name
          yield (
@@ -87,7 +105,8 @@ class DependencyTable ( object ):
       """Adds a module to this table.
 
       Returns True if an entry for the module has been added (module is new),
-      else False (module exists).
+      else False (module exists). Blocked modules are rejected by raising
+      an exception, see module_blockers.
 
       arguments:
       * name   -- name of the module
@@ -97,11 +116,21 @@ class DependencyTable ( object ):
          self.last = None
          return False
       else:
+         if self.module_blockers is not None:
+            self.module_blockers.check_module ( name )
          self.last = self.DependencyTableNode ( name, fspath )
          self._table [name] = self.last
          return True
    # --- end of add_new (...) ---
 
+   def freeze ( self ):
+      """Freezes the dependency sets of all nodes. Has to be called after
+      adding all modules and dependencies."""
+      for node in self._table.values():
+         node.freeze()
+      self.last = None
+   # --- end of freeze (...) ---
+
    def __str__ ( self ):
       return '\n'.join ( str ( node ) for node in self )
    # --- end of __str__ (...) ---
@@ -111,4 +140,9 @@ class DependencyTable ( object ):
          yield ( node.name, node.fspath )
    # --- end of get_file_list (...) ---
 
+   def get_fspath_index ( self ):
+      """Returns a dict <module path> => <module name>."""
+      return dict ( ( node.fspath, node.name ) for node in self )
+   # --- end of get_fspath_index (...) ---
+
 # --- end of DependencyTable ---
@@ -5,31 +5,104 @@
 # either version 2 of the License, or (at your option) any later version.
 
 import collections
+import functools
 import os
-from os.path import abspath, dirname, isfile, splitext
+import sys
+from os.path import abspath, dirname, splitext
+
+import shlibcclib.fsio
+import shlibcclib.profiler
 
 
 relpath_null_resolver = lambda x,k: x
 
+# suffix of pre-processed module files, see shlibcclib.objfile
+OBJECT_SUFFIX = '.shlo'
+
+# name of the file that marks a directory as not includable
+CC_BLOCKER_NAME = 'block_CC'
+
+# names of per-directory dependency manifests, in descending order
+DIR_MANIFEST_NAMES = ( '.shlibdeps', 'DEPENDS' )
+
+# key of the module root directory ("/", "." and "" refer to it)
+ROOT_MODULE_KEY = sys.intern ( os.sep )
+
+# max. number of module name => key entries kept by get_module_key()
+MODULE_KEY_CACHE_SIZE = 1 << 16
+
+
+class ModuleKeyException ( ValueError ):
+   pass
+
+
+@functools.lru_cache ( maxsize=MODULE_KEY_CACHE_SIZE )
+def _make_module_key ( name ):
+   key = os.path.normpath ( name ).lstrip ( os.sep )
+   if not key or key == os.curdir:
+      return ROOT_MODULE_KEY
+   elif key == os.pardir or key.startswith ( os.pardir + os.sep ):
+      raise ModuleKeyException (
+         "module {!r} is outside of the module root".format ( name )
+      )
+   return sys.intern ( key )
+# --- end of _make_module_key (...) ---
+
+def get_module_key ( name, parent_key=None ):
+   """Returns the canonical (normalized, interned) key of a module name,
+   e.g. "a/./b//c" => "a/b/c". Keys of recently seen names are looked up
+   in a (bounded) cache.
+
+   Relative names ("./<name>", "../<name>") are resolved against the
+   directory of parent_key. Raises ModuleKeyException if the name points
+   to a location outside of the module root.
+
+   arguments:
+   * name       -- module name
+   * parent_key -- key of the module that refers to name (or None)
+   """
+   if parent_key and (
+      name[:2] == os.curdir + os.sep or name[:3] == os.pardir + os.sep
+   ):
+      return _make_module_key (
+         os.path.join ( dirname ( parent_key ), name )
+      )
+   else:
+      return _make_module_key ( name )
+# --- end of get_module_key (...) ---
+
+def get_module_subkey ( parent_key, basename ):
+   """Returns the key of a module in the directory of parent_key
+   (a canonical key, ROOT_MODULE_KEY for the module root)."""
+   if not parent_key or parent_key == ROOT_MODULE_KEY:
+      return sys.intern ( basename )
+   else:
+      return sys.intern ( parent_key + os.sep + basename )
+# --- end of get_module_subkey (...) ---
 
 def locate_depfile ( filename, basename=None, file_suffix='.depend' ):
    depfile = filename + file_suffix
 
-   if isfile ( depfile ):
+   if shlibcclib.fsio.isfile ( depfile ):
       return depfile
    else:
       depfile = (
          ( splitext ( filename )[0] if basename is None else basename )
          + file_suffix
       )
-      if isfile ( depfile ):
+      if shlibcclib.fsio.isfile ( depfile ):
          return depfile
       else:
          return None
 # --- end of locate_depfile (...) ---
 
 def _read_depfile ( depfile, relpath_resolve, dep_dict, blocker_dict ):
-   with open ( depfile, 'rt' ) as FH:
+   profiler = shlibcclib.profiler.PROFILER
+   profiler.count ( 'depfiles' )
+
+   with profiler.phase ( 'depfiles', depfile ), shlibcclib.fsio.open (
+      depfile, 'rt'
+   ) as FH:
       for line in FH.readlines():
          dep = line.strip()
          if dep and dep[0] != '#':
@@ -51,6 +124,136 @@ def _read_depfile ( depfile, relpath_resolve, dep_dict, blocker_dict ):
    # -- end with <FH>
 # --- end of _read_depfile (...) ---
 
+def read_dir_manifest ( manifest ):
+   """Reads a per-directory dependency manifest and returns a dict
+   <module basename> => ( <list of deps>, <list of blockers> ).
+
+   Each line of a directory manifest has the form "<module>: <dep>...",
+   where <module> is the name of a module file in the manifest's directory
+   without its suffix and each <dep> is an entry as in depfiles (a module
+   name or a "!<module>" blocker). Modules may appear on several lines.
+
+   arguments:
+   * manifest -- manifest file
+   """
+   profiler = shlibcclib.profiler.PROFILER
+   profiler.count ( 'depfiles' )
+
+   entries = dict()
+
+   with profiler.phase ( 'depfiles', manifest ), shlibcclib.fsio.open (
+      manifest, 'rt'
+   ) as FH:
+      for line in FH.readlines():
+         sline = line.strip()
+         if not sline or sline[0] == '#':
+            continue
+
+         module, sepa, deps = sline.partition ( ':' )
+         module = module.strip()
+         if not sepa or not module or os.sep in module:
+            raise Exception (
+               "invalid entry {!r} in directory manifest {!r}".format (
+                  sline, manifest
+               )
+            )
+
+         entry = entries.get ( module )
+         if entry is None:
+            entry = ( collections.OrderedDict(), collections.OrderedDict() )
+            entries [module] = entry
+
+         for dep in deps.split():
+            if dep[0] != '!':
+               entry[0] [dep] = None
+            elif len ( dep ) > 1 and dep[1] != '!':
+               entry[1] [dep[1:]] = None
+            else:
+               raise Exception (
+                  "invalid blocker entry {!r} in directory manifest "
+                  "{!r}".format ( dep, manifest )
+               )
+      # -- end for <line>
+   # -- end with <FH>
+
+   return dict (
+      ( module, ( list ( deps_d.keys() ), list ( blockers_d.keys() ) ) )
+      for module, ( deps_d, blockers_d ) in entries.items()
+   )
+# --- end of read_dir_manifest (...) ---
+
+
+class DirectoryManifests ( object ):
+   """Reads per-directory dependency manifests (see read_dir_manifest())
+   on demand and keeps them, so that each directory is checked once."""
+
+   def __init__ ( self, manifest_names=DIR_MANIFEST_NAMES ):
+      super ( DirectoryManifests, self ).__init__()
+      self.manifest_names = manifest_names
+      # dirpath => ( <manifest file>, <entries dict> ) or None
+      self._manifests     = dict()
+   # --- end of __init__ (...) ---
+
+   def _load ( self, dirpath, manifest ):
+      if manifest is None:
+         result = None
+      else:
+         result = ( manifest, read_dir_manifest ( manifest ) )
+      self._manifests [dirpath] = result
+      return result
+   # --- end of _load (...) ---
+
+   def scan ( self, dirpath, filenames ):
+      """Loads the manifest of a directory whose file listing is known
+      (e.g. from os.walk()), which avoids stat()ing candidate manifests.
+
+      arguments:
+      * dirpath   -- directory
+      * filenames -- names of the files in dirpath
+      """
+      if dirpath not in self._manifests:
+         for name in self.manifest_names:
+            if name in filenames:
+               self._load ( dirpath, dirpath + os.sep + name )
+               break
+         else:
+            self._load ( dirpath, None )
+   # --- end of scan (...) ---
+
+   def get ( self, dirpath ):
+      try:
+         return self._manifests [dirpath]
+      except KeyError:
+         pass
+
+      for name in self.manifest_names:
+         manifest = dirpath + os.sep + name
+         if shlibcclib.fsio.isfile ( manifest ):
+            return self._load ( dirpath, manifest )
+
+      return self._load ( dirpath, None )
+   # --- end of get (...) ---
+
+   def get_deps ( self, module_basepath ):
+      """Returns a 3-tuple ( <manifest>, <deps>, <blockers> ) for a module
+      or ( None, None, None ) if the module's directory has no manifest
+      or the manifest does not list the module.
+
+      arguments:
+      * module_basepath -- path to the module file without its suffix
+      """
+      dirpath, basename = os.path.split ( module_basepath )
+      result = self.get ( dirpath )
+      if result is not None:
+         entry = result[1].get ( basename )
+         if entry is not None:
+            return ( result[0], entry[0], entry[1] )
+      return ( None, None, None )
+   # --- end of get_deps (...) ---
+
+# --- end of DirectoryManifests ---
+
+
 def read_depfiles ( depfiles, relpath_resolver=None ):
    blockers_d = collections.OrderedDict()
    deps_d     = collections.OrderedDict()
@@ -76,6 +279,68 @@ def read_depfile ( depfile, relpath_resolver=None ):
    return ( list ( deps_d.keys() ), list ( blockers_d.keys() ) )
 # --- end of read_depfile (...) ---
 
+def get_manifest_default_target ( manifest, file_suffix='.depend' ):
+   """Returns the name of the target that is implicitly defined by the
+   given manifest file, which is the manifest's path without the depfile
+   suffix (i.e. the --main script of a depfile).
+   """
+   if manifest.endswith ( file_suffix ):
+      return manifest[:-len(file_suffix)]
+   else:
+      return manifest
+# --- end of get_manifest_default_target (...) ---
+
+def read_manifest ( manifest, targets_dict=None ):
+   """Reads a (batch) manifest file and returns an ordered dict
+   <target> => <ordered dict of modules>.
+
+   Each line of a manifest file has the form "<target>: <module>...".
+   Lines without a colon list modules of the manifest's default target,
+   see get_manifest_default_target(), which makes depfiles valid manifests.
+   Blocker entries ("!<module>") and comments are ignored.
+
+   arguments:
+   * manifest     -- manifest file
+   * targets_dict -- dict to which the targets should be added (or None)
+   """
+   targets = (
+      collections.OrderedDict() if targets_dict is None else targets_dict
+   )
+   default_target = get_manifest_default_target ( manifest )
+
+   with shlibcclib.fsio.open ( manifest, 'rt' ) as FH:
+      for line in FH.readlines():
+         sline = line.strip()
+         if not sline or sline[0] == '#':
+            pass
+         else:
+            target, sepa, modules = sline.partition ( ':' )
+            if sepa:
+               target = target.strip()
+               if not target:
+                  raise Exception (
+                     "invalid entry {!r} in manifest {!r}".format (
+                        sline, manifest
+                     )
+                  )
+            else:
+               target  = default_target
+               modules = sline
+
+            entry = targets.get ( target )
+            if entry is None:
+               entry = collections.OrderedDict()
+               targets [target] = entry
+
+            for module in modules.split():
+               if module[0] != '!':
+                  entry [module] = None
+      # -- end for <line>
+   # -- end with <FH>
+
+   return targets
+# --- end of read_manifest (...) ---
+
 def get_relpath_resolver ( shlib_dir_parent ):
    def resolve_dep_relpath ( relpath, depfile ):
       # lazy implementation
@@ -93,7 +358,7 @@ def get_relpath_resolver ( shlib_dir_parent ):
       else:
          return relpath
 
-      if os.path.isdir ( path ):
+      if shlibcclib.fsio.isdir ( path ):
          raise Exception (
             "direct depfile imports must be files, not directories."
          )
@@ -0,0 +1,195 @@
+# shlibcc -- machine-readable export of deptable, depgraph and deplist
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# All functions in this module are generators that yield output lines
+# (without a trailing newline) as soon as they are available, so that
+# exports never need to keep the entire output in memory.
+#
+
+__all__ = [
+   'FORMATS',
+   'iter_deptable_lines', 'iter_edge_lines', 'iter_deplist_lines',
+]
+
+FORMATS = ( 'json', 'jsonl', 'dot', 'tsv' )
+
+
+def _get_json_encode():
+   # json is imported on demand, the other formats do not need it
+   import json
+   return json.JSONEncoder ( sort_keys=True ).encode
+# --- end of _get_json_encode (...) ---
+
+def _tsv_escape ( s ):
+   return (
+      str ( s ).replace ( '\\', '\\\\' ).replace ( '\t', '\\t' )
+      .replace ( '\n', '\\n' )
+   )
+# --- end of _tsv_escape (...) ---
+
+def _dot_quote ( s ):
+   return '"' + str ( s ).replace ( '\\', '\\\\' ).replace ( '"', '\\"' ) + '"'
+# --- end of _dot_quote (...) ---
+
+def iter_json_array ( objects ):
+   """Yields a json array, one element per line."""
+   json_encode = _get_json_encode()
+   yield '['
+   prev = None
+   for obj in objects:
+      if prev is not None:
+         yield '  ' + prev + ','
+      prev = json_encode ( obj )
+
+   if prev is not None:
+      yield '  ' + prev
+   yield ']'
+# --- end of iter_json_array (...) ---
+
+def iter_jsonl ( objects ):
+   """Yields one json object per line."""
+   json_encode = _get_json_encode()
+   for obj in objects:
+      yield json_encode ( obj )
+# --- end of iter_jsonl (...) ---
+
+def iter_tsv ( header, rows ):
+   """Yields tab-separated rows, starting with the given header."""
+   yield '\t'.join ( header )
+   for row in rows:
+      yield '\t'.join ( _tsv_escape ( col ) for col in row )
+# --- end of iter_tsv (...) ---
+
+def iter_dot ( graph_name, node_edges ):
+   """Yields a graphviz digraph.
+
+   arguments:
+   * graph_name -- name of the graph
+   * node_edges -- iterable of 2-tuples ( <node>, <iterable of dest nodes> )
+   """
+   yield 'digraph {} {{'.format ( _dot_quote ( graph_name ) )
+   for node, dest_nodes in node_edges:
+      src = _dot_quote ( node )
+      have_edges = False
+      for dest_node in dest_nodes:
+         have_edges = True
+         yield '   {} -> {};'.format ( src, _dot_quote ( dest_node ) )
+      if not have_edges:
+         yield '   {};'.format ( src )
+   yield '}'
+# --- end of iter_dot (...) ---
+
+def _iter_format_lines ( fmt, get_objects, tsv_header, get_rows, get_dot ):
+   if fmt == 'json':
+      return iter_json_array ( get_objects() )
+   elif fmt == 'jsonl':
+      return iter_jsonl ( get_objects() )
+   elif fmt == 'tsv':
+      return iter_tsv ( tsv_header, get_rows() )
+   elif fmt == 'dot':
+      return get_dot()
+   else:
+      raise ValueError ( "unknown export format {!r}".format ( fmt ) )
+# --- end of _iter_format_lines (...) ---
+
+def iter_deptable_lines ( deptable, fmt ):
+   """Exports a dependency table (one entry per module).
+
+   arguments:
+   * deptable -- dependency table
+   * fmt      -- export format, see FORMATS
+   """
+   def get_objects():
+      for node in deptable:
+         yield {
+            'name'   : node.name,
+            'fspath' : node.fspath,
+            'deps'   : sorted ( node.direct_deps ),
+         }
+
+   def get_rows():
+      for node in deptable:
+         yield (
+            node.name, node.fspath, ' '.join ( sorted ( node.direct_deps ) )
+         )
+
+   def get_dot():
+      return iter_dot (
+         'deptable',
+         ( ( node.name, sorted ( node.direct_deps ) ) for node in deptable )
+      )
+
+   return _iter_format_lines (
+      fmt, get_objects, ( 'name', 'fspath', 'deps' ), get_rows, get_dot
+   )
+# --- end of iter_deptable_lines (...) ---
+
+def iter_edge_lines ( depgraph, fmt, reverse=False ):
+   """Exports the edges of a dependency graph (one entry per edge).
+
+   arguments:
+   * depgraph -- dependency graph
+   * fmt      -- export format, see FORMATS
+   * reverse  -- whether to export "required by" instead of "depends on"
+                 edges. Defaults to False.
+   """
+   if reverse:
+      key = 'required_by'
+      iter_edges = lambda: (
+         ( b, a ) for a, b in depgraph.iter_reverse_edges()
+      )
+   else:
+      key = 'depends_on'
+      iter_edges = depgraph.iter_edges
+
+   def get_objects():
+      for a, b in iter_edges():
+         yield { 'module': a, key: b }
+
+   def get_dot():
+      return iter_dot (
+         ( 'revdep' if reverse else 'depgraph' ),
+         ( ( a, ( b, ) ) for a, b in iter_edges() )
+      )
+
+   return _iter_format_lines (
+      fmt, get_objects, ( 'module', key ), iter_edges, get_dot
+   )
+# --- end of iter_edge_lines (...) ---
+
+def iter_deplist_lines ( deplist, fmt ):
+   """Exports a sorted dependency list (one entry per module, in link order).
+
+   arguments:
+   * deplist -- dependency list
+   * fmt     -- export format, see FORMATS
+   """
+   def get_objects():
+      for index, data in enumerate ( deplist ):
+         yield { 'index': index, 'name': data.name, 'fspath': data.fspath }
+
+   def get_rows():
+      for index, data in enumerate ( deplist ):
+         yield ( index, data.name, data.fspath )
+
+   def get_dot():
+      def iter_node_edges():
+         prev = None
+         for data in deplist:
+            if prev is not None:
+               yield ( prev, ( data.name, ) )
+            prev = data.name
+
+         if prev is not None:
+            yield ( prev, () )
+      # --- end of iter_node_edges (...) ---
+
+      return iter_dot ( 'deplist', iter_node_edges() )
+
+   return _iter_format_lines (
+      fmt, get_objects, ( 'index', 'name', 'fspath' ), get_rows, get_dot
+   )
+# --- end of iter_deplist_lines (...) ---
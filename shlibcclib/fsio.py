@@ -0,0 +1,405 @@
+# shlibcc -- filesystem access layer
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# All filesystem access of the module library, dep file handling, shlib
+# file processing and linker code goes through the functions of this
+# module, e.g. "shlibcclib.fsio.isfile ( path )".
+#
+# The functions are rebound by enable_accounting(), which replaces them
+# with variants that count calls, hits/misses and cumulative latency per
+# call site (<file>:<function>), and by mount(), which redirects paths
+# below a mountpoint to a module library archive. Callers must therefore
+# not import the functions directly ("from shlibcclib.fsio import isfile").
+#
+# Output files are written with open_atomic(), which is not rebound.
+#
+
+__all__ = [
+   'stat', 'isfile', 'isdir', 'exists', 'open', 'walk',
+   'enable_accounting', 'get_accounting', 'mount', 'umount',
+   'open_atomic',
+]
+
+import collections
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from stat import S_ISREG
+
+import shlibcclib.generic.graph
+
+_builtin_open = open
+
+
+stat   = os.stat
+isfile = os.path.isfile
+isdir  = os.path.isdir
+exists = os.path.exists
+open   = _builtin_open
+walk   = os.walk
+
+# operation => function, before rebinding
+_BASE_FUNCS = collections.OrderedDict ( (
+   ( 'stat',   stat ),
+   ( 'isfile', isfile ),
+   ( 'isdir',  isdir ),
+   ( 'exists', exists ),
+   ( 'open',   open ),
+   ( 'walk',   walk ),
+) )
+
+# mountpoint => archive, see mount()
+MOUNTS = collections.OrderedDict()
+
+# write buffer size of open_atomic()
+WRITE_BUFFER_SIZE = 1 << 20
+
+# process umask, read once (reading it requires setting it temporarily,
+# which is not thread-safe)
+_UMASK = os.umask ( 0o022 )
+os.umask ( _UMASK )
+
+
+class FsAccounting ( object ):
+   """Counters for filesystem calls, per ( operation, call site )."""
+
+   def __init__ ( self ):
+      super ( FsAccounting, self ).__init__()
+      # ( op, site ) => [ calls, hits, misses, seconds ]
+      self.counters = collections.OrderedDict()
+   # --- end of __init__ (...) ---
+
+   def add ( self, op, site, hit, seconds ):
+      key   = ( op, site )
+      entry = self.counters.get ( key )
+      if entry is None:
+         entry = [ 0, 0, 0, 0.0 ]
+         self.counters [key] = entry
+
+      entry [0] += 1
+      entry [1 if hit else 2] += 1
+      entry [3] += seconds
+   # --- end of add (...) ---
+
+   def iter_entries ( self ):
+      for ( op, site ), entry in self.counters.items():
+         yield ( op, site, entry[0], entry[1], entry[2], entry[3] )
+   # --- end of iter_entries (...) ---
+
+   def get_data ( self ):
+      return [
+         {
+            'op'      : op,
+            'site'    : site,
+            'calls'   : calls,
+            'hits'    : hits,
+            'misses'  : misses,
+            'seconds' : seconds,
+         } for op, site, calls, hits, misses, seconds in self.iter_entries()
+      ]
+   # --- end of get_data (...) ---
+
+   def format_report ( self ):
+      totals = collections.OrderedDict()
+      rows   = []
+
+      for op, site, calls, hits, misses, seconds in sorted (
+         self.iter_entries()
+      ):
+         rows.append ( (
+            op, site, str ( calls ), str ( hits ), str ( misses ),
+            "{:.3f}".format ( 1000 * seconds )
+         ) )
+         total = totals.setdefault ( op, [ 0, 0.0 ] )
+         total [0] += calls
+         total [1] += seconds
+
+      for line in shlibcclib.generic.graph.format_table (
+         rows,
+         [ (
+            '<op>', '<call site>', '<calls>', '<hits>', '<misses>', '<ms>'
+         ) ]
+      ):
+         yield line
+
+      yield ""
+      for op, total in totals.items():
+         yield "{}: {:d} calls, {:.3f} ms".format (
+            op, total [0], 1000 * total [1]
+         )
+   # --- end of format_report (...) ---
+
+   def report ( self, report_format='text', fh=None ):
+      if fh is None:
+         fh = sys.stderr
+
+      if report_format == 'json':
+         import json
+         json.dump ( self.get_data(), fh, indent=3 )
+         fh.write ( '\n' )
+      else:
+         for line in self.format_report():
+            fh.write ( line )
+            fh.write ( '\n' )
+   # --- end of report (...) ---
+
+# --- end of FsAccounting ---
+
+
+ACCOUNTING = None
+
+def get_accounting():
+   return ACCOUNTING
+# --- end of get_accounting (...) ---
+
+def _get_call_site ( depth=2 ):
+   code = sys._getframe ( depth ).f_code
+   return "{}:{}".format (
+      os.path.basename ( code.co_filename ),
+      getattr ( code, 'co_qualname', code.co_name ).replace (
+         '.<locals>', ''
+      )
+   )
+# --- end of _get_call_site (...) ---
+
+def _make_counted_check ( op, func ):
+   def counted_check ( path ):
+      t_start = time.perf_counter()
+      ret     = func ( path )
+      ACCOUNTING.add (
+         op, _get_call_site(), ret, ( time.perf_counter() - t_start )
+      )
+      return ret
+   # --- end of counted_check (...) ---
+
+   counted_check.__name__ = op
+   return counted_check
+# --- end of _make_counted_check (...) ---
+
+def _make_counted_call ( op, func ):
+   def counted_call ( *args, **kwargs ):
+      t_start = time.perf_counter()
+      try:
+         ret = func ( *args, **kwargs )
+      except OSError:
+         ACCOUNTING.add (
+            op, _get_call_site(), False, ( time.perf_counter() - t_start )
+         )
+         raise
+
+      ACCOUNTING.add (
+         op, _get_call_site(), True, ( time.perf_counter() - t_start )
+      )
+      return ret
+   # --- end of counted_call (...) ---
+
+   counted_call.__name__ = op
+   return counted_call
+# --- end of _make_counted_call (...) ---
+
+def _make_counted_walk ( func ):
+   def counted_walk ( top, *args, **kwargs ):
+      # the time spent in the walk generator is accounted when the caller
+      # stops iterating; a walk that yields nothing counts as miss
+      site    = _get_call_site()
+      seconds = 0.0
+      hit     = False
+      walker  = func ( top, *args, **kwargs )
+      try:
+         while True:
+            t_start = time.perf_counter()
+            try:
+               item = next ( walker )
+            except StopIteration:
+               seconds += time.perf_counter() - t_start
+               break
+
+            seconds += time.perf_counter() - t_start
+            hit      = True
+            yield item
+      finally:
+         walker.close()
+         ACCOUNTING.add ( 'walk', site, hit, seconds )
+   # --- end of counted_walk (...) ---
+
+   return counted_walk
+# --- end of _make_counted_walk (...) ---
+
+def _get_mount ( path ):
+   """Returns ( <mountpoint>, <archive>, <path relative to mountpoint> )
+   for a path below a mountpoint, else None."""
+   if isinstance ( path, str ):
+      for mountpoint, archive in MOUNTS.items():
+         if path.startswith ( mountpoint ):
+            if len ( path ) == len ( mountpoint ):
+               return ( mountpoint, archive, '' )
+            elif path [len(mountpoint)] == os.sep:
+               return ( mountpoint, archive, path [len(mountpoint)+1:] )
+   return None
+# --- end of _get_mount (...) ---
+
+def _make_mounted_call ( op, func ):
+   def mounted_call ( path, *args, **kwargs ):
+      mount_info = _get_mount ( path )
+      if mount_info is None:
+         return func ( path, *args, **kwargs )
+      else:
+         return getattr ( mount_info[1], op ) (
+            mount_info[2], *args, **kwargs
+         )
+   # --- end of mounted_call (...) ---
+
+   mounted_call.__name__ = op
+   return mounted_call
+# --- end of _make_mounted_call (...) ---
+
+def _make_mounted_walk ( func ):
+   def mounted_walk ( top, *args, **kwargs ):
+      mount_info = _get_mount ( top )
+      if mount_info is None:
+         return func ( top, *args, **kwargs )
+      else:
+         return mount_info[1].walk ( mount_info[2], top )
+   # --- end of mounted_walk (...) ---
+
+   return mounted_walk
+# --- end of _make_mounted_walk (...) ---
+
+def _bind():
+   """(Re-)creates the filesystem functions of this module, depending on
+   whether archives are mounted and accounting is enabled."""
+   global stat, isfile, isdir, exists, open, walk
+
+   funcs = dict ( _BASE_FUNCS )
+
+   if MOUNTS:
+      for op, func in funcs.items():
+         if op == 'walk':
+            funcs [op] = _make_mounted_walk ( func )
+         else:
+            funcs [op] = _make_mounted_call ( op, func )
+
+   if ACCOUNTING is not None:
+      for op, func in funcs.items():
+         if op == 'walk':
+            funcs [op] = _make_counted_walk ( func )
+         elif op in { 'stat', 'open' }:
+            funcs [op] = _make_counted_call ( op, func )
+         else:
+            funcs [op] = _make_counted_check ( op, func )
+
+   stat   = funcs ['stat']
+   isfile = funcs ['isfile']
+   isdir  = funcs ['isdir']
+   exists = funcs ['exists']
+   open   = funcs ['open']
+   walk   = funcs ['walk']
+# --- end of _bind (...) ---
+
+def enable_accounting():
+   """Replaces the filesystem functions of this module with variants
+   that record calls in a FsAccounting object, which is returned.
+   Does nothing (except returning the accounting object) if accounting
+   is already enabled.
+   """
+   global ACCOUNTING
+
+   if ACCOUNTING is None:
+      ACCOUNTING = FsAccounting()
+      _bind()
+
+   return ACCOUNTING
+# --- end of enable_accounting (...) ---
+
+def mount ( mountpoint, archive ):
+   """Redirects all filesystem access to paths below the given mountpoint
+   to an archive object (see shlibcclib.archive.LibraryArchive), which
+   provides stat/isfile/isdir/exists/open/walk methods that take paths
+   relative to the mountpoint.
+
+   arguments:
+   * mountpoint -- absolute path
+   * archive    -- archive object
+   """
+   MOUNTS [mountpoint.rstrip ( os.sep ) or os.sep] = archive
+   _bind()
+# --- end of mount (...) ---
+
+def umount ( mountpoint ):
+   """Removes a mountpoint and returns its archive object."""
+   archive = MOUNTS.pop ( mountpoint.rstrip ( os.sep ) or os.sep )
+   _bind()
+   return archive
+# --- end of umount (...) ---
+
+def _fsync_dir ( dirpath ):
+   fd = os.open ( dirpath, os.O_RDONLY )
+   try:
+      os.fsync ( fd )
+   finally:
+      os.close ( fd )
+# --- end of _fsync_dir (...) ---
+
+@contextlib.contextmanager
+def open_atomic (
+   fspath, executable=False, fsync=False, buffering=WRITE_BUFFER_SIZE,
+   binary=False
+):
+   """Context manager that opens a temporary file in the directory of
+   fspath for writing and renames it to fspath when the with-block
+   succeeds, so that readers never see a partially written file.
+   The temporary file gets removed if the with-block fails.
+
+   Existing files that are not regular files (e.g. /dev/null or a fifo)
+   are opened and written directly.
+
+   arguments:
+   * fspath     -- output file
+   * executable -- whether the output file should be executable
+                   (mode 0777 instead of 0666, minus the umask)
+   * fsync      -- whether to sync the file (and its directory) to disk
+                   before/after renaming it
+   * buffering  -- write buffer size
+   * binary     -- open the file in binary mode instead of text mode
+   """
+   mode = 'wb' if binary else 'wt'
+
+   try:
+      st_mode = os.stat ( fspath ).st_mode
+   except FileNotFoundError:
+      st_mode = None
+
+   if st_mode is not None and not S_ISREG ( st_mode ):
+      with _builtin_open ( fspath, mode, buffering=buffering ) as FH:
+         yield FH
+      return
+
+   dirpath = os.path.dirname ( fspath ) or os.curdir
+   fd, tmp_path = tempfile.mkstemp (
+      prefix='.' + os.path.basename ( fspath ) + '.', suffix='.tmp',
+      dir=dirpath
+   )
+   replaced = False
+   try:
+      os.fchmod ( fd, ( 0o777 if executable else 0o666 ) & ~_UMASK )
+
+      with os.fdopen ( fd, mode, buffering=buffering ) as FH:
+         yield FH
+         FH.flush()
+         if fsync:
+            os.fsync ( FH.fileno() )
+
+      os.replace ( tmp_path, fspath )
+      replaced = True
+   finally:
+      if not replaced and os.path.lexists ( tmp_path ):
+         os.unlink ( tmp_path )
+
+   if fsync:
+      _fsync_dir ( dirpath )
+# --- end of open_atomic (...) ---
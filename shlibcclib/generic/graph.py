@@ -107,14 +107,21 @@ def swap_pairs ( iterable ):
 # --- end of swap_pairs (...) ---
 
 
+EMPTY_EDGES = frozenset()
+
 class Node ( object ):
 
+   # many graphs have lots of nodes without outgoing or incoming edges,
+   # the edge sets are therefore only created on demand (EMPTY_EDGES until
+   # the first edge gets added)
+   __slots__ = ( '_name', '_data', '_edges', '_edges_reverse' )
+
    def __init__ ( self, name, data ):
       super ( Node, self ).__init__()
       self._name          = name
       self._data          = data
-      self._edges         = set()
-      self._edges_reverse = set()
+      self._edges         = EMPTY_EDGES
+      self._edges_reverse = EMPTY_EDGES
    # --- end of __init__ (...) ---
 
    def __str__ ( self ):
@@ -144,6 +151,8 @@ class Node ( object ):
    # --- end of get_node_names (...) ---
 
    def add_edge ( self, node, add_reverse=False ):
+      if self._edges is EMPTY_EDGES:
+         self._edges = set()
       self._edges.add ( node )
       if add_reverse:
          node.add_reverse_edge ( self )
@@ -160,6 +169,8 @@ class Node ( object ):
    # --- end of remove_edge (...) ---
 
    def add_reverse_edge ( self, node ):
+      if self._edges_reverse is EMPTY_EDGES:
+         self._edges_reverse = set()
       self._edges_reverse.add ( node )
    # --- end of add_reverse_edge (...) ---
 
@@ -306,6 +317,109 @@ class DirectedGraph ( object ):
             yield ( str ( src_node ), node_str )
    # --- end of iter_reverse_edges (...) ---
 
+   def iter_topological_order ( self ):
+      """Generator that yields all nodes in topological order without
+      modifying the graph (Kahn's algorithm, operating on edge counters).
+
+      Raises a GraphException if the graph has cycles.
+      """
+      incoming = dict (
+         ( node, len ( node.get_reverse_nodes() ) )
+         for node in self._nodes.values()
+      )
+      entry_nodes = [ node for node, k in incoming.items() if not k ]
+      num_sorted  = 0
+
+      while entry_nodes:
+         entry_node = entry_nodes.pop()
+         num_sorted += 1
+         yield entry_node
+
+         for dest_node in entry_node.get_nodes():
+            incoming [dest_node] -= 1
+            if not incoming [dest_node]:
+               entry_nodes.append ( dest_node )
+      # -- end while
+
+      if num_sorted != len ( incoming ):
+         raise self.GraphException ( "Graph has >= 1 cycle." )
+   # --- end of iter_topological_order (...) ---
+
+   def transitive_reduction ( self ):
+      """Removes all edges a->c for which another path a->b->...->c exists.
+      The reachability of nodes (and therefore any topological order)
+      is not affected.
+
+      Returns self (this object).
+
+      Uses reachability bitsets (python ints), where each node is assigned
+      a bit according to its position in (reverse) topological order.
+      The bitset of a node is dropped as soon as all of its predecessors
+      have been processed.
+      """
+      order = list ( self.iter_topological_order() )
+      last  = len ( order ) - 1
+      rank  = dict ( ( node, k ) for k, node in enumerate ( order ) )
+      # number of predecessors that still need a node's reach bitset
+      refs  = dict (
+         ( node, len ( node.get_reverse_nodes() ) ) for node in order
+      )
+      reach = dict()
+      get_rank = rank.__getitem__
+
+      for node in reversed ( order ):
+         covered   = 0
+         redundant = []
+
+         # a successor b that reaches another successor c has a lower rank
+         for dest_node in sorted ( node.get_nodes(), key=get_rank ):
+            if ( covered >> ( last - rank [dest_node] ) ) & 1:
+               redundant.append ( dest_node )
+            else:
+               covered |= reach [dest_node]
+
+            refs [dest_node] -= 1
+            if not refs [dest_node]:
+               del reach [dest_node]
+         # -- end for
+
+         for dest_node in redundant:
+            node.remove_edge ( dest_node, remove_reverse=True )
+
+         if refs [node]:
+            reach [node] = covered | ( 1 << ( last - rank [node] ) )
+      # -- end for
+
+      return self
+   # --- end of transitive_reduction (...) ---
+
+   def get_reverse_closure ( self, names ):
+      """Returns the names of all nodes from which at least one of the given
+      nodes can be reached, including the given nodes themselves.
+
+      Unknown node names are ignored.
+
+      arguments:
+      * names -- names of the nodes to start with
+      """
+      closure = set()
+      pending = list()
+
+      for name in names:
+         node = self._nodes.get ( name )
+         if node is not None and node not in closure:
+            closure.add ( node )
+            pending.append ( node )
+
+      while pending:
+         for src_node in pending.pop().get_reverse_nodes():
+            if src_node not in closure:
+               closure.add ( src_node )
+               pending.append ( src_node )
+
+      return set ( node.get_name() for node in closure )
+   # --- end of get_reverse_closure (...) ---
+
    def visualize_edges ( self, reverse=False, pretty_print=True ):
       if reverse:
          iter_edges = swap_pairs ( self.iter_reverse_edges() )
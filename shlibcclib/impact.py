@@ -0,0 +1,128 @@
+# shlibcc -- changed-files impact query
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+
+__all__ = [ 'get_changed_modules', 'get_affected_targets', ]
+
+import os
+
+import shlibcclib.message
+
+from shlibcclib.deputil import get_module_key, DIR_MANIFEST_NAMES
+
+debug_print = shlibcclib.message.debug_print
+
+
+def get_changed_modules (
+   deptable, changed_files, filetypes, depfile_suffix='.depend'
+):
+   """Maps changed files to module names.
+
+   A file is mapped to the module whose path is recorded by the deptable,
+   depfiles are mapped to their module, directory manifests are mapped to
+   all module files in their directory and any other file (e.g. block_CC
+   or new module files) is mapped to the nearest directory module.
+
+   arguments:
+   * deptable       -- dependency table
+   * changed_files  -- iterable of changed file paths
+   * filetypes      -- module file suffixes (e.g. [ '.bash', '.sh' ])
+   * depfile_suffix -- depfile suffix, defaults to '.depend'
+   """
+   fspath_index = deptable.get_fspath_index()
+   modules      = set()
+
+   for changed_file in changed_files:
+      fspath = os.path.abspath ( changed_file )
+      name   = fspath_index.get ( fspath )
+
+      if name is None and fspath.endswith ( depfile_suffix ):
+         basepath = fspath[:-len(depfile_suffix)]
+         name     = fspath_index.get ( basepath )
+
+         if name is None:
+            for ftype in filetypes:
+               name = fspath_index.get ( basepath + ftype )
+               if name is not None:
+                  break
+      # -- end if <depfile>
+
+      if (
+         name is None
+         and os.path.basename ( fspath ) in DIR_MANIFEST_NAMES
+      ):
+         dirpath     = os.path.dirname ( fspath )
+         dir_modules = [
+            mod_name for mod_path, mod_name in fspath_index.items()
+            if os.path.dirname ( mod_path ) == dirpath
+         ]
+         if dir_modules:
+            debug_print (
+               "{!r} belongs to {}".format (
+                  changed_file, ', '.join ( sorted ( dir_modules ) )
+               )
+            )
+            modules.update ( dir_modules )
+            continue
+      # -- end if <directory manifest>
+
+      if name is None:
+         dirpath = os.path.dirname ( fspath )
+         while name is None and dirpath != fspath:
+            name    = fspath_index.get ( dirpath )
+            fspath  = dirpath
+            dirpath = os.path.dirname ( fspath )
+      # -- end if <file in module directory>
+
+      if name is None:
+         debug_print (
+            "{!r} is not part of any module.".format ( changed_file )
+         )
+      else:
+         debug_print ( "{!r} belongs to {!r}".format ( changed_file, name ) )
+         modules.add ( name )
+   # -- end for <changed_file>
+
+   return modules
+# --- end of get_changed_modules (...) ---
+
+def get_affected_targets (
+   deptable, depgraph, manifest_targets, changed_files, filetypes
+):
+   """Returns a sorted list of targets that need to be relinked.
+
+   arguments:
+   * deptable         -- dependency table
+   * depgraph         -- dependency graph
+   * manifest_targets -- list of 2-tuples ( <manifest>, <targets dict> ),
+                          see shlibcclib.deputil.read_manifest()
+   * changed_files    -- iterable of changed file paths
+   * filetypes        -- module file suffixes
+   """
+   changed_paths = set (
+      os.path.abspath ( changed_file ) for changed_file in changed_files
+   )
+   affected_modules = depgraph.get_reverse_closure (
+      get_changed_modules ( deptable, changed_paths, filetypes )
+   )
+   affected_targets = set()
+
+   for manifest, targets in manifest_targets:
+      if os.path.abspath ( manifest ) in changed_paths:
+         affected_targets.update ( targets.keys() )
+      else:
+         for target, modules in targets.items():
+            if (
+               os.path.abspath ( target ) in changed_paths
+               or any (
+                  get_module_key ( module ) in affected_modules
+                  for module in modules
+               )
+            ):
+               affected_targets.add ( target )
+   # -- end for <manifest>
+
+   return sorted ( affected_targets )
+# --- end of get_affected_targets (...) ---
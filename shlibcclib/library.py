@@ -13,8 +13,11 @@ from itertools import islice
 import shlibcclib.message
 import shlibcclib.deptable
 import shlibcclib.deputil
+import shlibcclib.fsio
 
 from shlibcclib.deputil  import locate_depfile, read_depfile
+from shlibcclib.deputil  import get_module_subkey, ModuleKeyException
+from shlibcclib.deputil  import ROOT_MODULE_KEY
 from shlibcclib.deptable import DependencyTable, DependencyTableException
 
 debug_print = shlibcclib.message.debug_print
@@ -46,18 +49,127 @@ class MaxSearchDepthReached ( ModuleLibraryException ):
 
 # --- end of MaxSearchDepthReached ---
 
-class ModuleBlockers ( object ):
+def get_module_key ( name, parent_key=None, source=None ):
+   """Returns the canonical key of a module name,
+   see shlibcclib.deputil.get_module_key().
+
+   Raises ModuleLibraryFileException if the name is invalid.
+
+   arguments:
+   * name       -- module name
+   * parent_key -- key of the module that refers to name (or None)
+   * source     -- file that refers to name, for error messages (or None)
+   """
+   try:
+      return shlibcclib.deputil.get_module_key ( name, parent_key )
+   except ModuleKeyException as err:
+      if source:
+         raise ModuleLibraryFileException (
+            "{}: {}".format ( source, err )
+         )
+      else:
+         raise ModuleLibraryFileException ( str ( err ) )
+# --- end of get_module_key (...) ---
+
+def get_matchable_module_keys (
+   names, description, source=None, parent_key=None
+):
+   """Returns the canonical keys of module names that are only matched
+   against other modules (blockers, excluded modules). Names outside of
+   the module root can never match, they are skipped with a warning.
+
+   arguments:
+   * names       -- module names
+   * description -- what the names are, for the warning (e.g. "blocker")
+   * source      -- module or file that refers to the names (or None)
+   * parent_key  -- key that relative names are resolved against (or None)
+   """
+   keys = []
+   for name in names:
+      try:
+         keys.append ( shlibcclib.deputil.get_module_key ( name, parent_key ) )
+      except ModuleKeyException as err:
+         sys.stderr.write ( "[WARN] ignoring {} {!r}{}: {}\n".format (
+            description, name, ( " of " + source if source else "" ), err
+         ) )
+   return keys
+# --- end of get_matchable_module_keys (...) ---
+
+
+class ModuleBlockedException ( DependencyTableException ):
+
+   def __init__ ( self, conflicts ):
+      super ( ModuleBlockedException, self ).__init__ (
+         "cannot create dependency table"
+      )
+      # module name => blocker sources
+      self.conflicts = conflicts
+   # --- end of __init__ (...) ---
 
+# --- end of ModuleBlockedException ---
+
+class ModuleBlockers ( object ):
+   """Module blockers, optionally bound to a dependency table, in which
+   case adding a blocked module to the table or adding a blocker for a
+   module that is already in the table raises a ModuleBlockedException.
+   """
 
    def __init__ ( self, module_blockers=None, source=None ):
       super ( ModuleBlockers, self ).__init__()
       self._blockers_dict = {}
+      self._deptable      = None
       if module_blockers:
          self.extend ( module_blockers, source )
    # --- end of __init__ (...) ---
 
-   def extend ( self, blockers, source=None ):
+   def bind ( self, deptable ):
+      """Checks all modules that get added to the given dependency table
+      from now on (and those already in it).
+
+      arguments:
+      * deptable -- dependency table
+      """
+      self._deptable           = deptable
+      deptable.module_blockers = self
+      self.check_names ( deptable.names() )
+   # --- end of bind (...) ---
+
+   def check_names ( self, names ):
+      """Raises a ModuleBlockedException listing all blocked modules
+      in names, if any.
+
+      arguments:
+      * names -- module names
+      """
+      conflicts = self.intersection ( names )
+      if conflicts:
+         raise ModuleBlockedException ( conflicts )
+   # --- end of check_names (...) ---
+
+   def check_module ( self, name ):
+      """Raises a ModuleBlockedException if the given module is blocked.
+
+      arguments:
+      * name -- module name
+      """
+      entry = self._blockers_dict.get ( name )
+      if entry is not None:
+         raise ModuleBlockedException ( { name: entry } )
+   # --- end of check_module (...) ---
+
+   def extend ( self, blockers, source=None, parent_key=None ):
+      """Adds blockers.
+
+      arguments:
+      * blockers   -- names of blocked modules
+      * source     -- module that blocks them (or None)
+      * parent_key -- key that relative names are resolved against
+                      (or None)
+      """
       blockers_dict = self._blockers_dict
+      blockers      = get_matchable_module_keys (
+         blockers, 'blocker', source, parent_key
+      )
       if source is None:
          for name in blockers:
             if name not in blockers_dict:
@@ -68,6 +180,12 @@ class ModuleBlockers ( object ):
                blockers_dict [name].add ( source )
             else:
                blockers_dict [name] = { source, }
+
+      if self._deptable is not None:
+         deptable_names = self._deptable.names()
+         self.check_names (
+            name for name in blockers if name in deptable_names
+         )
    # --- end of extend (...) ---
 
    def iter_intersection ( self, names ):
@@ -105,6 +223,18 @@ class ModuleBlockers ( object ):
 
 
 
+def mount_archive ( fspath ):
+   """Mounts a module library archive at its path.
+
+   arguments:
+   * fspath -- absolute path to the archive
+   """
+   # imported on demand, archives are optional
+   import shlibcclib.archive
+   shlibcclib.archive.mount ( fspath )
+# --- end of mount_archive (...) ---
+
+
 class ModuleRootDirectory ( object ):
 
    def __init__ ( self, fspath ):
@@ -112,6 +242,10 @@ class ModuleRootDirectory ( object ):
       self.fspath  = os.path.abspath ( fspath )
       self.fspath_relpath_begin = len(self.fspath) + 1
 
+      if shlibcclib.fsio.isfile ( self.fspath ):
+         # module library archive, serve lookups/reads from its index
+         mount_archive ( self.fspath )
+
    def get_fspath ( self, relpath=None ):
       if relpath:
          return os.path.join ( self.fspath, relpath.lstrip(os.sep) )
@@ -126,7 +260,7 @@ class ModuleRootDirectory ( object ):
 
       for ftype in filetypes:
          fpath = basepath + ftype
-         if os.path.isfile ( fpath ):
+         if shlibcclib.fsio.isfile ( fpath ):
             yield ( ftype, basepath, fpath )
    # --- end of ilocate_file (...) ---
 
@@ -172,7 +306,7 @@ class ModuleRootDirectories ( object ):
 
       for k, module_dir in self.iter_module_directories(offset):
          dirpath = module_dir.get_fspath ( name )
-         if os.path.isdir ( dirpath ):
+         if shlibcclib.fsio.isdir ( dirpath ):
             yield ( k, module_dir, ( None, dirpath, dirpath ) )
 
    def find_module ( self, name, offset ):
@@ -191,8 +325,10 @@ class ModuleLibrary ( object ):
       if self.blocker_action == self.blocker_action.ACTION_IGNORE:
          return True
 
-      blocker = module_directory.get_fspath ( dirpath + os.sep + "block_CC" )
-      if not os.path.exists ( blocker ):
+      blocker = module_directory.get_fspath (
+         dirpath + os.sep + shlibcclib.deputil.CC_BLOCKER_NAME
+      )
+      if not shlibcclib.fsio.exists ( blocker ):
          return True
 
       msg = "CC blocker found in {}".format (
@@ -213,15 +349,48 @@ class ModuleLibrary ( object ):
          return True
 
       else:
-         self.config.die ( msg + "!" )
+         self.config.die ( 1, msg + "!\n" )
    # --- end of handle_blocker (...) ---
 
+   def add_object ( self, fspath ):
+      """Adds a pre-processed module (object file) to the dependency table
+      and returns a list of ( <node>, <dep> ) for its dependencies, which
+      have to be resolved.
+
+      arguments:
+      * fspath -- object file
+      """
+      # imported on demand, objfile requires the module parser
+      import shlibcclib.objfile
+
+      fspath = os.path.abspath ( fspath )
+      header = shlibcclib.objfile.read_object_header ( fspath )
+      name   = get_module_key ( header.name )
+
+      if name in self.modules_exclude:
+         return []
+      elif not self.deptable.add_new ( name, fspath ):
+         raise ModuleLibraryFileException (
+            "{!r}: module {!r} has already been added".format (
+               fspath, name
+            )
+         )
+      else:
+         node = self.deptable.last
+         if header.blockers:
+            self.module_blockers.extend ( header.blockers, source=name )
+         return [ ( node, dep ) for dep in header.deps ]
+   # --- end of add_object (...) ---
+
    def populate_deptable ( self, modules, dropin_modules ):
       MODULE_DIRECTORIES = self.module_directories
       MAXDEPTH           = self.max_search_depth
       MODULES_EXCLUDE    = self.modules_exclude
       MODULE_BLOCKERS    = self.module_blockers
       DEPTABLE           = self.deptable
+      DIR_MANIFESTS      = self.dir_manifests
+      DEPTABLE_NAMES     = DEPTABLE.names()
+      SORT_DIRECTORIES   = self.sort_directories
 
       def populate_deptable_inner (
          backtrace, search_offset, want_name
@@ -229,13 +398,6 @@ class ModuleLibrary ( object ):
          def is_cwd_ref ( s ):
             return not s or s in { os.sep, '.' }
 
-         def get_subkey ( parent_key, basename ):
-            if is_cwd_ref ( parent_key ):
-               return basename
-            else:
-               return parent_key + os.sep + basename
-         # --- end of get_subkey (...) ---
-
          def populate_deptable_from_file (
             backtrace, module_dir, search_offset,
             module_key, module_path, module_basepath
@@ -253,6 +415,15 @@ class ModuleLibrary ( object ):
                node    = DEPTABLE.last
                depfile = locate_depfile ( module_path, module_basepath )
 
+               # read deps, blockers
+               #  per-module depfiles take precedence over dir manifests
+               if depfile:
+                  deps, blockers = read_depfile ( depfile )
+               else:
+                  depfile, deps, blockers = DIR_MANIFESTS.get_deps (
+                     module_basepath
+                  )
+
                if depfile:
                   debug_print (
                      "depfile of module {!r} is {!r}".format (
@@ -260,24 +431,13 @@ class ModuleLibrary ( object ):
                      )
                   )
 
-                  # read deps, blockers
-                  deps, blockers = read_depfile ( depfile )
-
                   if blockers:
-                     MODULE_BLOCKERS.extend ( blockers, source=module_key )
+                     MODULE_BLOCKERS.extend (
+                        blockers, source=module_key, parent_key=module_key
+                     )
 
                   for dep in deps:
-                     # FIXME: not accurate...
-                     if (
-                        dep.startswith ( "." + os.sep )
-                        or dep.startswith ( ".." + os.sep )
-                     ):
-                        dep_name = os.path.normpath (
-                           get_subkey ( os.path.dirname(module_key), dep )
-                        )
-                     else:
-                        dep_name = dep
-                     # --
+                     dep_name = get_module_key ( dep, module_key, depfile )
 
                      if populate_deptable_inner (
                         backtrace, search_offset, dep_name
@@ -315,10 +475,18 @@ class ModuleLibrary ( object ):
             else:
                node = DEPTABLE.last
 
-               for dirpath, dirnames, filenames in os.walk ( module_path ):
+               for dirpath, dirnames, filenames in shlibcclib.fsio.walk (
+                  module_path
+               ):
+                  DIR_MANIFESTS.scan ( module_path, filenames )
+
+                  if SORT_DIRECTORIES:
+                     dirnames  = sorted ( dirnames )
+                     filenames = sorted ( filenames )
+
                   for basename in dirnames:
                      fspath = module_path + os.sep + basename
-                     key    = get_subkey ( module_key, basename )
+                     key    = get_module_subkey ( module_key, basename )
 
                      if populate_deptable_from_directory (
                         backtrace + [ basename ],
@@ -337,7 +505,7 @@ class ModuleLibrary ( object ):
 
                      fspath   = module_path + os.sep + fname
                      basepath = module_path + os.sep + basename
-                     key      = get_subkey ( module_key, basename )
+                     key      = get_module_subkey ( module_key, basename )
 
                      for other_suffix in MODULE_DIRECTORIES.module_filetypes:
                         if other_suffix == suffix:
@@ -350,7 +518,9 @@ class ModuleLibrary ( object ):
                               basepath
                            ):
                               node.register_direct_dep ( key )
-                        elif os.path.isfile ( basepath + other_suffix ):
+                        elif shlibcclib.fsio.isfile (
+                           basepath + other_suffix
+                        ):
                            break
                      # --
                   # --
@@ -365,6 +535,9 @@ class ModuleLibrary ( object ):
          # --
 
          if not is_cwd_ref ( want_name ):
+            want_name = get_module_key ( want_name )
+            if want_name in DEPTABLE_NAMES:
+               return True
             pass
          elif backtrace or search_offset:
             raise ModuleLibraryFileException (
@@ -374,10 +547,10 @@ class ModuleLibrary ( object ):
             pass
          else:
             return populate_deptable_from_directory (
-               backtrace + [ "/" ],
+               backtrace + [ ROOT_MODULE_KEY ],
                MODULE_DIRECTORIES.module_directories[0],
                search_offset,
-               "/",
+               ROOT_MODULE_KEY,
                MODULE_DIRECTORIES.module_directories[0].fspath
             )
          # --
@@ -388,7 +561,8 @@ class ModuleLibrary ( object ):
          module_type     = module_info[0]
          module_basepath = module_info[1]
          module_path     = module_info[2]
-         module_key      = module_dir.get_relpath ( module_basepath )
+         # the module's relpath is want_name
+         module_key      = want_name
 
          if dropin_modules:
             offset = 0
@@ -413,22 +587,36 @@ class ModuleLibrary ( object ):
             )
       # --- end of populate_deptable_inner (...) ---
 
+      # object files (see shlibcclib.objfile) are added first,
+      # so that their deps can refer to other object files
+      object_deps     = []
+      library_modules = []
       for module in modules:
-         populate_deptable_inner ( [], 0, module )
+         if module.endswith ( shlibcclib.deputil.OBJECT_SUFFIX ):
+            object_deps.extend ( self.add_object ( module ) )
+         else:
+            library_modules.append ( module )
+
+      try:
+         for node, dep in object_deps:
+            if populate_deptable_inner ( [], 0, dep ):
+               node.register_direct_dep ( get_module_key ( dep ) )
 
-      blocked_modules = MODULE_BLOCKERS & DEPTABLE
-      if blocked_modules:
+         for module in library_modules:
+            populate_deptable_inner ( [], 0, module )
+
+      except ModuleBlockedException as err:
          HLINE = 79 * '='
          sys.stderr.write (
             HLINE + "\nunsatisfiable module dependencies:\n"
             + '\n'.join (
                "* {module} blocked by {blockers}".format (
                   module=k, blockers=', '.join ( repr(x) for x in v )
-               ) for k, v in sorted ( blocked_modules.items() )
+               ) for k, v in sorted ( err.conflicts.items() )
             )
             + '\n' + HLINE + '\n'
          )
-         raise DependencyTableException ( "cannot create dependency table" )
+         raise
       # --
    # --- end of populate_deptable (...) ---
 
@@ -436,12 +624,20 @@ class ModuleLibrary ( object ):
       super ( ModuleLibrary, self ).__init__()
       self.config              = config
       self.max_search_depth    = config.max_depth
-      self.modules_exclude     = config.modules_exclude
+      self.modules_exclude     = frozenset (
+         get_matchable_module_keys (
+            config.modules_exclude, 'excluded module'
+         )
+      )
       self.blocker_action      = config.blocker_action
+      # visit directory entries in sorted order (instead of fs order)
+      self.sort_directories    = config.reproducible
       self.deptable            = DependencyTable()
       self.module_blockers     = ModuleBlockers (
          config.module_blockers, source='__config__'
       )
+      self.module_blockers.bind ( self.deptable )
+      self.dir_manifests       = shlibcclib.deputil.DirectoryManifests()
       self.module_directories  = ModuleRootDirectories (
          rootdirs, config.use_bash
       )
@@ -459,5 +655,6 @@ def make_dependency_table ( rootdirs, modules, config ):
 
    module_library = ModuleLibrary ( config, rootdirs )
    module_library.populate_deptable ( modules, config.dropin_modules )
+   module_library.deptable.freeze()
    return module_library.deptable
 # --- end of make_dependency_table (...) ---
@@ -0,0 +1,241 @@
+# shlibcc -- link output cache
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# "shlibcc --cache-dir <dir>" keeps the output of link runs in <dir>.
+# Entries are keyed by a hash of everything that affects the output:
+#
+#  * the shlibcc version and the rendered header
+#  * the output options (strip/keep/enclose options, ...)
+#  * the resolved modules in link order (name and file content)
+#  * the content of the --main and --defsym files
+#
+# so that a link with identical inputs copies the cached output instead of
+# parsing any module.
+#
+# Cache layout: <dir>/<key[:2]>/<key>.sh, plus a lock file. Lookups hold
+# a shared lock while opening an entry; storing an entry and evicting the
+# least recently used entries (by mtime, which gets updated on hits) until
+# the cache fits into its size limit hold an exclusive lock, so that
+# parallel shlibcc processes can share a cache directory.
+#
+
+__all__ = [ 'LinkCache', ]
+
+import hashlib
+import os
+import tempfile
+
+try:
+   import fcntl
+except ImportError:
+   fcntl = None
+
+import shlibcclib.fsio
+import shlibcclib.shlib
+
+
+KEY_VERSION  = 1
+ENTRY_SUFFIX = '.sh'
+LOCK_NAME    = 'lock'
+
+# config options that affect the output, in addition to the module
+# parsing options and the header
+OUTPUT_KEYS = shlibcclib.shlib.ShlibModuleCache.CONFIG_KEYS + (
+   'is_lib', 'enclose_modules', 'enclose_sections',
+)
+
+HASH_CHUNK_SIZE = 1 << 16
+
+
+def hash_file ( fspath ):
+   """Returns the sha256 digest (bytes) of a file's content."""
+   h = hashlib.sha256()
+   with shlibcclib.fsio.open ( fspath, 'rb' ) as FH:
+      for chunk in iter ( lambda: FH.read ( HASH_CHUNK_SIZE ), b'' ):
+         h.update ( chunk )
+   return h.digest()
+# --- end of hash_file (...) ---
+
+
+class LinkCache ( object ):
+
+   def __init__ ( self, cache_dir, max_size ):
+      """Constructor.
+
+      arguments:
+      * cache_dir -- cache directory (created if it does not exist)
+      * max_size  -- max. total size of all entries (in bytes)
+      """
+      super ( LinkCache, self ).__init__()
+      self.cache_dir = cache_dir
+      self.max_size  = max_size
+      self.lock_file = os.path.join ( cache_dir, LOCK_NAME )
+      os.makedirs ( cache_dir, exist_ok=True )
+   # --- end of __init__ (...) ---
+
+   def get_key ( self, config, modules, header ):
+      """Returns the cache key (hex str) of a link run.
+
+      arguments:
+      * config  -- configuration
+      * modules -- modules in link order
+      * header  -- header str (or None)
+      """
+      h = hashlib.sha256()
+
+      def add ( value ):
+         h.update ( repr ( value ).encode ( 'utf-8' ) )
+         h.update ( b'\0' )
+      # --- end of add (...) ---
+
+      add ( KEY_VERSION )
+      add ( config.version_str )
+      add ( header )
+
+      for key in OUTPUT_KEYS:
+         add ( getattr ( config, key ) )
+
+      if config.restrict_sections is None:
+         add ( None )
+      else:
+         add ( sorted ( config.restrict_sections ) )
+
+      for fspath in ( config.main_script, config.defsym_file ):
+         if fspath:
+            h.update ( hash_file ( fspath ) )
+         else:
+            add ( None )
+
+      for module in modules:
+         if not shlibcclib.fsio.isdir ( module.fspath ):
+            add ( module.name )
+            h.update ( hash_file ( module.fspath ) )
+
+      return h.hexdigest()
+   # --- end of get_key (...) ---
+
+   def get_entry_path ( self, key ):
+      return os.path.join ( self.cache_dir, key[:2], key + ENTRY_SUFFIX )
+   # --- end of get_entry_path (...) ---
+
+   def _lock ( self, exclusive ):
+      """Opens and locks the cache's lock file and returns the file handle,
+      which has to be closed to release the lock."""
+      fh     = open ( self.lock_file, 'a' )
+      locked = fcntl is None
+      try:
+         if not locked:
+            fcntl.flock (
+               fh.fileno(), ( fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH )
+            )
+            locked = True
+      finally:
+         if not locked:
+            fh.close()
+      return fh
+   # --- end of _lock (...) ---
+
+   def lookup ( self, key ):
+      """Returns a file handle (text mode) for reading the cached output
+      of the given key, or None if there is no such entry.
+
+      arguments:
+      * key -- cache key, see get_key()
+      """
+      entry_path = self.get_entry_path ( key )
+
+      with self._lock ( False ):
+         try:
+            fh = open ( entry_path, 'rt' )
+         except FileNotFoundError:
+            return None
+
+         try:
+            os.utime ( entry_path )
+         except OSError:
+            pass
+
+      return fh
+   # --- end of lookup (...) ---
+
+   def store ( self, key, blocks ):
+      """Writes the output of a link run to the cache, evicts old entries
+      and returns a file handle (text mode) for reading the new entry.
+
+      arguments:
+      * key    -- cache key, see get_key()
+      * blocks -- output (iterable of str)
+      """
+      entry_path = self.get_entry_path ( key )
+      entry_dir  = os.path.dirname ( entry_path )
+      os.makedirs ( entry_dir, exist_ok=True )
+
+      fd, tmp_path = tempfile.mkstemp ( suffix='.tmp', dir=entry_dir )
+      fh       = None
+      replaced = False
+      success  = False
+      try:
+         with os.fdopen (
+            fd, 'wt', buffering=shlibcclib.fsio.WRITE_BUFFER_SIZE
+         ) as FH:
+            FH.writelines ( blocks )
+
+         # opened before renaming, eviction by other processes does not
+         # affect reading the new entry
+         fh = open ( tmp_path, 'rt' )
+         with self._lock ( True ):
+            os.replace ( tmp_path, entry_path )
+            replaced = True
+            self.evict ( keep=entry_path )
+         success = True
+      finally:
+         if not success:
+            if fh is not None:
+               fh.close()
+            if not replaced and os.path.lexists ( tmp_path ):
+               os.unlink ( tmp_path )
+
+      return fh
+   # --- end of store (...) ---
+
+   def iter_entries ( self ):
+      """Generator that yields ( <mtime>, <size>, <path> ) for all
+      cache entries."""
+      for subdir in os.scandir ( self.cache_dir ):
+         if subdir.is_dir ( follow_symlinks=False ):
+            for entry in os.scandir ( subdir.path ):
+               if entry.name.endswith ( ENTRY_SUFFIX ):
+                  try:
+                     st = entry.stat ( follow_symlinks=False )
+                  except FileNotFoundError:
+                     pass
+                  else:
+                     yield ( st.st_mtime_ns, st.st_size, entry.path )
+   # --- end of iter_entries (...) ---
+
+   def evict ( self, keep=None ):
+      """Removes the least recently used entries until the total size of
+      all entries does not exceed max_size. Should be called with the
+      exclusive lock held.
+
+      arguments:
+      * keep -- entry that must not be removed (or None)
+      """
+      entries    = sorted ( self.iter_entries() )
+      total_size = sum ( entry[1] for entry in entries )
+
+      for mtime, size, entry_path in entries:
+         if total_size <= self.max_size:
+            break
+         elif entry_path != keep:
+            try:
+               os.unlink ( entry_path )
+            except FileNotFoundError:
+               pass
+            total_size -= size
+   # --- end of evict (...) ---
+
+# --- end of LinkCache ---
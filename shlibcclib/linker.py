@@ -4,59 +4,175 @@
 # Distributed under the terms of the GNU General Public License;
 # either version 2 of the License, or (at your option) any later version.
 
-__all__ = [ 'link', ]
+__all__ = [ 'link', 'make_shlib_file', ]
 
-import os.path
+import shutil
 import sys
 
 import shlibcclib.defaultheader
+import shlibcclib.fsio
+import shlibcclib.linkcache
+import shlibcclib.profiler
 import shlibcclib.shlib
 
-def link ( config, all_modules ):
-   """Links the given modules into a single ("big") file.
+def make_header ( config ):
+   """Returns the header for linked files (or None).
 
    arguments:
-   * config      -- configuration
-   * all_modules -- modules that should be linked (an iterable)
+   * config -- configuration
    """
+   if config.no_header:
+      return None
+   elif config.header_file:
+      with shlibcclib.fsio.open ( config.header_file, 'rt' ) as HEADER_FH:
+         return '# ' + '\n# '.join ( l.strip() for l in HEADER_FH )
+   else:
+      return shlibcclib.defaultheader.make ( config )
+# --- end of make_header (...) ---
 
-   use_stdout = config.use_stdout # ?
+def make_shlib_file ( config, all_modules, module_cache=None ):
+   """Creates a ShlibFile for the given modules (without writing it).
 
+   arguments:
+   * config       -- configuration
+   * all_modules  -- modules that should be linked (an iterable)
+   * module_cache -- ShlibModuleCache for reusing parsed modules, or None
+   """
    shlib = shlibcclib.shlib.ShlibFile ( config=config, header=None )
+   shlib.module_cache = module_cache
+   if config.low_memory:
+      shlib.spill = shlibcclib.shlib.ShlibSectionSpill()
 
-   # add header, if any
-   if config.no_header:
-      pass
-   elif config.header_file:
-      with open ( config.header_file, 'rt' ) as HEADER_FH:
-         shlib.header = (
-            '# ' + '\n# '.join ( l.strip() for l in HEADER_FH )
-         )
-   else:
-      shlib.header = shlibcclib.defaultheader.make ( config )
-   # -- end if;
+   shlib.header = make_header ( config )
 
    if config.cat:
-      shlib.pre_header = '\n'.join ( sys.stdin.readlines() )
+      # streamed into the output when writing it
+      shlib.pre_header_fh = sys.stdin
 
    if config.defsym_file:
-      with open ( config.defsym_file, 'rt' ) as DEFSYM_FH:
+      with shlibcclib.fsio.open ( config.defsym_file, 'rt' ) as DEFSYM_FH:
          shlib.defsym = ''.join ( DEFSYM_FH.readlines() )
 
-   # write all modules
-   for module in all_modules:
-      if not os.path.isdir ( module.fspath ):
-         shlib.add_module ( module.name, module.fspath )
+   if not config.stats_file:
+      stats_fh = None
+   elif config.stats_file == '-':
+      stats_fh = sys.stderr
+   else:
+      stats_fh = shlibcclib.fsio.open ( config.stats_file, 'wt' )
+
+   try:
+      if stats_fh is not None:
+         shlib.stats_writer = shlibcclib.shlib.ShlibModuleStatsWriter (
+            stats_fh
+         )
+
+      # write all modules
+      for module in all_modules:
+         if not shlibcclib.fsio.isdir ( module.fspath ):
+            shlib.add_module ( module.name, module.fspath )
+
+      # write the script body, if any
+      if config.main_script:
+         shlib.add_module ( '__main__', config.main_script )
+      elif not config.is_lib:
+         shlib.footer = "# your script starts here!"
+   finally:
+      if stats_fh is not None and stats_fh is not sys.stderr:
+         stats_fh.close()
+      shlib.stats_writer = None
 
-   # write the script body, if any
-   if config.main_script:
-      shlib.add_module ( '__main__', config.main_script )
-   elif not config.is_lib:
-      shlib.footer = "# your script starts here!"
+   return shlib
+# --- end of make_shlib_file (...) ---
+
+def link ( config, all_modules, module_cache=None ):
+   """Links the given modules into a single ("big") file.
+
+   arguments:
+   * config       -- configuration
+   * all_modules  -- modules that should be linked (an iterable)
+   * module_cache -- ShlibModuleCache for reusing parsed modules, or None
+   """
+   if config.cache_dir and not config.cat and not config.stats_file:
+      link_cached ( config, all_modules, module_cache )
+      return
 
    if config.use_stdout:
-      shlib.write ( sys.stdout )
+      link_into ( config, all_modules, module_cache, sys.stdout )
    else:
-      shlib.write ( config.output )
-
+      with shlibcclib.fsio.open_atomic (
+         config.output,
+         executable = bool ( config.main_script ),
+         fsync      = config.fsync,
+      ) as FH:
+         link_into ( config, all_modules, module_cache, FH )
 # --- end of link (...) ---
+
+def link_into ( config, all_modules, module_cache, fh ):
+   """Links the given modules and writes the result to a file object.
+
+   With --cat, stdin gets copied to fh before any module is parsed,
+   so that piped input appears in the output right away.
+
+   arguments:
+   * config       -- configuration
+   * all_modules  -- modules that should be linked (an iterable)
+   * module_cache -- ShlibModuleCache for reusing parsed modules, or None
+   * fh           -- output file object (text mode)
+   """
+   if config.cat:
+      shlibcclib.shlib.copy_pre_header (
+         sys.stdin, fh, shlibcclib.shlib.ShlibFile.WRITE_BLOCK_SIZE
+      )
+
+   shlib = make_shlib_file ( config, all_modules, module_cache )
+   # stdin has already been copied
+   shlib.pre_header_fh = None
+
+   try:
+      shlib.write ( fh )
+   finally:
+      if shlib.spill is not None:
+         shlib.spill.close()
+# --- end of link_into (...) ---
+
+def link_cached ( config, all_modules, module_cache=None ):
+   """Like link(), but copies the output from the link cache
+   (see --cache-dir) if the inputs have been linked before.
+
+   arguments:
+   * config       -- configuration
+   * all_modules  -- modules that should be linked (an iterable)
+   * module_cache -- ShlibModuleCache for reusing parsed modules, or None
+   """
+   profiler = shlibcclib.profiler.PROFILER
+   cache    = shlibcclib.linkcache.LinkCache (
+      config.cache_dir, config.cache_size * 1024 * 1024
+   )
+   modules  = list ( all_modules )
+
+   with profiler.phase ( 'cache_key' ):
+      key = cache.get_key ( config, modules, make_header ( config ) )
+
+   cached_fh = cache.lookup ( key )
+   if cached_fh is None:
+      profiler.count ( 'link_cache_misses' )
+      shlib = make_shlib_file ( config, modules, module_cache )
+      try:
+         cached_fh = cache.store ( key, shlib.generate_blocks() )
+      finally:
+         if shlib.spill is not None:
+            shlib.spill.close()
+   else:
+      profiler.count ( 'link_cache_hits' )
+
+   with cached_fh, profiler.phase ( 'write' ):
+      if config.use_stdout:
+         shutil.copyfileobj ( cached_fh, sys.stdout )
+      else:
+         with shlibcclib.fsio.open_atomic (
+            config.output,
+            executable = bool ( config.main_script ),
+            fsync      = config.fsync,
+         ) as FH:
+            shutil.copyfileobj ( cached_fh, FH )
+# --- end of link_cached (...) ---
@@ -11,19 +11,38 @@ import sys
 import argparse
 import collections
 
-import shlibcclib.deptable
 import shlibcclib.library
-import shlibcclib.depgraph
 import shlibcclib.deputil
-import shlibcclib.linker
+import shlibcclib.export
+import shlibcclib.fsio
 import shlibcclib.message
-import shlibcclib.shlib
+import shlibcclib.profiler
+
+# shlibcclib.depgraph, shlibcclib.impact, shlibcclib.linker,
+# shlibcclib.objfile and shlibcclib.shlib are imported on demand,
+# see import_action_modules()
 
 version     = ( 0, 0, 14 )
 __version__ = '.'.join ( str ( a ) for a in version )
 
 DEFAULT_SHLIB_DIR = None
 
+ACTION_LINK             = 'link'
+ACTION_DEPTABLE         = 'deptable'
+ACTION_DEPGRAPH         = 'depgraph'
+ACTION_DEPGRAPH_REVERSE = 'revdep'
+ACTION_DEPLIST          = 'deplist'
+ACTION_MODLIST          = 'list-modules'
+ACTION_IMPACT           = 'impact'
+ACTION_COMPILE          = 'compile'
+
+# the order of this list determines the -s<index> action shortcuts
+ACTIONS = [
+   ACTION_MODLIST, ACTION_DEPTABLE, ACTION_DEPGRAPH,
+   ACTION_DEPGRAPH_REVERSE, ACTION_DEPLIST, ACTION_LINK,
+   ACTION_IMPACT, ACTION_COMPILE
+]
+
 
 class BlockerAction ( object ):
 
@@ -100,6 +119,20 @@ class ShlibccConfig ( object ):
             return d
       # --- end of is_fs_dir (...) ---
 
+      def is_fs_dir_or_archive ( v ):
+         d = os.path.abspath ( v )
+         if os.path.isdir ( d ):
+            return d
+         elif os.path.isfile ( d ):
+            import shlibcclib.archive
+            if shlibcclib.archive.is_archive ( d ):
+               return d
+
+         raise argparse.ArgumentTypeError (
+            "{!r} is neither a directory nor a shlib archive.".format ( v )
+         )
+      # --- end of is_fs_dir_or_archive (...) ---
+
       def is_fs_file_or_none ( v ):
          if v is None:
             return None
@@ -121,10 +154,11 @@ class ShlibccConfig ( object ):
          if v == '-':
             return v
          else:
+            # existing files get replaced (atomically, see fsio.open_atomic)
             f = os.path.abspath ( v )
-            if os.path.exists ( f ):
+            if os.path.isdir ( f ):
                raise argparse.ArgumentTypeError (
-                  "output file {!r} exists".format ( f )
+                  "output file {!r} is a directory".format ( f )
                )
             elif not os.path.isdir ( os.path.dirname ( f ) ):
                raise argparse.ArgumentTypeError (
@@ -150,6 +184,8 @@ class ShlibccConfig ( object ):
          if not v:
             return set()
          else:
+            import shlibcclib.shlib
+
             get_section_name = shlibcclib.shlib.ShlibModule.get_section_name
             whitelist = set()
             blacklist = set()
@@ -217,6 +253,11 @@ class ShlibccConfig ( object ):
       )
       dep_arg = dep_grp.add_argument
 
+      profile_grp = parser.add_argument_group (
+         "profiling", "report where time is spent (written to stderr)"
+      )
+      profile_arg = profile_grp.add_argument
+
 
       arg (
          '--version', '-V', action='version', version=self.version_str
@@ -234,8 +275,8 @@ class ShlibccConfig ( object ):
          dest    = "shlib_dir",
          default = DEFAULT_SHLIB_DIR or os.getcwd(),
          metavar = "<dir>",
-         type    = is_fs_dir,
-         help    = "shlib root directory",
+         type    = is_fs_dir_or_archive,
+         help    = "shlib root directory or archive (see --pack)",
       )
 
       shlib_arg (
@@ -244,8 +285,20 @@ class ShlibccConfig ( object ):
          action  = 'append',
          default = [],
          metavar = "<dir>",
-         type    = is_fs_dir,
-         help    = "additional shlib root directories",
+         type    = is_fs_dir_or_archive,
+         help    = "additional shlib root directories or archives",
+      )
+
+      shlib_arg (
+         '--pack',
+         dest    = "pack",
+         default = None,
+         nargs   = 2,
+         metavar = ( "<root>", "<archive>" ),
+         help    = (
+            "pack the shlib root directory <root> into a single archive "
+            "file that can be passed to -S/-I, and exit"
+         ),
       )
 
       shlib_arg (
@@ -315,7 +368,7 @@ class ShlibccConfig ( object ):
       )
 
       output_arg (
-         '--output', '-O',
+         '--output', '-O', '-o',
          dest    = "output",
          default = '-',
          metavar = "<file>",
@@ -371,6 +424,65 @@ class ShlibccConfig ( object ):
          help    = 'comma-separated list of sections to extract',
       )
 
+      output_arg (
+         '--stats',
+         dest    = "stats_file",
+         default = None,
+         metavar = "<file>",
+         help    = (
+            "write per-module processing statistics (tab-separated) "
+            "to <file>, '-' for stderr [link]"
+         ),
+      )
+
+      output_arg (
+         '--fsync',
+         default = False,
+         action  = "store_true",
+         help    = "sync the output file to disk before renaming it [link]",
+      )
+
+      output_arg (
+         '--cache-dir',
+         dest    = "cache_dir",
+         default = None,
+         metavar = "<dir>",
+         help    = (
+            "reuse the output of previous links with identical inputs "
+            "from <dir> (not used with --cat or --stats) [link]"
+         ),
+      )
+
+      output_arg (
+         '--cache-size',
+         dest    = "cache_size",
+         default = 256,
+         type    = int,
+         metavar = "<MiB>",
+         help    = "max. size of the --cache-dir entries [%(default)s]",
+      )
+
+      output_arg (
+         '--low-memory',
+         dest    = "low_memory",
+         default = False,
+         action  = "store_true",
+         help    = (
+            "write the section text of parsed modules to temporary files "
+            "instead of keeping all modules in memory [link]"
+         ),
+      )
+
+      output_arg (
+         '--reproducible',
+         default = False,
+         action  = "store_true",
+         help    = (
+            "create identical output for identical inputs: no dates in the "
+            "header (unless SOURCE_DATE_EPOCH is set), stable module order"
+         ),
+      )
+
       output_arg (
          '--no-header',
          default = False,
@@ -509,7 +621,10 @@ class ShlibccConfig ( object ):
          '--cat', '--piped',
          default = False,
          action  = "store_true",
-         help    = "pass stdin to the output",
+         help    = (
+            "pass stdin to the output (copied before any module gets parsed,"
+            " but after resolving the dependencies)"
+         ),
       )
 
       arg (
@@ -538,6 +653,18 @@ class ShlibccConfig ( object ):
          )
       # -- for
 
+      action_arg (
+         '-c',
+         default = argparse.SUPPRESS,
+         dest    = "action",
+         action  = "store_const",
+         const   = ACTION_COMPILE,
+         help    = (
+            "pre-process a single module and write it as object file, "
+            "which can be linked instead of the module (same as --{})"
+         ).format ( ACTION_COMPILE ),
+      )
+
       strip_arg (
          '--strip-all', '--strip',
          dest    = "strip_all",
@@ -622,6 +749,103 @@ class ShlibccConfig ( object ):
          metavar = "<module>",
       )
 
+      dep_arg (
+         '--format',
+         dest    = "output_format",
+         default = "text",
+         choices = ( 'text', ) + shlibcclib.export.FORMATS,
+         help    = (
+            'output format [deptable, depgraph, revdep, deplist] '
+            '(default: %(default)s)'
+         ),
+      )
+
+      dep_arg (
+         '--reduce',
+         dest    = "reduce_edges",
+         default = False,
+         action  = "store_true",
+         help    = (
+            'drop redundant (transitively implied) dependencies '
+            'before printing or sorting [depgraph, revdep, deplist, link]'
+         ),
+      )
+
+      dep_arg (
+         '--manifest', '-M',
+         dest    = "manifests",
+         default = list(),
+         action  = "append",
+         metavar = "<file>",
+         type    = is_fs_file_or_none,
+         help    = (
+            'manifest file that lists "<target>: <module>..." entries '
+            '(depfiles are accepted, too) [impact]'
+         ),
+      )
+
+      dep_arg (
+         '--changed',
+         dest    = "changed_files",
+         default = list(),
+         action  = "append",
+         metavar = "<file>",
+         help    = "changed file, '-' to read a file list from stdin [impact]",
+      )
+
+      profile_arg (
+         '--profile',
+         dest    = "profile",
+         default = False,
+         action  = "store_true",
+         help    = "report wall/cpu time per phase and counters",
+      )
+
+      profile_arg (
+         '--memprofile',
+         dest    = "memprofile",
+         default = False,
+         action  = "store_true",
+         help    = (
+            "report peak/retained memory per phase and the top allocation "
+            "sites (python modules) using tracemalloc (slow)"
+         ),
+      )
+
+      profile_arg (
+         '--fs-stats',
+         dest    = "fs_stats",
+         default = False,
+         action  = "store_true",
+         help    = (
+            "report filesystem calls (stat, isfile, isdir, exists, open, "
+            "walk) per call site with hit/miss counts and latency"
+         ),
+      )
+
+      profile_arg (
+         '--profile-format',
+         dest    = "profile_format",
+         default = "text",
+         choices = ( "text", "json" ),
+         metavar = "<text|json>",
+         help    = (
+            "format of the --profile, --memprofile and --fs-stats reports "
+            "[%(default)s]"
+         ),
+      )
+
+      profile_arg (
+         '--trace-file',
+         dest    = "trace_file",
+         default = None,
+         metavar = "<file>",
+         help    = (
+            "write Chrome trace events (per-phase/per-module spans) "
+            "to <file>"
+         ),
+      )
+
       return parser
    # --- end of get_parser (...) ---
 
@@ -635,9 +859,9 @@ class ShlibccConfig ( object ):
             if depfile:
                return depfile
             else:
-               self.parser.error ( "--depfile for --main not found." )
+               self.error ( "--depfile for --main not found." )
          else:
-            self.parser.error ( "--depfile without an arg requires --main" )
+            self.error ( "--depfile without an arg requires --main" )
       # --- end of lookup_main_depfile (...) ---
 
       if self._argv_config.depfile:
@@ -699,15 +923,87 @@ class ShlibccConfig ( object ):
          return False
    # --- end of _expand_modules (...) ---
 
-   def __init__ ( self, actions, default_action ):
+   def _expand_manifests ( self ):
+      self.manifest_targets = [
+         ( manifest, shlibcclib.deputil.read_manifest ( manifest ) )
+         for manifest in self._argv_config.manifests
+      ]
+
+      if self.manifest_targets:
+         unique_modules = collections.OrderedDict()
+         for manifest, targets in self.manifest_targets:
+            for modules in targets.values():
+               unique_modules.update ( modules )
+
+         self.modules = self.modules + list ( unique_modules.keys() )
+         return True
+      else:
+         return False
+   # --- end of _expand_manifests (...) ---
+
+   def get_changed_files ( self ):
+      for changed_file in self._argv_config.changed_files:
+         if changed_file == '-':
+            for line in sys.stdin:
+               sline = line.strip()
+               if sline:
+                  yield sline
+         else:
+            yield changed_file
+   # --- end of get_changed_files (...) ---
+
+   def get_source_date_epoch ( self ):
+      """Returns the SOURCE_DATE_EPOCH timestamp (int) from the
+      environment, or None if it is not set."""
+      value = os.environ.get ( 'SOURCE_DATE_EPOCH' )
+      if not value:
+         return None
+
+      try:
+         timestamp = int ( value )
+      except ValueError:
+         timestamp = -1
+
+      if timestamp < 0:
+         self.error (
+            "SOURCE_DATE_EPOCH: invalid timestamp {!r}".format ( value )
+         )
+      return timestamp
+   # --- end of get_source_date_epoch (...) ---
+
+   def parse_args ( self, argv ):
+      """Parses the given arguments and returns the resulting namespace.
+
+      arguments:
+      * argv -- arguments to parse, None for sys.argv[1:]
+      """
+      return self.parser.parse_args ( argv )
+   # --- end of parse_args (...) ---
+
+   def error ( self, message ):
+      """Reports a usage/config error and exits."""
+      self.parser.error ( message )
+   # --- end of error (...) ---
+
+   def die ( self, status=0, message=None ):
+      """Exits, optionally with a message."""
+      self.parser.exit ( status, message )
+   # --- end of die (...) ---
+
+   def __init__ ( self, actions, default_action, argv=None ):
+      """Constructor.
+
+      arguments:
+      * actions        -- list of available actions
+      * default_action -- action that is used if not overridden by argv
+      * argv           -- arguments to parse, defaults to sys.argv[1:]
+      """
       super ( ShlibccConfig, self ).__init__()
       assert default_action in actions
       self.version_str     = __version__
       self.module_blockers = None
       self.parser          = self.get_parser ( actions, default_action )
-      self.die             = self.parser.exit
-      self.error           = self.parser.error
-      self._argv_config    = self.parser.parse_args()
+      self._argv_config    = self.parse_args ( argv )
       self.use_bash        = self._argv_config.shell_format == 'bash'
       self.use_stdout      = self._argv_config.output == '-'
       self.shlib_path      = (
@@ -748,21 +1044,43 @@ class ShlibccConfig ( object ):
       if not hasattr ( self._argv_config, 'enclose_sections' ):
          self.enclose_sections = bool ( self.restrict_sections is not None )
 
+      self.source_date_epoch = self.get_source_date_epoch()
+      if self._argv_config.reproducible:
+         self.stable_sort = True
+
       self.modules_exclude = (
          set ( self._argv_config.modules_exclude )
          if hasattr ( self._argv_config, 'modules_exclude' )
          else set()
       )
       self._expand_modules()
+      self._expand_manifests()
       self.modules_exclude  = frozenset ( self.modules_exclude )
-      self.restrict_depends = frozenset ( self._argv_config.restrict_depends )
+      self.restrict_depends = frozenset (
+         shlibcclib.deputil.get_module_key ( name )
+         for name in self._argv_config.restrict_depends
+      )
 
-      if self.restrict_depends:
+      if self._argv_config.pack:
+         pack_root, pack_archive = self._argv_config.pack
+         if not os.path.isdir ( pack_root ):
+            self.error ( "--pack: {!r} is not a directory.".format (
+               pack_root
+            ) )
+         elif not os.path.isdir (
+            os.path.dirname ( os.path.abspath ( pack_archive ) )
+         ):
+            self.error (
+               "--pack: parent directory does not exist for archive "
+               "{!r}".format ( pack_archive )
+            )
+
+      elif self.restrict_depends:
         if not self.modules:
            self.modules = [ '.', ]
 
       elif not self.modules and not self._argv_config.allow_empty:
-         self.parser.error ( "no modules specified, try --allow-empty" )
+         self.error ( "no modules specified, try --allow-empty" )
 
       shlibcclib.message.DEBUG_PRINT = bool ( self._argv_config.debug )
 
@@ -778,6 +1096,55 @@ class ShlibccConfig ( object ):
 
 # --- end of ShlibccConfig ---
 
+def write_lines ( lines, fh=None ):
+   """Writes lines to the given file handle (or stdout) as they arrive."""
+   if fh is None:
+      fh = sys.stdout
+   for line in lines:
+      fh.write ( line )
+      fh.write ( '\n' )
+# --- end of write_lines (...) ---
+
+def import_action_modules ( action ):
+   """Imports the modules that are required by the given action.
+
+   Query actions such as list-modules or deptable only need the module
+   library code, which keeps their startup time low.
+
+   arguments:
+   * action -- action
+   """
+   if action in {
+      ACTION_DEPGRAPH, ACTION_DEPGRAPH_REVERSE, ACTION_DEPLIST,
+      ACTION_IMPACT, ACTION_LINK
+   }:
+      import shlibcclib.depgraph
+
+   if action == ACTION_IMPACT:
+      import shlibcclib.impact
+   elif action == ACTION_LINK:
+      import shlibcclib.linker
+   elif action == ACTION_COMPILE:
+      import shlibcclib.objfile
+# --- end of import_action_modules (...) ---
+
+def pack_library ( config ):
+   """Creates a module library archive, see --pack.
+
+   arguments:
+   * config -- configuration
+   """
+   import shlibcclib.archive
+
+   pack_root, pack_archive = config.pack
+   num_files = shlibcclib.archive.pack (
+      os.path.abspath ( pack_root ), os.path.abspath ( pack_archive )
+   )
+   shlibcclib.message.debug_print (
+      "packed {:d} files into {!r}".format ( num_files, pack_archive )
+   )
+# --- end of pack_library (...) ---
+
 def main ( default_action ):
    """the main function
 
@@ -785,28 +1152,54 @@ def main ( default_action ):
    * default_action -- the action that should be performed if not overridden
                        by command line args
    """
-   ACTION_LINK             = 'link'
-   ACTION_DEPTABLE         = 'deptable'
-   ACTION_DEPGRAPH         = 'depgraph'
-   ACTION_DEPGRAPH_REVERSE = 'revdep'
-   ACTION_DEPLIST          = 'deplist'
-   ACTION_MODLIST          = 'list-modules'
-
    # parse args / create config
-   config = ShlibccConfig (
-      [
-         ACTION_MODLIST, ACTION_DEPTABLE, ACTION_DEPGRAPH,
-         ACTION_DEPGRAPH_REVERSE, ACTION_DEPLIST, ACTION_LINK
-      ],
-      default_action
-   )
+   config = ShlibccConfig ( ACTIONS, default_action )
+
+   if config.pack:
+      pack_library ( config )
+      return
+
+   import_action_modules ( config.action )
+
+   if config.profile or config.trace_file or config.memprofile:
+      profiler = shlibcclib.profiler.set_profiler (
+         shlibcclib.profiler.Profiler (
+            report_format        = (
+               config.profile_format if config.profile else None
+            ),
+            trace_file           = config.trace_file,
+            memory_report_format = (
+               config.profile_format if config.memprofile else None
+            ),
+         )
+      )
+   else:
+      profiler = shlibcclib.profiler.PROFILER
+
+   if config.fs_stats:
+      fs_accounting = shlibcclib.fsio.enable_accounting()
+   else:
+      fs_accounting = None
+
+   if config.action == ACTION_COMPILE:
+      if len ( config.modules ) != 1:
+         config.error ( "--compile expects exactly one module" )
+
+      config.modules = [
+         shlibcclib.objfile.get_module_name (
+            config.shlib_path, config.modules [0]
+         )
+      ]
+   # -- end if
 
    # deptable is always required
-   deptable = shlibcclib.library.make_dependency_table (
-      rootdirs = config.shlib_path,
-      modules  = config.modules,
-      config   = config,
-   )
+   with profiler.phase ( 'discovery' ):
+      deptable = shlibcclib.library.make_dependency_table (
+         rootdirs = config.shlib_path,
+         modules  = config.modules,
+         config   = config,
+      )
+   profiler.count ( 'modules', len ( deptable.get_names() ) )
 
 
    if config.restrict_depends:
@@ -836,27 +1229,73 @@ def main ( default_action ):
 
    elif config.action == ACTION_DEPTABLE:
 
-      print ( str ( deptable ) )
+      if config.output_format == 'text':
+         print ( str ( deptable ) )
+      else:
+         write_lines (
+            shlibcclib.export.iter_deptable_lines (
+               deptable, config.output_format
+            )
+         )
 
    elif config.action == ACTION_DEPGRAPH:
 
-      depgraph = shlibcclib.depgraph.DependencyGraph ( deptable )
+      depgraph = shlibcclib.depgraph.DependencyGraph (
+         deptable, config.reduce_edges
+      )
 
-      print ( depgraph.visualize_edges() )
+      if config.output_format == 'text':
+         print ( depgraph.visualize_edges() )
+      else:
+         write_lines (
+            shlibcclib.export.iter_edge_lines (
+               depgraph, config.output_format
+            )
+         )
 
    elif config.action == ACTION_DEPGRAPH_REVERSE:
 
-      depgraph = shlibcclib.depgraph.DependencyGraph ( deptable )
+      depgraph = shlibcclib.depgraph.DependencyGraph (
+         deptable, config.reduce_edges
+      )
 
-      print ( depgraph.visualize_edges ( reverse=True ) )
+      if config.output_format == 'text':
+         print ( depgraph.visualize_edges ( reverse=True ) )
+      else:
+         write_lines (
+            shlibcclib.export.iter_edge_lines (
+               depgraph, config.output_format, reverse=True
+            )
+         )
 
    elif config.action == ACTION_DEPLIST:
 
       deplist = shlibcclib.depgraph.DependencyList (
-         deptable, config.stable_sort
+         deptable, config.stable_sort, config.reduce_edges
       )
 
-      print ( str ( deplist ) )
+      if config.output_format == 'text':
+         print ( str ( deplist ) )
+      else:
+         write_lines (
+            shlibcclib.export.iter_deplist_lines (
+               deplist, config.output_format
+            )
+         )
+
+   elif config.action == ACTION_IMPACT:
+
+      depgraph = shlibcclib.depgraph.DependencyGraph ( deptable )
+
+      for target in shlibcclib.impact.get_affected_targets (
+         deptable, depgraph, config.manifest_targets,
+         config.get_changed_files(),
+         [
+            shlibcclib.library.ModuleRootDirectories.FTYPE_BASH,
+            shlibcclib.library.ModuleRootDirectories.FTYPE_SH,
+         ]
+      ):
+         print ( target )
 
    elif config.action == ACTION_LINK:
 
@@ -865,10 +1304,20 @@ def main ( default_action ):
       else:
          shlibcclib.linker.link (
             config,
-            shlibcclib.depgraph.DependencyList ( deptable, config.stable_sort )
+            shlibcclib.depgraph.DependencyList (
+               deptable, config.stable_sort, config.reduce_edges
+            )
          )
 
+   elif config.action == ACTION_COMPILE:
+
+      shlibcclib.objfile.compile_module ( config, deptable )
+
    else:
       raise Exception ( "unhandled action {!r}".format ( config.action ) )
 
+   profiler.report()
+
+   if fs_accounting is not None:
+      fs_accounting.report ( config.profile_format )
 # --- end of main (...) ---
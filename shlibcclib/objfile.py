@@ -0,0 +1,282 @@
+# shlibcc -- pre-processed module object files
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# "shlibcc -c <module> -O <module>.shlo" parses a module once and writes
+# its processed sections, direct dependencies and blockers to an object
+# file. Object files can be passed to the link action instead of module
+# names, in which case their sections are copied into the output without
+# reading the module file.
+#
+# Object file format (text):
+#
+#  shlibcc-object <version>
+#  name <module name>
+#  source <module file>
+#  config <parse options fingerprint>
+#  deps <module>...
+#  blockers <module>...
+#  section <name> <number of lines>
+#  <lines>...
+#  [section ...]
+#
+# Objects can only be linked with the parse options they were compiled
+# with (strip/keep options, see get_config_fingerprint()).
+#
+
+__all__ = [
+   'ShlibObjectModule', 'read_object_header', 'compile_module',
+]
+
+import os
+import sys
+
+import shlibcclib.deputil
+import shlibcclib.fsio
+import shlibcclib.library
+import shlibcclib.shlib
+
+from shlibcclib.shlib import ShlibModule, ShlibModuleException
+
+
+OBJECT_MAGIC   = 'shlibcc-object'
+OBJECT_VERSION = 1
+OBJECT_SUFFIX  = shlibcclib.deputil.OBJECT_SUFFIX
+
+
+class ShlibObjectException ( ShlibModuleException ):
+   pass
+
+
+def get_config_fingerprint ( config ):
+   """Returns a str that identifies the config options that affect
+   module parsing."""
+   return ','.join (
+      "{}={}".format ( key, getattr ( config, key ) )
+      for key in shlibcclib.shlib.ShlibModuleCache.CONFIG_KEYS
+   )
+# --- end of get_config_fingerprint (...) ---
+
+
+class ShlibObjectHeader ( object ):
+
+   __slots__ = (
+      'fspath', 'name', 'source', 'fingerprint', 'deps', 'blockers'
+   )
+
+   def __init__ ( self, fspath ):
+      super ( ShlibObjectHeader, self ).__init__()
+      self.fspath      = fspath
+      self.name        = None
+      self.source      = None
+      self.fingerprint = None
+      self.deps        = ()
+      self.blockers    = ()
+   # --- end of __init__ (...) ---
+
+# --- end of ShlibObjectHeader ---
+
+
+def _read_header ( fspath, FH ):
+   header = ShlibObjectHeader ( fspath )
+   line   = FH.readline().rstrip ( '\n' )
+
+   if line != "{} {:d}".format ( OBJECT_MAGIC, OBJECT_VERSION ):
+      raise ShlibObjectException (
+         "{!r} is not a shlibcc object file (version {:d})".format (
+            fspath, OBJECT_VERSION
+         )
+      )
+
+   for line in FH:
+      key, sepa, value = line.rstrip ( '\n' ).partition ( ' ' )
+      if key == 'name':
+         header.name = value
+      elif key == 'source':
+         header.source = value
+      elif key == 'config':
+         header.fingerprint = value
+      elif key == 'deps':
+         header.deps = value.split()
+      elif key == 'blockers':
+         header.blockers = value.split()
+         # last header line
+         break
+      else:
+         raise ShlibObjectException (
+            "{!r}: invalid header line {!r}".format ( fspath, line )
+         )
+   # -- end for
+
+   if not header.name:
+      raise ShlibObjectException (
+         "{!r}: incomplete header".format ( fspath )
+      )
+
+   return header
+# --- end of _read_header (...) ---
+
+def read_object_header ( fspath ):
+   """Reads the header (name, deps, ...) of an object file.
+
+   arguments:
+   * fspath -- object file
+   """
+   with shlibcclib.fsio.open ( fspath, 'rt' ) as FH:
+      return _read_header ( fspath, FH )
+# --- end of read_object_header (...) ---
+
+
+class ShlibObjectModule ( object ):
+   """A module loaded from an object file, which provides the parts of
+   the ShlibModule interface that ShlibFile uses."""
+
+   def __init__ ( self, module_name, module_fspath, config ):
+      super ( ShlibObjectModule, self ).__init__()
+      self.name      = module_name
+      self.fspath    = module_fspath
+      self.config    = config
+      self.stats     = None
+      self._sections = dict.fromkeys ( ShlibModule.SECTIONS )
+      self._load()
+   # --- end of __init__ (...) ---
+
+   def _load ( self ):
+      with shlibcclib.fsio.open ( self.fspath, 'rt' ) as FH:
+         header = _read_header ( self.fspath, FH )
+
+         if header.fingerprint != get_config_fingerprint ( self.config ):
+            raise ShlibObjectException (
+               "{!r} has been compiled with different options: {}".format (
+                  self.fspath, header.fingerprint
+               )
+            )
+
+         for line in FH:
+            key, section, num_lines = line.split()
+            if key != 'section' or section not in self._sections:
+               raise ShlibObjectException (
+                  "{!r}: invalid section line {!r}".format (
+                     self.fspath, line
+                  )
+               )
+
+            # drop the newline of the last line
+            self._sections [section] = ''.join (
+               FH.readline() for k in range ( int ( num_lines ) )
+            ) [:-1] or None
+      # -- end with
+   # --- end of _load (...) ---
+
+   def get_sections ( self ):
+      return [ k for k, v in self._sections.items() if v ]
+   # --- end of get_sections (...) ---
+
+   def to_str ( self, section ):
+      return self._sections [section]
+   # --- end of to_str (...) ---
+
+# --- end of ShlibObjectModule ---
+
+
+def write_object ( module, deps, blockers, fh ):
+   """Writes a parsed module to an object file.
+
+   arguments:
+   * module   -- ShlibModule
+   * deps     -- direct dependencies of the module (module names)
+   * blockers -- modules blocked by the module
+   * fh       -- file handle (text mode)
+   """
+   fh.write ( "{} {:d}\n".format ( OBJECT_MAGIC, OBJECT_VERSION ) )
+   fh.write ( "name {}\n".format ( module.name ) )
+   fh.write ( "source {}\n".format ( module.fspath ) )
+   fh.write ( "config {}\n".format (
+      get_config_fingerprint ( module.config )
+   ) )
+   fh.write ( "deps {}\n".format ( ' '.join ( deps ) ) )
+   fh.write ( "blockers {}\n".format ( ' '.join ( blockers ) ) )
+
+   for section in ShlibModule.SECTIONS:
+      text = module.to_str ( section )
+      if text:
+         fh.write ( "section {} {:d}\n".format (
+            section, text.count ( '\n' ) + 1
+         ) )
+         fh.write ( text )
+         fh.write ( '\n' )
+# --- end of write_object (...) ---
+
+def get_module_name ( rootdirs, module ):
+   """Returns the name of a module given as file path (relative to the
+   first root directory that contains it) or module name.
+
+   arguments:
+   * rootdirs -- shlib root directories
+   * module   -- module file or name
+   """
+   fspath = os.path.abspath ( module )
+   if shlibcclib.fsio.isfile ( fspath ):
+      for rootdir in rootdirs:
+         if fspath.startswith ( rootdir + os.sep ):
+            return shlibcclib.deputil.get_module_key (
+               os.path.splitext ( fspath [len(rootdir)+1:] ) [0]
+            )
+      raise ShlibObjectException (
+         "{!r} is not part of any shlib root directory".format ( module )
+      )
+   else:
+      return module
+# --- end of get_module_name (...) ---
+
+def get_module_blockers ( name, fspath ):
+   """Returns the blockers of a module file (from its depfile or
+   directory manifest).
+
+   arguments:
+   * name   -- module name
+   * fspath -- module file
+   """
+   basepath = os.path.splitext ( fspath ) [0]
+   depfile  = shlibcclib.deputil.locate_depfile ( fspath, basepath )
+
+   if depfile:
+      blockers = shlibcclib.deputil.read_depfile ( depfile ) [1]
+   else:
+      blockers = (
+         shlibcclib.deputil.DirectoryManifests().get_deps ( basepath ) [2]
+      )
+
+   return shlibcclib.library.get_matchable_module_keys (
+      ( blockers or () ), 'blocker', name, name
+   )
+# --- end of get_module_blockers (...) ---
+
+def compile_module ( config, deptable ):
+   """Parses the module of a compile run and writes it to an object file.
+
+   arguments:
+   * config   -- configuration (with exactly one module)
+   * deptable -- dependency table
+   """
+   name, fspath, deps = next ( deptable.iter_nodes ( config.modules ) )
+   if shlibcclib.fsio.isdir ( fspath ):
+      raise ShlibObjectException (
+         "cannot compile directory module {!r}".format ( name )
+      )
+
+   module   = ShlibModule ( name, fspath, config )
+   deps     = sorted ( deps )
+   blockers = get_module_blockers ( name, fspath )
+
+   if config.use_stdout:
+      write_object ( module, deps, blockers, sys.stdout )
+   else:
+      # an interrupted compile must not leave a truncated object file
+      with shlibcclib.fsio.open_atomic (
+         config.output, fsync=config.fsync
+      ) as FH:
+         write_object ( module, deps, blockers, FH )
+# --- end of compile_module (...) ---
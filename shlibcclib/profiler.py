@@ -0,0 +1,460 @@
+# shlibcc -- per-phase timing / profile report
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 André Erdmann <dywi@mailerd.de>
+# Distributed under the terms of the GNU General Public License;
+# either version 2 of the License, or (at your option) any later version.
+#
+# Code that should be profiled accesses the module-level PROFILER variable,
+# which is a no-op NullProfiler unless profiling has been enabled
+# via set_profiler().
+#
+
+__all__ = [
+   'NullProfiler', 'Profiler', 'MemoryProfiler',
+   'get_profiler', 'set_profiler',
+]
+
+import collections
+import os
+import sys
+import time
+
+import shlibcclib.generic.graph
+
+
+class _NullContext ( object ):
+
+   def __enter__ ( self ):
+      return self
+
+   def __exit__ ( self, exc_type, exc_value, traceback ):
+      return False
+
+# --- end of _NullContext ---
+
+_NULL_CONTEXT = _NullContext()
+
+
+class NullProfiler ( object ):
+   """A profiler that does nothing."""
+
+   enabled = False
+
+   def phase ( self, name, detail=None ):
+      return _NULL_CONTEXT
+   # --- end of phase (...) ---
+
+   def count ( self, key, n=1 ):
+      pass
+   # --- end of count (...) ---
+
+   def report ( self, fh=None ):
+      pass
+   # --- end of report (...) ---
+
+# --- end of NullProfiler ---
+
+
+class _PhaseContext ( object ):
+
+   def __init__ ( self, profiler, name, detail ):
+      super ( _PhaseContext, self ).__init__()
+      self.profiler = profiler
+      self.name     = name
+      self.detail   = detail
+      self.wall     = None
+      self.cpu      = None
+   # --- end of __init__ (...) ---
+
+   def __enter__ ( self ):
+      self.profiler.enter_phase ( self.name, self.detail )
+      self.cpu  = time.process_time()
+      self.wall = time.perf_counter()
+      return self
+   # --- end of __enter__ (...) ---
+
+   def __exit__ ( self, exc_type, exc_value, traceback ):
+      wall_end = time.perf_counter()
+      cpu_end  = time.process_time()
+      self.profiler.add_phase_time (
+         self.name, self.detail,
+         self.wall, ( wall_end - self.wall ), ( cpu_end - self.cpu )
+      )
+      self.profiler.exit_phase ( self.name, self.detail )
+      return False
+   # --- end of __exit__ (...) ---
+
+# --- end of _PhaseContext ---
+
+
+class MemoryProfiler ( object ):
+   """Records peak and retained memory per (top-level) phase using
+   tracemalloc, plus the top allocation sites grouped by python module.
+
+   A snapshot is taken when a top-level phase ends. Consecutive runs of
+   the same phase (e.g. "parse", once per module) are snapshotted after
+   the first and the last run only, their allocation sites are relative
+   to the snapshot taken before the first run.
+
+   Runs of a phase that have a detail (e.g. the shlib module name of a
+   "parse" run) are also measured individually, using the traced memory
+   before and after the run (full snapshots per run would be too slow).
+   """
+
+   def __init__ ( self, top_sites=8, top_details=10 ):
+      super ( MemoryProfiler, self ).__init__()
+      import tracemalloc
+      self.tracemalloc   = tracemalloc
+      self.top_sites     = top_sites
+      self.top_details   = top_details
+      # phase name => [ peak, retained ]
+      self.phases        = collections.OrderedDict()
+      # phase name => list of ( <module>, <size>, <size diff>, <count> )
+      self.sites         = collections.OrderedDict()
+      # phase name => dict detail => ( <retained>, <peak> )
+      self.details       = collections.OrderedDict()
+      self.detail_start  = 0
+      self.last_phase    = None
+      self.pending_phase = None
+      self.snapshot      = None
+      self.base_snapshot = None
+
+      if not tracemalloc.is_tracing():
+         tracemalloc.start()
+      self.snapshot = self.take_snapshot()
+   # --- end of __init__ (...) ---
+
+   def take_snapshot ( self ):
+      Filter = self.tracemalloc.Filter
+      return self.tracemalloc.take_snapshot().filter_traces ( (
+         Filter ( False, self.tracemalloc.__file__ ),
+         Filter ( False, "<frozen importlib._bootstrap>" ),
+         Filter ( False, "<frozen importlib._bootstrap_external>" ),
+         Filter ( False, "<unknown>" ),
+      ) )
+   # --- end of take_snapshot (...) ---
+
+   def flush ( self ):
+      """Takes a snapshot for the last top-level phase, if necessary."""
+      phase = self.pending_phase
+      if phase is not None:
+         self.pending_phase = None
+         snapshot = self.take_snapshot()
+         self.sites [phase] = [
+            (
+               os.path.basename ( stat.traceback[0].filename ),
+               stat.size, stat.size_diff, stat.count
+            ) for stat in snapshot.compare_to (
+               self.base_snapshot, 'filename'
+            ) [:self.top_sites]
+         ]
+         self.snapshot = snapshot
+   # --- end of flush (...) ---
+
+   def enter_phase ( self, name, detail=None ):
+      if name != self.last_phase:
+         self.flush()
+         self.base_snapshot = self.snapshot
+
+      if hasattr ( self.tracemalloc, 'reset_peak' ):
+         self.tracemalloc.reset_peak()
+      self.detail_start = self.tracemalloc.get_traced_memory()[0]
+   # --- end of enter_phase (...) ---
+
+   def exit_phase ( self, name, detail=None ):
+      current, peak = self.tracemalloc.get_traced_memory()
+      if detail is not None:
+         details = self.details.get ( name )
+         if details is None:
+            details = dict()
+            self.details [name] = details
+         details [detail] = (
+            current - self.detail_start, peak - self.detail_start
+         )
+
+      entry = self.phases.get ( name )
+      if entry is None:
+         self.phases [name] = [ peak, current ]
+      else:
+         entry [0] = max ( entry [0], peak )
+         entry [1] = current
+
+      self.pending_phase = name
+      if name != self.last_phase:
+         self.last_phase = name
+         self.flush()
+   # --- end of exit_phase (...) ---
+
+   def get_top_details ( self, name ):
+      """Returns the top_details runs of a phase with the most retained
+      memory as list of ( <detail>, <retained>, <peak> )."""
+      return [
+         ( detail, entry [0], entry [1] )
+         for detail, entry in sorted (
+            self.details.get ( name, {} ).items(),
+            key=lambda item: ( -item[1][0], item[0] )
+         ) [:self.top_details]
+      ]
+   # --- end of get_top_details (...) ---
+
+   def get_data ( self ):
+      self.flush()
+      return collections.OrderedDict (
+         (
+            name, {
+               'peak'     : entry [0],
+               'retained' : entry [1],
+               'sites'    : [
+                  {
+                     'module'    : site [0],
+                     'size'      : site [1],
+                     'size_diff' : site [2],
+                     'count'     : site [3],
+                  } for site in self.sites.get ( name, () )
+               ],
+               'details'  : [
+                  {
+                     'name'     : detail [0],
+                     'retained' : detail [1],
+                     'peak'     : detail [2],
+                  } for detail in self.get_top_details ( name )
+               ],
+            }
+         ) for name, entry in self.phases.items()
+      )
+   # --- end of get_data (...) ---
+
+   def format_report ( self ):
+      format_table = shlibcclib.generic.graph.format_table
+      kib          = lambda n: "{:.1f}".format ( n / 1024.0 )
+      data         = self.get_data()
+
+      for line in format_table (
+         [
+            ( name, kib ( entry ['peak'] ), kib ( entry ['retained'] ) )
+            for name, entry in data.items()
+         ],
+         [ ( '<phase>', '<peak KiB>', '<retained KiB>' ) ]
+      ):
+         yield line
+
+      for name, entry in data.items():
+         if entry ['sites']:
+            yield ""
+            yield "top allocation sites after phase {}:".format ( name )
+            for line in format_table (
+               [
+                  (
+                     site ['module'], kib ( site ['size'] ),
+                     "{:+.1f}".format ( site ['size_diff'] / 1024.0 ),
+                     str ( site ['count'] )
+                  ) for site in entry ['sites']
+               ],
+               [ ( '<module>', '<KiB>', '<diff KiB>', '<blocks>' ) ]
+            ):
+               yield "  " + line
+
+         if entry ['details']:
+            yield ""
+            yield "top runs of phase {} (by retained memory):".format ( name )
+            for line in format_table (
+               [
+                  (
+                     detail ['name'], kib ( detail ['retained'] ),
+                     kib ( detail ['peak'] )
+                  ) for detail in entry ['details']
+               ],
+               [ ( '<name>', '<retained KiB>', '<peak KiB>' ) ]
+            ):
+               yield "  " + line
+   # --- end of format_report (...) ---
+
+# --- end of MemoryProfiler ---
+
+
+class Profiler ( NullProfiler ):
+   """Collects wall/cpu time per phase as well as counters and, optionally,
+   memory usage.
+
+   Phases may be nested (e.g. "depfiles" is part of "discovery"),
+   the reported times are inclusive.
+   """
+
+   enabled = True
+
+   def __init__ (
+      self, report_format='text', trace_file=None, memory_report_format=None
+   ):
+      """Constructor.
+
+      arguments:
+      * report_format        -- "text", "json" or None (no report)
+      * trace_file           -- file for writing Chrome trace events (or None)
+      * memory_report_format -- "text", "json" or None (no memory profiling)
+      """
+      super ( Profiler, self ).__init__()
+      self.report_format        = report_format
+      self.memory_report_format = memory_report_format
+      self.trace_file           = trace_file
+      self.trace_events         = [] if trace_file else None
+      self.time_start           = time.perf_counter()
+      # phase name => [ wall, cpu, calls ]
+      self.phases               = collections.OrderedDict()
+      self.counters             = collections.OrderedDict()
+      self.phase_depth          = 0
+      self.memory               = (
+         MemoryProfiler() if memory_report_format else None
+      )
+   # --- end of __init__ (...) ---
+
+   def phase ( self, name, detail=None ):
+      """Returns a context manager that measures the time spent in a phase.
+
+      arguments:
+      * name   -- phase name, times get accumulated per phase
+      * detail -- name of the trace event (e.g. module name), defaults
+                  to the phase name
+      """
+      return _PhaseContext ( self, name, detail )
+   # --- end of phase (...) ---
+
+   def enter_phase ( self, name, detail=None ):
+      # phases are listed in order of their first occurrence
+      if name not in self.phases:
+         self.phases [name] = [ 0.0, 0.0, 0 ]
+
+      if self.memory is not None and not self.phase_depth:
+         self.memory.enter_phase ( name, detail )
+
+      self.phase_depth += 1
+   # --- end of enter_phase (...) ---
+
+   def exit_phase ( self, name, detail=None ):
+      self.phase_depth -= 1
+
+      if self.memory is not None and not self.phase_depth:
+         self.memory.exit_phase ( name, detail )
+   # --- end of exit_phase (...) ---
+
+   def add_phase_time ( self, name, detail, wall_start, wall, cpu ):
+      entry = self.phases [name]
+      entry [0] += wall
+      entry [1] += cpu
+      entry [2] += 1
+
+      if self.trace_events is not None:
+         self.trace_events.append ( {
+            'name' : ( detail or name ),
+            'cat'  : name,
+            'ph'   : 'X',
+            'ts'   : int ( ( wall_start - self.time_start ) * 1e6 ),
+            'dur'  : int ( wall * 1e6 ),
+            'pid'  : os.getpid(),
+            'tid'  : 0,
+         } )
+   # --- end of add_phase_time (...) ---
+
+   def count ( self, key, n=1 ):
+      self.counters [key] = self.counters.get ( key, 0 ) + n
+   # --- end of count (...) ---
+
+   def get_data ( self ):
+      data = {
+         'phases': collections.OrderedDict (
+            (
+               name, {
+                  'wall'  : entry [0],
+                  'cpu'   : entry [1],
+                  'calls' : entry [2],
+               }
+            ) for name, entry in self.phases.items()
+         ),
+         'counters': self.counters,
+         'total_wall': ( time.perf_counter() - self.time_start ),
+      }
+      if self.memory is not None:
+         data ['memory'] = self.memory.get_data()
+      return data
+   # --- end of get_data (...) ---
+
+   def write_trace ( self ):
+      if self.trace_file:
+         import json
+         with open ( self.trace_file, 'wt' ) as FH:
+            json.dump (
+               { 'traceEvents': self.trace_events, 'displayTimeUnit': 'ms' },
+               FH
+            )
+   # --- end of write_trace (...) ---
+
+   def format_report ( self ):
+      format_table = shlibcclib.generic.graph.format_table
+      data         = self.get_data()
+
+      for line in format_table (
+         [
+            (
+               name,
+               "{:.3f}".format ( 1000 * entry ['wall'] ),
+               "{:.3f}".format ( 1000 * entry ['cpu'] ),
+               str ( entry ['calls'] ),
+            ) for name, entry in data ['phases'].items()
+         ],
+         [ ( '<phase>', '<wall ms>', '<cpu ms>', '<calls>' ) ]
+      ):
+         yield line
+
+      yield ""
+
+      for line in format_table (
+         [ ( k, str ( v ) ) for k, v in data ['counters'].items() ],
+         [ ( '<counter>', '<value>' ) ]
+      ):
+         yield line
+
+      yield ""
+      yield "total wall time: {:.3f} ms".format ( 1000 * data ['total_wall'] )
+   # --- end of format_report (...) ---
+
+   def report ( self, fh=None ):
+      """Writes the profile report (to stderr by default) and the trace file.
+      """
+      self.write_trace()
+
+      if fh is None:
+         fh = sys.stderr
+
+      if 'json' in ( self.report_format, self.memory_report_format ):
+         # a single json document that includes the memory profile, if any
+         import json
+         json.dump ( self.get_data(), fh, indent=3 )
+         fh.write ( '\n' )
+
+      else:
+         if self.report_format:
+            for line in self.format_report():
+               fh.write ( line )
+               fh.write ( '\n' )
+
+         if self.memory is not None:
+            if self.report_format:
+               fh.write ( '\n' )
+            for line in self.memory.format_report():
+               fh.write ( line )
+               fh.write ( '\n' )
+   # --- end of report (...) ---
+
+# --- end of Profiler ---
+
+
+PROFILER = NullProfiler()
+
+def get_profiler():
+   return PROFILER
+# --- end of get_profiler (...) ---
+
+def set_profiler ( profiler ):
+   global PROFILER
+   PROFILER = NullProfiler() if profiler is None else profiler
+   return PROFILER
+# --- end of set_profiler (...) ---
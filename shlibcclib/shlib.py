@@ -7,6 +7,12 @@
 import collections
 import re
 import os.path
+import tempfile
+import time
+
+import shlibcclib.deputil
+import shlibcclib.fsio
+import shlibcclib.profiler
 
 
 def get_dict_keys_with_value ( d, values ):
@@ -38,9 +44,12 @@ class TextLines ( collections.deque ):
 class TextFileLines ( TextLines ):
 
    def __init__ ( self, fspath ):
-      with open ( fspath, 'rt' ) as FH:
+      with shlibcclib.fsio.open ( fspath, 'rt' ) as FH:
          lines = [ l.rstrip() for l in FH.readlines() ]
 
+      self.num_lines_read = len ( lines )
+      shlibcclib.profiler.PROFILER.count ( 'lines_in', self.num_lines_read )
+
       super ( TextFileLines, self ).__init__ ( lines )
       self.discard()
       self.discard_end()
@@ -111,6 +120,63 @@ class TextFileLines ( TextLines ):
 #~ # --- end of SymbolTable ---
 
 
+class ShlibModuleStats ( object ):
+   """Processing statistics of a single module."""
+
+   # line removal stages, see ShlibModule._parse()
+   REMOVED_KEYS = ( 'comments', 'dev_comments', 'virtual', 'blank' )
+
+   def __init__ ( self ):
+      super ( ShlibModuleStats, self ).__init__()
+      self.bytes_read          = 0
+      self.lines_read          = 0
+      self.lines_kept          = dict()
+      self.removed             = dict.fromkeys ( self.REMOVED_KEYS, 0 )
+      self.directives_expanded = 0
+      self.read_time           = 0.0
+      self.parse_time          = 0.0
+   # --- end of __init__ (...) ---
+
+# --- end of ShlibModuleStats ---
+
+
+class ShlibModuleStatsWriter ( object ):
+   """Writes ShlibModuleStats as tab-separated rows, one per module."""
+
+   def __init__ ( self, fh ):
+      super ( ShlibModuleStatsWriter, self ).__init__()
+      self.fh = fh
+      self.write_row (
+         [ 'module', 'bytes_read', 'lines_read', 'lines_kept' ]
+         + [ 'kept:' + k for k in ShlibModule.SECTIONS ]
+         + [ 'removed:' + k for k in ShlibModuleStats.REMOVED_KEYS ]
+         + [ 'directives_expanded', 'read_ms', 'parse_ms' ]
+      )
+   # --- end of __init__ (...) ---
+
+   def write_row ( self, row ):
+      self.fh.write ( '\t'.join ( str ( col ) for col in row ) )
+      self.fh.write ( '\n' )
+   # --- end of write_row (...) ---
+
+   def add ( self, module ):
+      stats = module.stats
+      kept  = [ stats.lines_kept.get ( k, 0 ) for k in ShlibModule.SECTIONS ]
+      self.write_row (
+         [ module.name, stats.bytes_read, stats.lines_read, sum ( kept ) ]
+         + kept
+         + [ stats.removed [k] for k in ShlibModuleStats.REMOVED_KEYS ]
+         + [
+            stats.directives_expanded,
+            "{:.3f}".format ( 1000 * stats.read_time ),
+            "{:.3f}".format ( 1000 * stats.parse_time ),
+         ]
+      )
+   # --- end of add (...) ---
+
+# --- end of ShlibModuleStatsWriter ---
+
+
 class ShlibModule ( object ):
 
    RE_INCLUDE_PROTECTION = re.compile (
@@ -213,8 +279,18 @@ class ShlibModule ( object ):
       self.config       = config
       self._sections    = dict()
 
-      self._read()
-      self._parse()
+      if getattr ( config, 'stats_file', None ):
+         self.stats = ShlibModuleStats()
+         t_start    = time.perf_counter()
+         self._read()
+         t_read     = time.perf_counter()
+         self._parse()
+         self.stats.read_time  = t_read - t_start
+         self.stats.parse_time = time.perf_counter() - t_read
+      else:
+         self.stats = None
+         self._read()
+         self._parse()
    # --- end of __init__ (...) ---
 
    def get_sections ( self ):
@@ -224,6 +300,10 @@ class ShlibModule ( object ):
    def _read ( self ):
       lines = TextFileLines ( self.fspath )
 
+      if self.stats is not None:
+         self.stats.lines_read = lines.num_lines_read
+         self.stats.bytes_read = shlibcclib.fsio.stat ( self.fspath ).st_size
+
       if lines:
          if len ( lines [0] ) > 2 and lines [0][:2] == '#!':
             lines.popleft()
@@ -333,21 +413,39 @@ class ShlibModule ( object ):
       # --- end of gen_varcheck_lines (...) ---
 
       def strip_lines ( lines, section ):
+         stage = None
          if not lines:
             return None
          elif self.name == '__main__' and not self.config.strip_main:
             retgen = lines
          elif self.config.strip_comments:
+            stage  = 'comments'
             retgen = strip_comments ( lines )
          elif self.config.strip_virtual and not contains_code ( lines ):
+            stage  = 'virtual'
             retgen = list()
          elif self.config.strip_dev_comments:
+            stage  = 'dev_comments'
             retgen = strip_dev_comments ( lines )
          else:
             retgen = lines
-         return list ( strip_repeated_newline ( retgen ) )
+
+         if stats is None:
+            return list ( strip_repeated_newline ( retgen ) )
+         else:
+            if stage is not None:
+               retgen = list ( retgen )
+               stats.removed [stage] += len ( lines ) - len ( retgen )
+
+            ret = list ( strip_repeated_newline ( retgen ) )
+            stats.removed ['blank'] += len ( retgen ) - len ( ret )
+            stats.lines_kept [section] = len ( ret )
+            return ret
       # --- end of strip_lines (...) ---
 
+      stats                = self.stats
+      directives_expanded  = 0
+
       keep_safety_checks   = self.config.keep_safety_checks
       enable_debug_code    = self.config.enable_debug_code
       section_keywords     = self.SECTION_KEYWORDS
@@ -392,12 +490,14 @@ class ShlibModule ( object ):
                   if keep_safety_checks == 'c':
                      add_line_to_section ( line )
                   elif keep_safety_checks == 'y':
+                     directives_expanded += 1
                      add_line_to_section ( reindent_line ( line, arg ) )
 
                elif keyword in { 'varcheck', 'vcheck' }:
                   if keep_safety_checks == 'c':
                      add_line_to_section ( line )
                   elif keep_safety_checks == 'y':
+                     directives_expanded += 1
                      for varcheck_line in gen_varcheck_lines ( arg, False ):
                         add_line_to_section (
                            reindent_line ( line, varcheck_line )
@@ -407,6 +507,7 @@ class ShlibModule ( object ):
                   if keep_safety_checks == 'c':
                      add_line_to_section ( line )
                   elif keep_safety_checks == 'y':
+                     directives_expanded += 1
                      for varcheck_line in gen_varcheck_lines ( arg, True ):
                         add_line_to_section (
                            reindent_line ( line, varcheck_line )
@@ -416,12 +517,14 @@ class ShlibModule ( object ):
                   if enable_debug_code == 'c':
                      add_line_to_section ( line )
                   elif enable_debug_code == 'y':
+                     directives_expanded += 1
                      add_line_to_section ( reindent_line ( line, arg ) )
 
                elif keyword[:6] == 'debug_':
                   if enable_debug_code == 'c':
                      add_line_to_section ( line )
                   elif enable_debug_code == 'y':
+                     directives_expanded += 1
                      debug_type  = keyword[6:]
                      for dbg_arg in get_debug_commands (
                         debug_type, arg, sline
@@ -438,17 +541,20 @@ class ShlibModule ( object ):
             pass
       # -- end for
 
+      if stats is not None:
+         stats.directives_expanded = directives_expanded
+
+      # each section is joined once and stored as str
       for section, raw_lines in sections.items():
          lines = strip_lines ( raw_lines, section )
-         self._sections [section] = lines or None
+         self._sections [section] = '\n'.join ( lines ) if lines else None
    # --- end of parse (...) ---
 
    def to_str ( self, section ):
       if section == 'raw':
          return '\n'.join ( self._lines )
       else:
-         entry = self._sections [section]
-         return ( '\n'.join ( str(k) for k in entry ) ) if entry else None
+         return self._sections [section]
    # --- end of to_str (...) ---
 
    def __str__ ( self ):
@@ -462,8 +568,156 @@ class ShlibModule ( object ):
 
 # --- end of ShlibModule ---
 
+class ShlibModuleCache ( object ):
+   """Parsed modules, shared between ShlibFile objects.
+
+   Modules are keyed by name, file path and the config options that affect
+   parsing. A module is parsed again if its file's mtime or size changed.
+   """
+
+   CONFIG_KEYS = (
+      'strip_comments', 'strip_virtual', 'strip_dev_comments', 'strip_main',
+      'keep_safety_checks', 'enable_debug_code',
+   )
+
+   def __init__ ( self ):
+      super ( ShlibModuleCache, self ).__init__()
+      # key => ( ( mtime, size ), ShlibModule )
+      self._modules = dict()
+      self.hits     = 0
+      self.misses   = 0
+   # --- end of __init__ (...) ---
+
+   def get_config_key ( self, config ):
+      return (
+         tuple ( getattr ( config, k ) for k in self.CONFIG_KEYS )
+         + ( bool ( getattr ( config, 'stats_file', None ) ), )
+      )
+   # --- end of get_config_key (...) ---
+
+   def get_module ( self, module_name, module_fspath, config ):
+      """Returns a parsed module, either from the cache or a new one.
+
+      arguments:
+      * module_name   -- name of the module
+      * module_fspath -- module file
+      * config        -- configuration
+      """
+      key   = ( module_name, module_fspath, self.get_config_key ( config ) )
+      sinfo = shlibcclib.fsio.stat ( module_fspath )
+      stamp = ( sinfo.st_mtime_ns, sinfo.st_size )
+      entry = self._modules.get ( key )
+
+      if entry is not None and entry [0] == stamp:
+         self.hits += 1
+         return entry [1]
+      else:
+         self.misses += 1
+         module = ShlibModule ( module_name, module_fspath, config )
+         self._modules [key] = ( stamp, module )
+         return module
+   # --- end of get_module (...) ---
+
+   def clear ( self ):
+      self._modules.clear()
+   # --- end of clear (...) ---
+
+   def __len__ ( self ):
+      return len ( self._modules )
+   # --- end of __len__ (...) ---
+
+# --- end of ShlibModuleCache ---
+
+def copy_pre_header ( fh_in, fh_out, chunk_size ):
+   """Copies a file object (e.g. stdin) to fh_out in chunks and flushes
+   fh_out. Writes the same text as ShlibFile.generate_lines() does for
+   pre_header_fh: the input, a newline if it does not end with one and
+   an empty line (nothing if the input is empty).
+
+   arguments:
+   * fh_in      -- file object to copy (text mode)
+   * fh_out     -- output file object (text mode)
+   * chunk_size -- max. number of chars to read at once
+   """
+   last_chunk = None
+   for chunk in iter ( lambda: fh_in.read ( chunk_size ), '' ):
+      fh_out.write ( chunk )
+      last_chunk = chunk
+
+   if last_chunk:
+      if last_chunk [-1] != '\n':
+         fh_out.write ( '\n' )
+      fh_out.write ( '\n' )
+
+   fh_out.flush()
+# --- end of copy_pre_header (...) ---
+
+
+class ShlibSectionSpill ( object ):
+   """Per-section temporary files that hold the section text of already
+   parsed modules, so that ShlibFile does not need to keep all modules in
+   memory until the output gets written (low-memory link mode).
+
+   Each entry is stored as "<number of chars> <module name>" line followed
+   by the section text.
+   """
+
+   def __init__ ( self ):
+      super ( ShlibSectionSpill, self ).__init__()
+      # section => temporary file (created on demand)
+      self._files = dict()
+   # --- end of __init__ (...) ---
+
+   def add ( self, section, module_name, text ):
+      """Appends the text of a module's section.
+
+      arguments:
+      * section     -- section name
+      * module_name -- module name (as it should appear in the output)
+      * text        -- section text (str)
+      """
+      FH = self._files.get ( section )
+      if FH is None:
+         FH = tempfile.TemporaryFile (
+            mode='w+t', encoding='utf-8', newline='',
+            prefix='shlibcc-' + section + '-'
+         )
+         self._files [section] = FH
+
+      FH.write ( "{:d} {}\n".format ( len ( text ), module_name ) )
+      FH.write ( text )
+   # --- end of add (...) ---
+
+   def iter_entries ( self, section ):
+      """Generator that yields ( <module name>, <text> ) for all entries
+      of the given section, in insertion order.
+
+      arguments:
+      * section -- section name
+      """
+      FH = self._files.get ( section )
+      if FH is not None:
+         FH.flush()
+         FH.seek ( 0 )
+         for line in iter ( FH.readline, '' ):
+            size, sepa, module_name = line.rstrip ( '\n' ).partition ( ' ' )
+            yield ( module_name, FH.read ( int ( size ) ) )
+         FH.seek ( 0, os.SEEK_END )
+   # --- end of iter_entries (...) ---
+
+   def close ( self ):
+      for FH in self._files.values():
+         FH.close()
+      self._files.clear()
+   # --- end of close (...) ---
+
+# --- end of ShlibSectionSpill ---
+
 class ShlibFile ( object ):
 
+   # size of the str blocks that get written, see generate_blocks()
+   WRITE_BLOCK_SIZE = 1 << 18
+
    def __init__ ( self, config, header=None ):
       self._module_order = list()
       self._modules      = dict()
@@ -471,16 +725,76 @@ class ShlibFile ( object ):
       self.header        = header
       self.defsym        = None
       self.pre_header    = None
+      # file object whose content gets copied before the header (or None)
+      self.pre_header_fh = None
       self.footer        = None
+      # ShlibModuleStatsWriter (or None)
+      self.stats_writer  = None
+      # ShlibModuleCache (or None)
+      self.module_cache  = None
+      # ShlibSectionSpill (or None), modules are not kept in memory if set
+      self.spill         = None
    # --- end of __init__ (...) ---
 
+   @classmethod
+   def get_display_name ( cls, module_name ):
+      """Returns the name of a module as it appears in the output."""
+      if not module_name or module_name[0] != os.path.sep:
+         return module_name
+      else:
+         return "<" + os.path.basename ( module_name ) + ">"
+   # --- end of get_display_name (...) ---
+
+   def get_wanted_sections ( self ):
+      if self.config.restrict_sections is not None:
+         return [
+            k for k in ShlibModule.SECTIONS
+               if k in self.config.restrict_sections
+         ]
+      else:
+         return ShlibModule.SECTIONS
+   # --- end of get_wanted_sections (...) ---
+
+   def spill_module ( self, module ):
+      m_name = self.get_display_name ( module.name )
+      for section in self.get_wanted_sections():
+         text = module.to_str ( section )
+         if text:
+            self.spill.add ( section, m_name, text )
+   # --- end of spill_module (...) ---
+
+   def load_object ( self, module_name, module_fspath ):
+      # imported on demand, avoid circular import
+      import shlibcclib.objfile
+      return shlibcclib.objfile.ShlibObjectModule (
+         module_name, module_fspath, self.config
+      )
+   # --- end of load_object (...) ---
+
    def add_module ( self, module_name, module_fspath ):
       assert module_name not in self._modules
 
-      module = ShlibModule ( module_name, module_fspath, self.config )
+      profiler = shlibcclib.profiler.PROFILER
+      with profiler.phase ( 'parse', module_name ):
+         if module_fspath.endswith ( shlibcclib.deputil.OBJECT_SUFFIX ):
+            module = self.load_object ( module_name, module_fspath )
+         elif self.module_cache is None:
+            module = ShlibModule ( module_name, module_fspath, self.config )
+         else:
+            module = self.module_cache.get_module (
+               module_name, module_fspath, self.config
+            )
+      profiler.count ( 'modules_parsed' )
+
+      if self.stats_writer is not None and module.stats is not None:
+         self.stats_writer.add ( module )
 
       self._module_order.append ( module_name )
-      self._modules [module_name] = module
+      if self.spill is None:
+         self._modules [module_name] = module
+      else:
+         self.spill_module ( module )
+         self._modules [module_name] = None
       return True
    # --- end of add_module (...) ---
 
@@ -489,6 +803,12 @@ class ShlibFile ( object ):
    # --- end of set_header (...) ---
 
    def set_module_order ( self, module_order ):
+      if self.spill is not None:
+         # section text has already been written in add order
+         raise ShlibModuleException (
+            "cannot reorder modules in low-memory mode"
+         )
+
       if __debug__:
          new_order = list ( module_order )
 
@@ -510,7 +830,21 @@ class ShlibFile ( object ):
 
    def generate_lines ( self ):
       EMPTY_STR = ""
-      modules   = [ self._modules [key] for key in self._module_order ]
+      spill     = self.spill
+      modules   = []
+      if spill is None:
+         for key in self._module_order:
+            m = self._modules [key]
+            modules.append ( ( m, self.get_display_name ( m.name ) ) )
+
+      def iterate_section ( section ):
+         if spill is None:
+            for m, m_name in modules:
+               yield ( m_name, m.to_str ( section ) )
+         else:
+            for item in spill.iter_entries ( section ):
+               yield item
+      # --- end of iterate_section (...) ---
 
       def iterate_str_lines ( var, newline_end=True, newline_begin=False ):
          if not var:
@@ -530,8 +864,35 @@ class ShlibFile ( object ):
             if newline_end: yield EMPTY_STR
       # --- end of iterate_str_lines (...) ---
 
+      def iterate_stream_lines ( fh, chunk_size ):
+         # yields chunks of complete lines (without the last newline char),
+         # followed by an empty line if fh was not empty
+         rest     = EMPTY_STR
+         is_empty = True
+         for chunk in iter ( lambda: fh.read ( chunk_size ), EMPTY_STR ):
+            is_empty = False
+            end      = chunk.rfind ( '\n' )
+            if end < 0:
+               rest += chunk
+            else:
+               yield rest + chunk [:end]
+               rest = chunk [end+1:]
+
+         if rest:
+            yield rest
+         if not is_empty:
+            yield EMPTY_STR
+      # --- end of iterate_stream_lines (...) ---
+
       prev_line_empty = True
 
+      if self.pre_header_fh is not None:
+         for s in iterate_stream_lines (
+            self.pre_header_fh, self.WRITE_BLOCK_SIZE
+         ):
+            yield s
+            prev_line_empty = not bool(s)
+
       for s in iterate_str_lines ( self.pre_header ):
          yield s
          prev_line_empty = not bool(s)
@@ -547,25 +908,10 @@ class ShlibFile ( object ):
       enclose_modules  = self.config.enclose_modules
       enclose_sections = self.config.enclose_sections
 
-      if self.config.restrict_sections is not None:
-         want_sections = [
-            k for k in ShlibModule.SECTIONS
-               if k in self.config.restrict_sections
-         ]
-      else:
-         want_sections = ShlibModule.SECTIONS
-
-
-      for section in want_sections:
+      for section in self.get_wanted_sections():
          section_empty = True
 
-         for m in modules:
-            _str = m.to_str ( section )
-            if not m.name or m.name[0] != os.path.sep:
-               m_name = m.name
-            else:
-               m_name = "<" + os.path.basename ( m.name ) + ">"
-
+         for m_name, _str in iterate_section ( section ):
             if _str:
                if not prev_line_empty:
                   yield EMPTY_STR
@@ -621,22 +967,71 @@ class ShlibFile ( object ):
          prev_line_empty = not bool(s)
    # --- end of generate_lines (...) ---
 
+   def generate_blocks ( self, block_size=None ):
+      """Generator that yields the output in blocks of (at least)
+      block_size chars, each line followed by a newline char, so that
+      writing the output does not need a write() call per line.
+
+      arguments:
+      * block_size -- defaults to WRITE_BLOCK_SIZE
+      """
+      if block_size is None:
+         block_size = self.WRITE_BLOCK_SIZE
+
+      buf  = []
+      size = 0
+      for line in self.generate_lines():
+         buf.append ( line )
+         size += len ( line ) + 1
+         if size >= block_size:
+            buf.append ( "" )
+            yield '\n'.join ( buf )
+            buf  = []
+            size = 0
+
+      if buf:
+         buf.append ( "" )
+         yield '\n'.join ( buf )
+   # --- end of generate_blocks (...) ---
+
    def __str__ ( self ):
       return '\n'.join ( self.generate_lines() )
    # --- end of __str__ (...) ---
 
    def write ( self, fh_or_fspath ):
+      profiler = shlibcclib.profiler.PROFILER
+
       def write_into ( fh ):
-         for line in self.generate_lines():
-            fh.write ( line )
-            fh.write ( '\n' )
+         fh.writelines ( self.generate_blocks() )
       # --- end of write_into (...) ---
 
-      if isinstance ( fh_or_fspath, str ):
-         with open ( fh_or_fspath, 'wt' ) as FH:
-            write_into ( FH )
+      def write_into_counted ( fh ):
+         num_lines = 0
+         num_bytes = 0
+         for block in self.generate_blocks():
+            fh.write ( block )
+            num_lines += block.count ( '\n' )
+            num_bytes += len ( block.encode ( 'utf-8' ) )
+
+         profiler.count ( 'lines_out', num_lines )
+         profiler.count ( 'bytes_written', num_bytes )
+      # --- end of write_into_counted (...) ---
+
+      if profiler.enabled:
+         write_func = write_into_counted
       else:
-         write_into ( fh_or_fspath )
+         write_func = write_into
+
+      with profiler.phase ( 'write' ):
+         if isinstance ( fh_or_fspath, str ):
+            with shlibcclib.fsio.open_atomic (
+               fh_or_fspath,
+               executable = bool ( self.config.main_script ),
+               fsync      = self.config.fsync,
+            ) as FH:
+               write_func ( FH )
+         else:
+            write_func ( fh_or_fspath )
    # --- end of write (...) ---
 
 # --- end of ShlibFile ---